@@ -0,0 +1,116 @@
+import os
+import sys
+import csv
+import glob
+import html
+import time
+
+from comment_parser import etree, parse_with_lxml, parse_with_soup
+
+DOUBAN_CSV_FOLDER = 'douban短评_output'
+
+ITEM_TEMPLATE = '''<div class="comment-item " data-cid="{cid}">
+  <div class="avatar"><a title="{name}" href="https://www.douban.com/people/{uid}/"><img src="https://img1.doubanio.com/icon/u{uid}.jpg" class="" /></a></div>
+  <div class="comment">
+    <h3>
+      <span class="comment-vote"><span class="votes vote-count">{votes}</span>
+        <input value="{cid}" type="hidden"/><a href="javascript:;" data-id="{cid}" class="j a_show_login" onclick="">有用</a></span>
+      <span class="comment-info">
+        <a href="https://www.douban.com/people/{uid}/" class="">{name}</a>
+        <span>看过</span>
+        <span class="allstar{stars}0 rating" title="很差"></span>
+        <span class="comment-time " title="{time}">{time}</span>
+        <span class="comment-location"></span>
+      </span>
+    </h3>
+    <p class=" comment-content"><span class="short">{comment}</span></p>
+    <div class="comment-report" data-url="https://movie.douban.com/subject/1/?comment_id={cid}"></div>
+  </div>
+</div>
+'''
+
+PAGE_TEMPLATE = '''<!DOCTYPE html>
+<html lang="zh-CN" class="ua-windows ua-webkit">
+<head><meta http-equiv="Content-Type" content="text/html; charset=utf-8"><title>{title} 短评</title>
+<script type="text/javascript">var _head_start = new Date();</script></head>
+<body>
+<div id="wrapper"><div id="content"><h1>{title} 短评</h1>
+<div class="grid-16-8 clearfix"><div class="article"><div class="mod-bd" id="comments">
+{items}
+</div><div id="paginator" class="center"><a href="?start=20&amp;limit=20&amp;sort=new_score&amp;status=P&amp;percent_type=l" class="next">后页 &gt;</a></div>
+</div></div></div></div>
+</body></html>
+'''
+
+
+def build_page(rows, title):
+    """Render review rows (name/rating/time/comment) as a Douban short comments page"""
+    items = []
+    for i, row in enumerate(rows):
+        items.append(ITEM_TEMPLATE.format(
+            cid=1000000 + i,
+            uid=f"user{i}",
+            votes=i % 50,
+            name=html.escape(row['name']),
+            stars=row['rating'] or '1',
+            time=html.escape(row['time']),
+            comment=html.escape(row['comment']),
+        ))
+    return PAGE_TEMPLATE.format(title=html.escape(title), items=''.join(items))
+
+
+def pages_from_csvs(folder=DOUBAN_CSV_FOLDER, per_page=20):
+    """Rebuild 20-item pages from the scraped Douban CSVs so the benchmark runs offline"""
+    pages = []
+    for path in sorted(glob.glob(os.path.join(folder, '*.csv'))):
+        with open(path, encoding='utf-8-sig') as f:
+            rows = list(csv.DictReader(f))
+        for start in range(0, len(rows), per_page):
+            chunk = rows[start:start + per_page]
+            pages.append((build_page(chunk, chunk[0]['title']), chunk[0]['title']))
+    return pages
+
+
+def time_parser(parse, pages, repeat=3):
+    """Best-of-repeat seconds to parse every page once, plus the number of items found"""
+    best = None
+    items = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        items = sum(len(parse(page, title)) for page, title in pages)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, items
+
+
+def main(paths):
+    if paths:
+        pages = []
+        for path in paths:
+            with open(path, encoding='utf-8') as f:
+                pages.append((f.read(), os.path.basename(path)))
+        print(f"Loaded {len(pages)} saved pages")
+    else:
+        pages = pages_from_csvs()
+        print(f"Built {len(pages)} pages from {DOUBAN_CSV_FOLDER}")
+
+    parsers = [('BeautifulSoup html.parser', parse_with_soup)]
+    if etree is not None:
+        parsers.append(('lxml compiled XPath', parse_with_lxml))
+    else:
+        print("lxml is not installed, only timing the BeautifulSoup path")
+
+    results = {}
+    for name, parse in parsers:
+        seconds, items = time_parser(parse, pages)
+        results[name] = seconds
+        print(f"{name:28s} {1000 * seconds / len(pages):8.2f} ms/page  {1e6 * seconds / max(items, 1):8.1f} us/item  ({items} items)")
+
+    if len(results) == 2:
+        mismatched = sum(parse_with_lxml(p, t) != parse_with_soup(p, t) for p, t in pages)
+        soup_s, lxml_s = results.values()
+        print(f"Speedup: {soup_s / lxml_s:.1f}x, pages with differing output: {mismatched}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
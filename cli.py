@@ -0,0 +1,184 @@
+"""
+One entry point for the whole pipeline:
+
+    python cli.py titles
+    python cli.py crawl --source douban imdb --title Avatar Zootopia
+    python cli.py merge output1 --output combined_output.csv
+    python cli.py embed imdb_combined_output.csv --column comment
+    python cli.py cluster imdb_combined_output.csv --column comment --clusters 6 --keywords
+
+Modules are imported inside each subcommand, so --help and the light
+subcommands don't pay for selenium, pandas, torch or bs4.
+"""
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from titles import REGISTRY, select, douban_ids, imdb_ids
+
+SOURCES = ['douban', 'douban_async', 'douban_long', 'douban_hybrid', 'imdb']
+DEFAULT_SOURCES = ['douban', 'imdb']
+# Sources that write the same files (and, for the Selenium pair, both wait on an interactive login)
+EXCLUSIVE_SOURCES = [
+    ('douban', 'douban_async'),  # {title}_douban_reviews_all_pages.csv and the douban store partition
+    ('douban_long', 'douban_hybrid'),  # output1/{title}.csv
+]
+
+
+def cmd_titles(args):
+    for title in select(args.title):
+        print(f"{title.name:40s} douban {title.douban:>10s}  imdb {title.imdb}")
+
+
+def _crawl_source(source, args):
+    """Run one source's crawl over the selected titles (imports happen here, in the source's thread)"""
+    if source == 'douban':
+        import douban_review_scraping
+        douban_review_scraping.crawl(douban_ids(args.title), args.incremental)
+    elif source == 'douban_async':
+        import douban_async_scraping
+        douban_async_scraping.crawl(douban_ids(args.title))
+    elif source == 'douban_long':
+        import doubanscraper3
+        doubanscraper3.crawl(douban_ids(args.title), args.workers or doubanscraper3.POOL_SIZE, args.headless)
+    elif source == 'douban_hybrid':
+        import douban_hybrid
+        douban_hybrid.crawl(douban_ids(args.title))
+    elif source == 'imdb':
+        import imdb_review_scraping
+        imdb_review_scraping.crawl(imdb_ids(args.title), args.workers or imdb_review_scraping.PARALLEL_WORKERS,
+                                   args.headless)
+
+
+def cmd_crawl(args):
+    """
+    Crawl every selected source at once, one thread each: they talk to
+    different hosts (or share movie.douban.com's rate limiter), so one
+    source's waits are another's working time
+    """
+    for sources in EXCLUSIVE_SOURCES:
+        if set(sources) <= set(args.source):
+            print(f"❌ {' and '.join(sources)} write the same output; crawl them in separate runs")
+            return 2
+
+    from crawl_metrics import get_metrics, RUN_METRICS
+    metrics = get_metrics(**RUN_METRICS) if args.metrics else None
+    started = time.perf_counter()
+
+    try:
+        with ThreadPoolExecutor(max_workers=len(args.source)) as pool:
+            futures = {source: pool.submit(_crawl_source, source, args) for source in args.source}
+        failed = []
+        for source, future in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                print(f"❌ {source} failed: {e}")
+                failed.append(source)
+
+        print(f"🏁 Crawled {', '.join(args.source)} for {len(select(args.title))} titles in "
+              f"{time.perf_counter() - started:.0f}s" + (f" ({', '.join(failed)} failed)" if failed else ""))
+    finally:
+        if metrics is not None:
+            metrics.close()
+    return 1 if failed else 0
+
+
+def cmd_merge(args):
+    from incremental_merge import merge_folder
+    merge_folder(args.folder, args.output, args.chunksize)
+
+
+def _read_texts(path, column):
+    import pandas as pd
+    return pd.read_csv(path, dtype=str, keep_default_na=False)[column].tolist()
+
+
+def cmd_embed(args):
+    from embedding_pipeline import MODELS, encode_cached
+    vectors = encode_cached(_read_texts(args.path, args.column), MODELS.get(args.model, args.model),
+                            workers=args.workers)
+    print(f"{len(vectors)} vectors of dimension {vectors.shape[1]}")
+
+
+def cmd_cluster(args):
+    from embedding_pipeline import MODELS, encode_cached
+    texts = _read_texts(args.path, args.column)
+    vectors = encode_cached(texts, MODELS.get(args.model, args.model), workers=args.workers)
+
+    if args.sweep:
+        from k_selection import k_sweep
+        low, high = (int(k) for k in args.sweep.split(':'))
+        print(k_sweep(vectors, range(low, high + 1), workers=args.workers).to_string(index=False))
+        return
+
+    from stream_cluster import StreamingClusterer
+    clusterer = StreamingClusterer(args.state, n_clusters=args.clusters)
+    labels = clusterer.label_new(vectors)
+
+    if args.keywords:
+        from tokenize_service import tokenize_texts
+        from cluster_keywords import cluster_keywords, print_keywords
+        keywords = cluster_keywords(tokenize_texts(texts, workers=args.workers), labels, embeddings=vectors)
+        if not any(keywords.values()):
+            print(f"❌ No keyword candidates in {args.path}:{args.column} (every word is a stopword or too rare)")
+            return 1
+        print_keywords(keywords)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='cli.py', description="Scrape, merge, embed and cluster movie reviews")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    titles = commands.add_parser('titles', help="List the title registry")
+    titles.add_argument('--title', nargs='+', help="Only these titles")
+    titles.set_defaults(func=cmd_titles)
+
+    crawl = commands.add_parser('crawl', help="Scrape reviews from one or more sources concurrently")
+    crawl.add_argument('--source', nargs='+', choices=SOURCES, default=DEFAULT_SOURCES,
+                       help="Sources to crawl (douban_long and douban_hybrid need an interactive login)")
+    crawl.add_argument('--title', nargs='+', help=f"Registry titles to crawl (default: all {len(REGISTRY)})")
+    crawl.add_argument('--workers', type=int, help="Browsers per Selenium source")
+    crawl.add_argument('--headless', action='store_true', help="Run the Selenium sources headless")
+    crawl.add_argument('--incremental', action='store_true',
+                       help="Douban short comments: only fetch comments newer than each title's watermark")
+    crawl.add_argument('--no-metrics', dest='metrics', action='store_false',
+                       help="Don't write crawl_trace.jsonl / crawl_metrics.prom")
+    crawl.set_defaults(func=cmd_crawl)
+
+    merge = commands.add_parser('merge', help="Incrementally merge a folder of CSVs")
+    merge.add_argument('folder', nargs='?', default='output1')
+    merge.add_argument('--output', default='combined_output.csv')
+    merge.add_argument('--chunksize', type=int, default=5000)
+    merge.set_defaults(func=cmd_merge)
+
+    for name, func, help_text in (('embed', cmd_embed, "Embed a CSV column (cached)"),
+                                  ('cluster', cmd_cluster, "Cluster a CSV column's embeddings")):
+        sub = commands.add_parser(name, help=help_text)
+        sub.add_argument('path', nargs='?', default='imdb_combined_output.csv')
+        sub.add_argument('--column', default='comment')
+        sub.add_argument('--model', default='multilingual', help="Key of embedding_pipeline.MODELS or a model name")
+        sub.add_argument('--workers', type=int, help="Processes (default: one per core)")
+        sub.set_defaults(func=func)
+        if name == 'cluster':
+            sub.add_argument('--clusters', type=int, default=6)
+            sub.add_argument('--state', default='clusters', help="Prefix of the saved centroids and labels")
+            sub.add_argument('--sweep', help="Instead of clustering, sweep k over LOW:HIGH")
+            sub.add_argument('--keywords', action='store_true', help="Print c-TF-IDF keywords per cluster")
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        select(getattr(args, 'title', None))
+    except KeyError as e:
+        print(f"❌ {e.args[0]}")
+        return 2
+    return args.func(args) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+import re
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import CountVectorizer, ENGLISH_STOP_WORDS
+from sklearn.preprocessing import normalize
+
+_CJK = re.compile(r'[一-龥]')
+# jieba's flag for Latin-script words; they carry no part of speech, so English is filtered by stopwords instead
+ENGLISH_FLAG = 'eng'
+
+
+def _join(a, b):
+    """Chinese bigrams are written without a space, like the notebooks' candidate bigrams"""
+    return a + b if _CJK.search(a[-1]) and _CJK.search(b[0]) else f"{a} {b}"
+
+
+def _candidate(token, pos_prefixes, english_stopwords):
+    """The word a token contributes, or None"""
+    if isinstance(token, str):
+        return token
+    word, flag = token
+    if flag == ENGLISH_FLAG:
+        word = word.lower()
+        return None if word in english_stopwords else word
+    return word if flag.startswith(tuple(pos_prefixes)) else None
+
+
+def candidate_terms(tokens, pos_prefixes=('n', 'a', 'v'), min_length=2, bigrams=True,
+                    english_stopwords=ENGLISH_STOP_WORDS):
+    """
+    Keyword candidates of one comment: words whose POS flag starts with one of
+    pos_prefixes, English words (lowercased) that aren't english_stopwords,
+    plus bigrams of consecutive kept words
+    :param tokens: tokenize_service output ([word, flag] pairs) or plain words
+    """
+    kept = [word for word in (_candidate(token, pos_prefixes, english_stopwords) for token in tokens)
+            if word is not None and len(word) >= min_length]
+    if bigrams:
+        kept += [_join(a, b) for a, b in zip(kept, kept[1:])]
+    return kept
+
+
+def doc_term_matrix(token_lists, min_df=2, **candidate_kwargs):
+    """
+    Per-comment candidate counts as a CSR matrix, and the term of each column
+    (no columns when no candidate reaches min_df)
+    """
+    vectorizer = CountVectorizer(analyzer=lambda tokens: candidate_terms(tokens, **candidate_kwargs), min_df=min_df)
+    try:
+        X = vectorizer.fit_transform(token_lists)
+    except ValueError:
+        # CountVectorizer refuses an empty vocabulary
+        return sp.csr_matrix((len(token_lists), 0), dtype=np.int64), np.array([], dtype=object)
+    return X.tocsr(), vectorizer.get_feature_names_out()
+
+
+def class_tfidf(X, labels, n_clusters=None):
+    """
+    c-TF-IDF of every term for every cluster in one sparse pass: member rows are
+    summed per cluster, then tf = term share of the cluster's words and
+    idf = log(1 + average words per cluster / the term's total count)
+    :return: (n_clusters, n_terms) dense array
+    """
+    labels = np.asarray(labels)
+    n_clusters = n_clusters or int(labels.max()) + 1
+    membership = sp.csr_matrix((np.ones(len(labels)), (labels, np.arange(len(labels)))),
+                               shape=(n_clusters, len(labels)))
+    counts = (membership @ X).toarray().astype(np.float64)
+    words_per_cluster = counts.sum(axis=1, keepdims=True)
+    tf = counts / np.maximum(words_per_cluster, 1)
+    idf = np.log(1 + words_per_cluster.mean() / np.maximum(counts.sum(axis=0), 1))
+    return tf * idf
+
+
+def cluster_keywords(token_lists, labels, top_n=5, embeddings=None, centroids=None, candidates=30, min_df=2,
+                     doc_terms=None, **candidate_kwargs):
+    """
+    Top keywords per cluster by c-TF-IDF. With embeddings (the cached review
+    vectors, one row per comment) the top `candidates` terms of each cluster
+    are re-ranked by cosine similarity to the cluster centroid; a term's
+    vector is the mean embedding of the comments containing it, so no text is encoded.
+    :param centroids: Cluster centers in embedding space (defaults to the mean of member embeddings)
+    :param doc_terms: (X, terms) from doc_term_matrix(), to reuse the counts across re-clusterings
+    :return: {cluster: [(term, score), ...]}, with empty lists when there are no candidate terms
+    """
+    labels = np.asarray(labels)
+    X, terms = doc_terms or doc_term_matrix(token_lists, min_df=min_df, **candidate_kwargs)
+    scores = class_tfidf(X, labels)
+    n_clusters = len(scores)
+
+    if embeddings is not None and centroids is None:
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        centroids = np.vstack([embeddings[labels == c].mean(axis=0) if (labels == c).any()
+                               else np.zeros(embeddings.shape[1], dtype=np.float32) for c in range(n_clusters)])
+
+    keywords = {}
+    for cluster in range(n_clusters):
+        row = scores[cluster]
+        keep = min(candidates if embeddings is not None else top_n, np.count_nonzero(row))
+        if keep == 0:
+            keywords[cluster] = []
+            continue
+        top = np.argpartition(-row, keep - 1)[:keep]
+        top = top[np.argsort(-row[top])]
+
+        if embeddings is None:
+            keywords[cluster] = [(terms[i], float(row[i])) for i in top]
+            continue
+
+        # Mean embedding of the comments containing each candidate term
+        presence = normalize((X[:, top] > 0).astype(np.float32).T.tocsr(), norm='l1')
+        term_vectors = normalize(np.asarray(presence @ embeddings))
+        similarity = term_vectors @ normalize(centroids[cluster:cluster + 1]).ravel()
+        order = np.argsort(-similarity)[:top_n]
+        keywords[cluster] = [(terms[top[i]], float(similarity[i])) for i in order]
+    return keywords
+
+
+def print_keywords(keywords):
+    for cluster, terms in keywords.items():
+        print(f"Cluster {cluster} keywords:", [(term, round(score, 4)) for term, score in terms])
@@ -0,0 +1,219 @@
+from bs4 import BeautifulSoup
+
+# lxml is optional: without it every page goes through the BeautifulSoup path
+try:
+    from lxml import etree, html as lxml_html
+except ImportError:
+    etree = None
+
+
+def _has_class(name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+if etree is not None:
+    _ITEMS = etree.XPath(f"//div[{_has_class('comment-item')}]")
+    _NAME_IN_INFO = etree.XPath(f".//span[{_has_class('comment-info')}]//a[contains(@href, 'douban.com/people/')]")
+    _NAME_ANYWHERE = etree.XPath(".//a[contains(@href, 'douban.com/people/')]")
+    _NAME_U = etree.XPath(f".//a[{_has_class('u')}]")
+    _COMMENT = etree.XPath(f".//p[{_has_class('comment-content')}]")
+    _RATING = etree.XPath(".//span[contains(@class, 'allstar')]")
+    _TIME = etree.XPath(f".//span[{_has_class('comment-time')}]")
+
+
+def _rating_from_classes(classes):
+    """'allstar10 rating' -> '1', keeping the last allstarNN class like the original loop"""
+    rating = ''
+    for cls in classes:
+        if 'allstar' in cls and cls != 'allstar':
+            rating_num = ''.join(filter(str.isdigit, cls))
+            if rating_num:
+                rating = f"{int(rating_num) // 10}"
+    return rating
+
+
+def _first_text(xpath, item):
+    found = xpath(item)
+    return found[0].text_content().strip() if found else ''
+
+
+def parse_with_lxml(html, title):
+    """Extract review dicts with lxml's C tree and precompiled XPath expressions"""
+    tree = lxml_html.fromstring(html)
+    reviews = []
+
+    for i, item in enumerate(_ITEMS(tree)):
+        try:
+            name_elems = _NAME_IN_INFO(item) or _NAME_ANYWHERE(item) or _NAME_U(item)
+            rating_elems = _RATING(item)
+
+            review_data = {
+                'name': name_elems[0].text_content().strip() if name_elems else '',
+                'comment': _first_text(_COMMENT, item),
+                'rating': _rating_from_classes(rating_elems[0].get('class', '').split()) if rating_elems else '',
+                'time': _first_text(_TIME, item),
+                'title': title
+            }
+
+            if review_data['comment']:
+                reviews.append(review_data)
+
+        except Exception as e:
+            print(f"Error processing comment {i+1}: {e}")
+            continue
+
+    return reviews
+
+
+def parse_with_soup(html, title):
+    """Extract review dicts with BeautifulSoup's html.parser (slow, but tolerant of odd markup)"""
+    soup = BeautifulSoup(html, 'html.parser')
+    comment_items = soup.find_all('div', class_='comment-item')
+    reviews = []
+
+    for i, item in enumerate(comment_items):
+        review_data = {
+            'name': '',
+            'comment': '',
+            'rating': '',
+            'time': '',
+            'title': title
+        }
+
+        try:
+            # Extract name - it's in comment-info span, in a link to douban.com/people/
+            name_elem = None
+
+            # Method 1: Look for name in comment-info section
+            comment_info = item.find('span', class_='comment-info')
+            if comment_info:
+                name_elem = comment_info.find('a', href=lambda x: x and 'douban.com/people/' in x)
+
+            # Method 2: Look anywhere for link to people profile
+            if not name_elem:
+                name_elem = item.find('a', href=lambda x: x and 'douban.com/people/' in x)
+
+            # Method 3: Look for link with class 'u' (sometimes used)
+            if not name_elem:
+                name_elem = item.find('a', class_='u')
+
+            if name_elem:
+                review_data['name'] = name_elem.get_text().strip()
+
+            # Extract comment text
+            comment_elem = item.find('p', class_='comment-content')
+            if comment_elem:
+                review_data['comment'] = comment_elem.get_text().strip()
+
+            # Extract rating
+            rating_elem = item.find('span', class_=lambda x: x and 'allstar' in str(x))
+            if rating_elem:
+                review_data['rating'] = _rating_from_classes(rating_elem.get('class', []))
+
+            # Extract time
+            time_elem = item.find('span', class_='comment-time')
+            if time_elem:
+                review_data['time'] = time_elem.get_text().strip()
+
+            if review_data['comment']:
+                reviews.append(review_data)
+
+        except Exception as e:
+            print(f"Error processing comment {i+1}: {e}")
+            continue
+
+    return reviews
+
+
+def parse_comment_page(html, title):
+    """
+    Extract review dicts (name, rating, time, comment, title) from one short comments page.
+    Uses lxml when installed and falls back to BeautifulSoup when lxml can't
+    build a tree or finds no items in a page that clearly has some.
+    """
+    if etree is not None:
+        try:
+            reviews = parse_with_lxml(html, title)
+            if reviews or 'comment-item' not in html:
+                return reviews
+        except (ValueError, etree.ParserError) as e:
+            print(f"lxml could not parse page, falling back to BeautifulSoup: {e}")
+    return parse_with_soup(html, title)
+
+
+# Where the expanded text of a long review can live, in the order doubanscraper3 probes them
+REVIEW_CONTENT_SELECTORS = [
+    "div.review-content.clearfix",
+    "div.review-content",
+    "div#toggle-{review_id}-copy-content",
+    "div.full-content",
+]
+
+
+def _find_review_content(root, review_id):
+    for selector in REVIEW_CONTENT_SELECTORS:
+        content_div = root.select_one(selector.format(review_id=review_id))
+        if content_div is not None:
+            return content_div
+    return None
+
+
+def _review_from_content(content_div, title, rating, review_id):
+    """Build a long-review dict from its content div, or None if it has no text"""
+    # Extract text from paragraphs, falling back to all text in the content div
+    ps = content_div.find_all("p")
+    full_text = "\n".join([p.get_text().strip() for p in ps if p.get_text().strip()])
+    if not full_text.strip():
+        full_text = content_div.get_text().strip()
+    if not full_text.strip():
+        return None
+
+    url_attr = content_div.get("data-url") or content_div.get("href")
+    if not url_attr:
+        url_attr = f"https://movie.douban.com/review/{review_id}/"
+
+    return {
+        "title": title,
+        "review_text": full_text,
+        "stars": rating,
+        "url": url_attr,
+    }
+
+
+def parse_review_page(html, title, rating):
+    """
+    Extract long-review dicts (title, review_text, stars, url) from the HTML of a
+    Douban reviews listing page whose reviews have already been expanded
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    reviews = []
+
+    for review_div in soup.select("div.main.review-item"):
+        review_id = review_div.get("id", "")
+        try:
+            content_div = _find_review_content(review_div, review_id)
+            if content_div is None:
+                continue
+            review = _review_from_content(content_div, title, rating, review_id)
+            if review:
+                reviews.append(review)
+
+        except Exception as e:
+            print(f"⚠️ Error processing review {review_id}: {e}")
+            continue
+
+    return reviews
+
+
+def parse_review_ids(html):
+    """IDs of the reviews listed on a (not expanded) Douban reviews listing page"""
+    soup = BeautifulSoup(html, 'html.parser')
+    return [div.get("id") for div in soup.select("div.main.review-item") if div.get("id")]
+
+
+def parse_review_body(html, title, rating, review_id):
+    """Extract one long-review dict from its own page (movie.douban.com/review/<id>/), or None"""
+    soup = BeautifulSoup(html, 'html.parser')
+    content_div = _find_review_content(soup, review_id)
+    if content_div is None:
+        return None
+    return _review_from_content(content_div, title, rating, review_id)
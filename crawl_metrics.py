@@ -0,0 +1,295 @@
+import os
+import sys
+import json
+import time
+import bisect
+import threading
+from urllib.parse import urlsplit
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+PARSE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1, 5)
+
+# What the scrapers' main() functions record a run with
+RUN_METRICS = dict(trace_path='crawl_trace.jsonl', prom_path='crawl_metrics.prom', live=True)
+
+
+def _host(url):
+    return urlsplit(url).netloc if '://' in url else url
+
+
+class Histogram:
+    """Fixed-bucket histogram with Prometheus semantics (a value lands in the first bucket >= it)"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th observation (None when empty)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound if bound != float('inf') else self.buckets[-1]
+        return self.buckets[-1]
+
+    def cumulative(self):
+        """(le, cumulative count) pairs, ending with +Inf"""
+        running = 0
+        pairs = []
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            running += count
+            pairs.append(('+Inf' if bound == float('inf') else repr(float(bound)), running))
+        return pairs
+
+
+def _labels(**labels):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    parts = [f'{key}="{escape(value)}"' for key, value in labels.items() if value is not None]
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class CrawlMetrics:
+    """
+    Counters and histograms for one crawl: request latency and bytes per host,
+    parse time, limiter sleeps (rate limit vs backoff), anti-bot hits and
+    reviews per (source, title, rating). Every event can also be appended to
+    a JSON-lines trace, which keeps earlier runs but brackets each one with
+    run_start and run_end events; close() writes the Prometheus text file.
+    Comparing the total network, parse and sleep seconds shows what the run
+    is bound by.
+    Safe to share between threads.
+    :param trace_path: Optional JSON-lines file every event is appended to (from_trace replays the last run)
+    :param prom_path: Optional Prometheus text file written by export_prometheus()/close()
+    :param live: Print a one-line progress summary every live_interval seconds
+    """
+
+    def __init__(self, trace_path=None, prom_path=None, live=False, live_interval=10):
+        self.trace_path = trace_path
+        self.prom_path = prom_path
+        self.started = time.time()
+        self.finished = None
+        self.latency = {}
+        self.requests = {}
+        self.bytes = {}
+        self.parse_time = Histogram(PARSE_BUCKETS)
+        self.parsed_items = 0
+        self.sleep_seconds = {'rate_limit': 0.0, 'backoff': 0.0}
+        self.anti_bot = {}
+        self.reviews = {}
+        self._lock = threading.Lock()
+        self._trace = open(trace_path, 'a', encoding='utf-8') if trace_path else None
+        self._stop = threading.Event()
+        self._live = None
+        if live:
+            self._live = threading.Thread(target=self._live_loop, args=(live_interval,), daemon=True)
+            self._live.start()
+        if self._trace is not None:
+            self._emit('run_start')
+
+    # --- recording ---
+
+    def _emit(self, event, **fields):
+        entry = {'ts': time.time(), 'event': event, **fields}
+        with self._lock:
+            self._apply(entry)
+            if self._trace is not None:
+                self._trace.write(json.dumps(entry, ensure_ascii=False) + '\n')
+                self._trace.flush()
+
+    def _apply(self, entry):
+        event = entry['event']
+        if event == 'request':
+            host = entry['host']
+            self.latency.setdefault(host, Histogram(LATENCY_BUCKETS)).observe(entry['seconds'])
+            key = (host, str(entry['status']))
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.bytes[host] = self.bytes.get(host, 0) + entry['bytes']
+        elif event == 'parse':
+            self.parse_time.observe(entry['seconds'])
+            self.parsed_items += entry['items']
+        elif event == 'sleep':
+            self.sleep_seconds[entry['reason']] = self.sleep_seconds.get(entry['reason'], 0.0) + entry['seconds']
+        elif event == 'anti_bot':
+            self.anti_bot[entry['host']] = self.anti_bot.get(entry['host'], 0) + 1
+        elif event == 'reviews':
+            key = (entry['source'], entry['title'], str(entry['rating']))
+            stats = self.reviews.setdefault(key, {'count': 0, 'first': entry['ts'] - entry['seconds'], 'last': entry['ts']})
+            stats['count'] += entry['count']
+            stats['first'] = min(stats['first'], entry['ts'] - entry['seconds'])
+            stats['last'] = entry['ts']
+
+    def request(self, url, seconds, status, nbytes=0):
+        """One HTTP request or browser page load (status None when the browser doesn't expose one)"""
+        self._emit('request', host=_host(url), url=url, seconds=seconds, status=status, bytes=nbytes)
+
+    def parse(self, seconds, items):
+        """Time spent turning one page into review dicts"""
+        self._emit('parse', seconds=seconds, items=items)
+
+    def sleep(self, seconds, url, reason='rate_limit'):
+        """Time the rate limiter held a request back; reason is 'rate_limit' or 'backoff'"""
+        self._emit('sleep', host=_host(url), seconds=seconds, reason=reason)
+
+    def anti_bot_hit(self, url):
+        self._emit('anti_bot', host=_host(url), url=url)
+
+    def add_reviews(self, count, source, title, rating=None, seconds=0.0):
+        """
+        Reviews scraped for a (source, title, rating) bucket
+        :param seconds: How long producing this batch took, so a bucket's rate counts its first page too
+        """
+        self._emit('reviews', source=source, title=title, rating=rating, count=count, seconds=seconds)
+
+    # --- reporting ---
+
+    def summary(self):
+        """Totals, latency percentiles and which of network / parse / throttling took the most time"""
+        with self._lock:
+            latency = Histogram(LATENCY_BUCKETS)
+            for histogram in self.latency.values():
+                latency.counts = [a + b for a, b in zip(latency.counts, histogram.counts)]
+                latency.sum += histogram.sum
+                latency.count += histogram.count
+            failed = sum(count for (_, status), count in self.requests.items() if status not in ('200', 'None'))
+            reviews = sum(stats['count'] for stats in self.reviews.values())
+            elapsed = (self.finished or time.time()) - self.started
+            time_spent = {'network': latency.sum, 'parse': self.parse_time.sum, 'throttle': sum(self.sleep_seconds.values())}
+            return {
+                'elapsed': elapsed,
+                'requests': latency.count,
+                'failed': failed,
+                'anti_bot': sum(self.anti_bot.values()),
+                'bytes': sum(self.bytes.values()),
+                'p50_ms': 1000 * latency.quantile(0.5) if latency.count else None,
+                'p99_ms': 1000 * latency.quantile(0.99) if latency.count else None,
+                'parsed_items': self.parsed_items,
+                'reviews': reviews,
+                'reviews_per_sec': reviews / elapsed if elapsed else 0.0,
+                'seconds': time_spent,
+                'bound_by': max(time_spent, key=time_spent.get) if any(time_spent.values()) else None,
+            }
+
+    def rates(self):
+        """Reviews/sec of every (source, title, rating) bucket, from its first page to its latest one"""
+        with self._lock:
+            return {key: stats['count'] / max(stats['last'] - stats['first'], 1e-9) for key, stats in self.reviews.items()}
+
+    def format_summary(self):
+        s = self.summary()
+        p50 = f"{s['p50_ms']:.0f}" if s['p50_ms'] is not None else '-'
+        p99 = f"{s['p99_ms']:.0f}" if s['p99_ms'] is not None else '-'
+        return (f"📈 {s['requests']} requests ({s['failed']} failed, {s['anti_bot']} anti-bot), "
+                f"{s['bytes'] / 2 ** 20:.1f} MB | {s['reviews']} reviews, {s['reviews_per_sec']:.1f}/s | "
+                f"p50 <= {p50} ms, p99 <= {p99} ms | network {s['seconds']['network']:.1f}s, "
+                f"parse {s['seconds']['parse']:.1f}s, throttle {s['seconds']['throttle']:.1f}s"
+                + (f" -> {s['bound_by']}-bound" if s['bound_by'] else ''))
+
+    def _live_loop(self, interval):
+        while not self._stop.wait(interval):
+            print(self.format_summary())
+
+    def prometheus_text(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            def histogram(name, help_text, histograms):
+                lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} histogram"])
+                for labels, h in histograms:
+                    for le, count in h.cumulative():
+                        lines.append(f"{name}_bucket{_labels(**labels, le=le)} {count}")
+                    lines.append(f"{name}_sum{_labels(**labels)} {h.sum}")
+                    lines.append(f"{name}_count{_labels(**labels)} {h.count}")
+
+            def simple(name, kind, help_text, values):
+                lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"])
+                for labels, value in values:
+                    lines.append(f"{name}{_labels(**labels)} {value}")
+
+            histogram('crawl_request_duration_seconds', 'Request or page load latency.',
+                      [({'host': host}, h) for host, h in self.latency.items()])
+            simple('crawl_requests_total', 'counter', 'Requests by host and status.',
+                   [({'host': host, 'status': status}, n) for (host, status), n in self.requests.items()])
+            simple('crawl_response_bytes_total', 'counter', 'Response body bytes by host.',
+                   [({'host': host}, n) for host, n in self.bytes.items()])
+            histogram('crawl_parse_duration_seconds', 'Time to parse one page.', [({}, self.parse_time)])
+            simple('crawl_parsed_items_total', 'counter', 'Reviews parsed from pages.', [({}, self.parsed_items)])
+            simple('crawl_sleep_seconds_total', 'counter', 'Time held back by the rate limiter.',
+                   [({'reason': reason}, seconds) for reason, seconds in self.sleep_seconds.items()])
+            simple('crawl_anti_bot_total', 'counter', 'Anti-bot pages served.',
+                   [({'host': host}, n) for host, n in self.anti_bot.items()])
+            simple('crawl_reviews_total', 'counter', 'Reviews scraped.',
+                   [({'source': s, 'title': t, 'rating': r}, stats['count']) for (s, t, r), stats in self.reviews.items()])
+            simple('crawl_reviews_per_second', 'gauge', 'Reviews/sec of each title and rating.',
+                   [({'source': s, 'title': t, 'rating': r}, stats['count'] / max(stats['last'] - stats['first'], 1e-9))
+                    for (s, t, r), stats in self.reviews.items()])
+        return '\n'.join(lines) + '\n'
+
+    def export_prometheus(self, path=None):
+        path = path or self.prom_path
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+        return path
+
+    def close(self):
+        """Stop the live summary, write the Prometheus file and print the final summary"""
+        self._stop.set()
+        self.finished = time.time()
+        if self.prom_path:
+            self.export_prometheus()
+        if self._trace is not None:
+            self._emit('run_end')
+        with self._lock:
+            if self._trace is not None:
+                self._trace.close()
+                self._trace = None
+        print(self.format_summary())
+
+    @classmethod
+    def from_trace(cls, path):
+        """Rebuild the metrics of the last run in a JSON-lines trace"""
+        metrics = cls()
+        with open(path, encoding='utf-8') as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+        starts = [i for i, entry in enumerate(entries) if entry['event'] == 'run_start']
+        if starts:
+            entries = entries[starts[-1]:]
+        if entries:
+            metrics.started = entries[0]['ts'] - entries[0].get('seconds', 0.0)
+            metrics.finished = entries[-1]['ts']
+        for entry in entries:
+            metrics._apply(entry)
+        return metrics
+
+
+_shared_metrics = None
+
+def get_metrics(**kwargs):
+    """Return the process-wide CrawlMetrics, creating it on first use"""
+    global _shared_metrics
+    if _shared_metrics is None:
+        _shared_metrics = CrawlMetrics(**kwargs)
+    return _shared_metrics
+
+
+if __name__ == "__main__":
+    # Summarize a finished run: python crawl_metrics.py crawl_trace.jsonl [metrics.prom]
+    replayed = CrawlMetrics.from_trace(sys.argv[1])
+    print(replayed.format_summary())
+    for (source, title, rating), rate in sorted(replayed.rates().items()):
+        print(f"  {source} {title} {rating}★: {rate:.2f} reviews/sec")
+    if len(sys.argv) > 2:
+        print(f"Wrote {replayed.export_prometheus(sys.argv[2])}")
@@ -0,0 +1,175 @@
+import asyncio
+import time
+from urllib.parse import urlsplit, parse_qs
+
+import aiohttp
+
+from http_session import HEADERS
+from rate_limiter import get_rate_limiter
+from crawl_metrics import get_metrics, RUN_METRICS
+from review_store import ReviewStoreWriter
+from douban_review_scraping import (
+    COMMENTS_URL,
+    TITLES,
+    is_anti_bot,
+    parse_timed,
+    save_to_csv,
+)
+
+
+class ConcurrencyLimits:
+    """Global and per-host caps on the number of requests in flight"""
+
+    def __init__(self, max_concurrency=8, per_host=4):
+        self.max_concurrency = max_concurrency
+        self.per_host = per_host
+        self._global = asyncio.Semaphore(max_concurrency)
+        self._hosts = {}
+
+    def host(self, url):
+        host = urlsplit(url).netloc
+        if host not in self._hosts:
+            self._hosts[host] = asyncio.Semaphore(self.per_host)
+        return self._hosts[host]
+
+    async def __aenter__(self):
+        await self._global.acquire()
+        return self
+
+    async def __aexit__(self, *exc):
+        self._global.release()
+
+
+async def fetch_page(session, limits, url, limiter, timeout=10):
+    """Fetch one page under both concurrency caps and the host's rate limit, returning its HTML or None"""
+    await limiter.wait_async(url)
+    metrics = get_metrics()
+    async with limits, limits.host(url):
+        started = time.perf_counter()
+        try:
+            async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                print(f"Status code: {response.status} ({url})")
+                body = await response.read()
+                metrics.request(url, time.perf_counter() - started, response.status, len(body))
+                if response.status != 200:
+                    print(f"Got non-200 status code: {response.status}")
+                    limiter.record(url, ok=False)
+                    return None
+                html = await response.text()
+        except Exception as e:
+            print(f"Error scraping page: {e}")
+            metrics.request(url, time.perf_counter() - started, 'error')
+            return None
+
+    if is_anti_bot(html):
+        metrics.anti_bot_hit(url)
+    limiter.record(url, ok=not is_anti_bot(html))
+    return html
+
+
+async def crawl_title(session, limits, base_url, title, limit_per_page=20, max_pages=50, limiter=None, max_retries=3):
+    """
+    Async counterpart of scrape_all_pages: pages of one title are fetched in order,
+    but other titles keep the connection pool busy while this one waits
+    :param limiter: AdaptiveRateLimiter pacing requests per host (defaults to the shared one)
+    :param max_retries: Times a blocked or failed page is retried after the limiter backs off
+    """
+    limiter = limiter or get_rate_limiter()
+    rating = parse_qs(urlsplit(base_url).query).get('percent_type', [''])[0]
+    all_reviews = []
+    retries = 0
+    current_page = 0
+    base_without_start = base_url.split('&start=')[0] if '&start=' in base_url else base_url
+
+    while current_page < max_pages:
+        url = f"{base_without_start}&start={current_page * limit_per_page}"
+        page_started = time.perf_counter()
+        html = await fetch_page(session, limits, url, limiter)
+
+        # Blocked or failed: the limiter has backed off, so try the same page again
+        if html is None or is_anti_bot(html):
+            if html is not None:
+                print(f"Detected anti-bot measure! ({title})")
+            if retries < max_retries:
+                retries += 1
+                print(f"[{title}] Retrying page {current_page + 1} ({retries}/{max_retries})")
+                continue
+            print(f"[{title}] Giving up at page {current_page + 1} after {max_retries} retries")
+            break
+        retries = 0
+
+        page_reviews = parse_timed(html, title)
+        if not page_reviews:
+            print(f"[{title}] No reviews found on page {current_page + 1}. We've reached the end!")
+            break
+
+        all_reviews.extend(page_reviews)
+        get_metrics().add_reviews(len(page_reviews), 'douban', title, rating, time.perf_counter() - page_started)
+        print(f"[{title}] Page {current_page + 1}: {len(page_reviews)} reviews ({len(all_reviews)} total)")
+
+        if len(page_reviews) < limit_per_page:
+            break
+
+        current_page += 1
+
+    if current_page >= max_pages:
+        print(f"\n[{title}] Warning: Reached maximum page limit ({max_pages}). There might be more reviews available.")
+
+    return all_reviews
+
+
+async def crawl_titles(titles, max_concurrency=8, per_host=4, limit_per_page=20, max_pages=100, limiter=None):
+    """
+    Crawl the short comments of several titles at once
+    :param titles: dict of title -> Douban subject ID
+    :param max_concurrency: Maximum requests in flight across all hosts
+    :param per_host: Maximum requests in flight to a single host
+    :param limiter: AdaptiveRateLimiter shared by every title (defaults to the shared one)
+    :return: dict of title -> list of review dicts (same fields as scrape_single_page)
+    """
+    limits = ConcurrencyLimits(max_concurrency, per_host)
+    connector = aiohttp.TCPConnector(limit=max_concurrency, limit_per_host=per_host)
+
+    async with aiohttp.ClientSession(headers=HEADERS, connector=connector) as session:
+        tasks = []
+        for title, movie_id in titles.items():
+            base_url = COMMENTS_URL.format(movie_id=movie_id)
+            tasks.append(crawl_title(session, limits, base_url, title, limit_per_page, max_pages, limiter))
+        results = await asyncio.gather(*tasks)
+
+    return dict(zip(titles, results))
+
+
+def scrape_titles_concurrently(titles, **kwargs):
+    """Blocking wrapper around crawl_titles"""
+    return asyncio.run(crawl_titles(titles, **kwargs))
+
+
+def crawl(titles=TITLES, max_concurrency=8, per_host=4):
+    """Crawl every title concurrently, then save each title's CSV and write them all to the review store"""
+    started = time.perf_counter()
+    results = scrape_titles_concurrently(titles, max_concurrency=max_concurrency, per_host=per_host)
+
+    total = 0
+    with ReviewStoreWriter(source='douban') as store:
+        for title, all_reviews in results.items():
+            if all_reviews:
+                save_to_csv(all_reviews, f'{title}_douban_reviews_all_pages.csv')
+                store.write(all_reviews)
+                total += len(all_reviews)
+
+    print(f"\nTotal reviews collected: {total} in {time.perf_counter() - started:.1f}s")
+    return total
+
+
+def main():
+    print("Starting concurrent Douban movie comments scraper...")
+    metrics = get_metrics(**RUN_METRICS)
+    try:
+        crawl(TITLES)
+    finally:
+        metrics.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+import time
+
+from http_session import get_session
+from crawl_metrics import get_metrics, RUN_METRICS
+from rate_limiter import get_rate_limiter
+from douban_review_scraping import is_anti_bot, DOUBAN_MOVIE_URL
+from comment_parser import parse_review_ids, parse_review_body
+import doubanscraper3
+
+REVIEW_URL = DOUBAN_MOVIE_URL + "/review/{review_id}/"
+LISTING_URL = doubanscraper3.LISTING_URL
+
+
+def hand_off_cookies(driver, session):
+    """Copy the browser's logged-in cookies and User-Agent into the HTTP session"""
+    cookies = driver.get_cookies()
+    session.add_cookies(cookies)
+    session.session.headers['User-Agent'] = driver.execute_script("return navigator.userAgent")
+    session.save_cookies()
+    print(f"🍪 Handed {len(cookies)} cookies from the browser to the HTTP session")
+
+
+def fetch_html(session, url, cache=None, max_age='ttl'):
+    """
+    GET a Douban page over HTTP
+    :param cache: Optional PageCache the page is stored in and, within max_age, served from
+    :return: (HTML or None, whether Douban served its anti-bot page)
+    """
+    if cache is not None:
+        cached_html = cache.get(url, max_age=max_age)
+        if cached_html is not None:
+            return cached_html, False
+
+    limiter = get_rate_limiter()
+    limiter.wait(url)
+    try:
+        response = session.get(url, timeout=10)
+    except Exception as e:
+        print(f"⚠️ Error fetching {url}: {e}")
+        return None, False
+
+    blocked = response.status_code == 200 and is_anti_bot(response.text)
+    if response.status_code != 200 or blocked:
+        print(f"🚫 {'Anti-bot page' if blocked else f'Failed ({response.status_code})'}: {url}")
+        if blocked:
+            get_metrics().anti_bot_hit(url)
+        limiter.record(url, ok=False)
+        return None, blocked
+    limiter.record(url, ok=True)
+
+    if cache is not None:
+        cache.put(url, response.text)
+    return response.text, False
+
+
+def browser_html(driver, url):
+    """Load a page in the browser under the shared rate limiter; returns its HTML, or None on the anti-bot page"""
+    limiter = get_rate_limiter()
+    metrics = get_metrics()
+    limiter.wait(url)
+    load_started = time.perf_counter()
+    driver.get(url)
+    doubanscraper3.wait_for_page(driver)
+    html = driver.page_source
+    metrics.request(url, time.perf_counter() - load_started, None, len(html.encode('utf-8')))
+    if is_anti_bot(html):
+        metrics.anti_bot_hit(url)
+        limiter.record(url, ok=False)
+        return None
+    limiter.record(url, ok=True)
+    return html
+
+
+def parse_body_timed(html, title, rating, review_id):
+    started = time.perf_counter()
+    review = parse_review_body(html, title, rating, review_id)
+    get_metrics().parse(time.perf_counter() - started, int(review is not None))
+    return review
+
+
+def fetch_review(session, driver, title, rating, review_id, cache=None):
+    """
+    Full text of one long review over HTTP, rendering it in the browser only if HTTP didn't give us the text.
+    Anti-bot pages are retried over HTTP after the limiter backs off (up to MAX_RETRIES times) rather than
+    sent to the browser, which would be blocked just the same.
+    """
+    url = REVIEW_URL.format(review_id=review_id)
+    for _ in range(doubanscraper3.MAX_RETRIES + 1):
+        # Review pages don't change once written, so a cached body is reused regardless of age
+        html, blocked = fetch_html(session, url, cache, max_age=None)
+        if not blocked:
+            break
+    if blocked:
+        print(f"🚫 Still blocked after {doubanscraper3.MAX_RETRIES} retries, skipping review {review_id}")
+        return None
+    review = parse_body_timed(html, title, rating, review_id) if html else None
+    if review is not None:
+        return review
+
+    print(f"🌐 Falling back to the browser for review {review_id}")
+    html = browser_html(driver, url)
+    review = parse_body_timed(html, title, rating, review_id) if html else None
+    if review is not None and cache is not None:
+        cache.put(url, html)
+    return review
+
+
+def scrape_title_hybrid(session, driver, title, movie_id, ratings=(1, 2), cache=None):
+    """
+    Walk the review listing pages of one title over HTTP and download every review body.
+    Listing pages are always fetched fresh (a cached one would miss new reviews); only review bodies are cached.
+    """
+    all_reviews = []
+
+    for rating in ratings:
+        start = 0
+        retries = 0
+        while True:
+            url = LISTING_URL.format(movie_id=movie_id, rating=rating, start=start)
+            page_started = time.perf_counter()
+            reviews_before = len(all_reviews)
+            print(f"📄 Fetching page: {url}")
+            html, blocked = fetch_html(session, url)
+
+            # Blocked: the limiter has backed off, so try the same page again
+            if blocked and retries < doubanscraper3.MAX_RETRIES:
+                retries += 1
+                print(f"🚫 Anti-bot page, retrying ({retries}/{doubanscraper3.MAX_RETRIES})")
+                continue
+
+            if html is None:
+                # The listing itself needs the browser: use the batched Selenium path for this page
+                print(f"🌐 Falling back to the browser for {url}")
+                result = doubanscraper3.scrape_review_page(driver, title, movie_id, rating, start)
+                if result is None and retries < doubanscraper3.MAX_RETRIES:
+                    retries += 1
+                    print(f"🚫 Anti-bot page in the browser, retrying ({retries}/{doubanscraper3.MAX_RETRIES})")
+                    continue
+                if result is None:
+                    print(f"🚫 Still blocked after {doubanscraper3.MAX_RETRIES} retries, giving up on rating {rating}")
+                    break
+                retries = 0
+                if not result[1]:
+                    break
+                all_reviews.extend(result[0])
+                start += 20
+                continue
+            retries = 0
+
+            review_ids = parse_review_ids(html)
+            if not review_ids:
+                print(f"No more reviews found for rating {rating}")
+                break
+
+            for review_id in review_ids:
+                review = fetch_review(session, driver, title, rating, review_id, cache)
+                if review is None:
+                    print(f"⚠️ Empty review text for {review_id}, skipping.")
+                    continue
+                all_reviews.append(review)
+
+            get_metrics().add_reviews(len(all_reviews) - reviews_before, 'douban_long', title, rating,
+                                      time.perf_counter() - page_started)
+            print(f"✅ {len(all_reviews)} reviews so far for '{title}'")
+            start += 20
+
+    return all_reviews
+
+
+def crawl(titles=None):
+    """
+    Scrape long reviews over HTTP after an interactive browser login
+    :param titles: dict of title -> Douban subject ID (defaults to every registry title)
+    """
+    # The browser is only used for the interactive login and as a fallback
+    driver = doubanscraper3.make_driver()
+    doubanscraper3.login(driver)
+
+    session = get_session(cookie_file='douban_cookies.json')
+    hand_off_cookies(driver, session)
+
+    for title, movie_id in (titles or doubanscraper3.titles).items():
+        all_reviews = scrape_title_hybrid(session, driver, title, movie_id, cache=doubanscraper3.cache)
+        doubanscraper3.save_reviews(title, all_reviews)
+
+    print(f"\nRequest latency: {session.latency_summary()}")
+    session.close()
+    driver.quit()
+
+
+def main():
+    metrics = get_metrics(**RUN_METRICS)
+    try:
+        crawl()
+    finally:
+        metrics.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,45 @@
-import requests
-from bs4 import BeautifulSoup
-import time
-import random
+import os
+import re
 import csv
+import time
 import warnings
 from datetime import datetime
+from urllib.parse import urlsplit, parse_qs
+from http_session import get_session
+from comment_parser import parse_comment_page
+from page_cache import PageCache, CrawlCheckpoint
+from review_sink import ReviewSink
+from review_store import ReviewStoreWriter
+from near_dup import NearDupIndex
+from rate_limiter import get_rate_limiter
+from titles import douban_ids
+from watermark import Watermarks
+from crawl_metrics import get_metrics, RUN_METRICS
 warnings.filterwarnings('ignore')
 
+# Movie title -> Douban subject ID
+TITLES = douban_ids()
+
+FIELDNAMES = ['name', 'rating', 'time', 'comment', 'title']
+
+# Overridable so the scrapers can be pointed at a local stand-in server (see scraper_bench.py)
+DOUBAN_MOVIE_URL = os.environ.get('DOUBAN_MOVIE_URL', 'https://movie.douban.com')
+COMMENTS_URL = DOUBAN_MOVIE_URL + "/subject/{movie_id}/comments?percent_type=l&limit=20&status=P&sort=new_score"
+WATERMARK_FILE = 'watermarks.json'
+
+ANTI_BOT_MARKERS = ["请输入验证码", "验证码", "访问过于频繁", "请求过于频繁"]
+
+def is_anti_bot(html):
+    """Check whether a page is Douban's captcha / rate limit page"""
+    return any(indicator in html for indicator in ANTI_BOT_MARKERS)
+
+def parse_timed(html, title):
+    """parse_comment_page, recording its time in the crawl metrics"""
+    started = time.perf_counter()
+    reviews = parse_comment_page(html, title)
+    get_metrics().parse(time.perf_counter() - started, len(reviews))
+    return reviews
+
 def save_to_csv(reviews, filename=None):
     """Save reviews to CSV file"""
     if not reviews:
@@ -19,8 +52,7 @@ def save_to_csv(reviews, filename=None):
     
     try:
         with open(filename, 'w', newline='', encoding='utf-8-sig') as csvfile:
-            fieldnames = ['name', 'rating', 'time', 'comment', 'title']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+            writer = csv.DictWriter(csvfile, fieldnames=FIELDNAMES)
             
             # Write header
             writer.writeheader()
@@ -34,14 +66,29 @@ def save_to_csv(reviews, filename=None):
     except Exception as e:
         print(f"Error saving to CSV: {e}")
 
-def scrape_all_pages(base_url, title, limit_per_page=20, max_pages=50):
+def scrape_all_pages(base_url, title, limit_per_page=20, max_pages=50, session=None, cache=None, checkpoint=None,
+                     sink=None, limiter=None, max_retries=3):
     """
     Scrape all pages until no more reviews are found
     :param base_url: URL without start parameter
     :param limit_per_page: Number of reviews per page (usually 20)
     :param max_pages: Safety limit to prevent infinite loops
+    :param session: PooledSession to fetch with (defaults to the shared one)
+    :param cache: Optional PageCache fetched pages are stored in; only pages the checkpoint
+                  marks done are served from it
+    :param checkpoint: Optional CrawlCheckpoint; pages it marks done (and the cache still holds within
+                       its TTL) are re-parsed from the cache without waiting
+    :param sink: Optional ReviewSink; each page is written to it as soon as it is parsed and
+                 the returned list stays empty
+    :param limiter: AdaptiveRateLimiter pacing the requests (defaults to the shared one)
+    :param max_retries: Times a blocked or failed page is retried after the limiter backs off
     """
+    session = session or get_session()
+    limiter = limiter or get_rate_limiter()
+    rating = parse_qs(urlsplit(base_url).query).get('percent_type', [''])[0]
     all_reviews = []
+    collected = 0
+    retries = 0
     current_page = 0
 
     while current_page < max_pages:
@@ -54,8 +101,28 @@ def scrape_all_pages(base_url, title, limit_per_page=20, max_pages=50):
         url = f"{base_without_start}&start={current_page * limit_per_page}"
         print(f"URL: {url}")
         
-        # Scrape the page
-        page_reviews = scrape_single_page(url, title)
+        # Reuse the page from an interrupted run if it was finished and is still fresh in the cache
+        start = current_page * limit_per_page
+        cached_html = (cache.get(url) if checkpoint is not None and cache is not None
+                       and checkpoint.is_done(title, rating, start) else None)
+        
+        page_started = time.perf_counter()
+        if cached_html is not None:
+            print("Page finished in an earlier run, re-parsing cached HTML")
+            page_reviews = parse_timed(cached_html, title)
+        else:
+            # Scrape the page
+            page_reviews = scrape_single_page(url, title, session, cache, limiter)
+            
+            # Blocked or failed: the limiter has backed off, so try the same page again
+            if page_reviews is None and retries < max_retries:
+                retries += 1
+                print(f"Retrying page {current_page + 1} ({retries}/{max_retries})")
+                continue
+            retries = 0
+            
+            if page_reviews and checkpoint is not None:
+                checkpoint.mark_done(title, rating, start, reviews=len(page_reviews))
         
         # Check if we got any reviews
         if not page_reviews:
@@ -63,30 +130,91 @@ def scrape_all_pages(base_url, title, limit_per_page=20, max_pages=50):
             break
         
         # Check if we got fewer reviews than expected (last page)
-        all_reviews.extend(page_reviews)
+        if sink is not None:
+            sink.write(page_reviews)
+        else:
+            all_reviews.extend(page_reviews)
+        collected += len(page_reviews)
+        get_metrics().add_reviews(len(page_reviews), 'douban', title, rating, time.perf_counter() - page_started)
         print(f"Successfully scraped {len(page_reviews)} reviews from page {current_page + 1}")
-        print(f"Total reviews collected so far: {len(all_reviews)}")
+        print(f"Total reviews collected so far: {collected}")
         
         # If we got fewer than the limit, this is the last page
         if len(page_reviews) < limit_per_page:
             print(f"Got {len(page_reviews)} reviews (less than {limit_per_page}). This appears to be the last page!")
             break
         
-        # Prepare for next page
+        # Prepare for next page (the limiter decides how long to wait before fetching it)
         current_page += 1
-        
-        # Random delay between pages (but not after the last page)
-        delay = random.uniform(5, 10)
-        print(f"Waiting {delay:.1f} seconds before next page...")
-        time.sleep(delay)
     
     if current_page >= max_pages:
         print(f"\nWarning: Reached maximum page limit ({max_pages}). There might be more reviews available.")
     
     return all_reviews
 
-def scrape_multiple_pages(base_url, num_pages=5):
+def newest_first(url):
+    """The same comments listing sorted by time, newest first"""
+    return re.sub(r'sort=[^&]*', 'sort=time', url) if 'sort=' in url else f"{url}&sort=time"
+
+def scrape_new_pages(base_url, title, watermarks, limit_per_page=20, max_pages=100, session=None, sink=None,
+                     limiter=None, max_retries=3, source='douban'):
+    """
+    Incremental counterpart of scrape_all_pages: walk the comments newest-first
+    and stop at the first page that reaches the (source, title, rating) watermark,
+    so a refresh costs one page per title plus one per 20 new comments.
+    Pages are always fetched fresh (the cache and checkpoint would serve old pages).
+    The watermark is left alone: the caller advances it with the returned reviews
+    once they are safely stored, and only when the walk was complete.
+    :param watermarks: Watermarks holding the newest comment seen per bucket
+    :return: (new reviews, whether the walk reached the watermark or the end of the list)
+    """
+    session = session or get_session()
+    limiter = limiter or get_rate_limiter()
+    rating = parse_qs(urlsplit(base_url).query).get('percent_type', [''])[0]
+    base_without_start = newest_first(base_url.split('&start=')[0] if '&start=' in base_url else base_url)
+    had_mark = watermarks.get(source, title, rating) is not None
+    fresh = []
+    retries = 0
+    current_page = 0
+    reached = False
+
+    while current_page < max_pages:
+        url = f"{base_without_start}&start={current_page * limit_per_page}"
+        page_started = time.perf_counter()
+        page_reviews = scrape_single_page(url, title, session, limiter=limiter)
+        if page_reviews is None:
+            if retries < max_retries:
+                retries += 1
+                print(f"Retrying page {current_page + 1} ({retries}/{max_retries})")
+                continue
+            print(f"Giving up on {title} ({rating}) at page {current_page + 1}; its watermark will stay where it was")
+            break
+        retries = 0
+
+        new_reviews, reached = watermarks.split(source, title, rating, page_reviews)
+        if new_reviews:
+            fresh.extend(new_reviews)
+            if sink is not None:
+                sink.write(new_reviews)
+            get_metrics().add_reviews(len(new_reviews), source, title, rating, time.perf_counter() - page_started)
+        print(f"Page {current_page + 1}: {len(new_reviews)} new of {len(page_reviews)}")
+
+        if reached or len(page_reviews) < limit_per_page:
+            reached = True
+            break
+        current_page += 1
+
+    complete = reached or (not had_mark and page_reviews is not None)
+    if not complete and page_reviews is not None:
+        print(f"\nWarning: {max_pages} pages of new comments without reaching the watermark of {title}; "
+              f"not advancing it so the next run fills the gap")
+    print(f"{len(fresh)} new comments for {title} in {current_page + 1} pages")
+    return fresh, complete
+
+def scrape_multiple_pages(base_url, num_pages=5, title='', session=None, sink=None, limiter=None):
     """Scrape a specific number of pages (keeping old function for backward compatibility)"""
+    session = session or get_session()
+    limiter = limiter or get_rate_limiter()
     all_reviews = []
     
     # The base URL should NOT include the start parameter
@@ -104,147 +232,106 @@ def scrape_multiple_pages(base_url, num_pages=5):
         print(f"URL: {url}")
         
         # Use the base scraping function with modified URL
-        page_reviews = scrape_single_page(url)
+        page_reviews = scrape_single_page(url, title, session, limiter=limiter)
         
         if page_reviews:
-            all_reviews.extend(page_reviews)
+            if sink is not None:
+                sink.write(page_reviews)
+            else:
+                all_reviews.extend(page_reviews)
             print(f"Successfully scraped {len(page_reviews)} reviews from page {page + 1}")
         else:
             print(f"No reviews found on page {page + 1}")
-        
-        # Random delay between pages to avoid rate limiting
-        if page < num_pages - 1:  # Don't wait after the last page
-            delay = random.uniform(5, 10)
-            print(f"Waiting {delay:.1f} seconds before next page...")
-            time.sleep(delay)
     
     return all_reviews
 
-def scrape_single_page(url, title):
-    """Modified version of scrape_reviews to work with any URL"""
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-        'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-        'Connection': 'keep-alive',
-        'Upgrade-Insecure-Requests': '1',
-        'Sec-Fetch-Dest': 'document',
-        'Sec-Fetch-Mode': 'navigate',
-        'Sec-Fetch-Site': 'none',
-        'Cache-Control': 'max-age=0',
-    }
-    
+def scrape_single_page(url, title, session=None, cache=None, limiter=None):
+    """
+    Modified version of scrape_reviews to work with any URL.
+    Returns None instead of a list when the page was blocked or could not be fetched.
+    The page is always fetched: a cached listing page may be missing newer comments,
+    so the cache is only written here (scrape_all_pages reuses it for checkpointed pages).
+    """
     try:
-        session = requests.Session()
-        session.headers.update(headers)
+        session = session or get_session()
+        limiter = limiter or get_rate_limiter()
         
+        limiter.wait(url)
         response = session.get(url, timeout=10)
         print(f"Status code: {response.status_code}")
         
         if response.status_code != 200:
             print(f"Got non-200 status code: {response.status_code}")
-            return []
-        
-        soup = BeautifulSoup(response.text, 'html.parser')
+            limiter.record(url, ok=False)
+            return None
         
         # Check for anti-bot indicators
-        if any(indicator in response.text for indicator in ["请输入验证码", "验证码", "访问过于频繁", "请求过于频繁"]):
+        if is_anti_bot(response.text):
             print("Detected anti-bot measure!")
-            return []
+            get_metrics().anti_bot_hit(url)
+            limiter.record(url, ok=False)
+            return None
         
-        comment_items = soup.find_all('div', class_='comment-item')
-        print(f"Found {len(comment_items)} comment items")
+        limiter.record(url, ok=True)
         
-        reviews = []
+        if cache is not None:
+            cache.put(url, response.text)
         
-        for i, item in enumerate(comment_items):
-            review_data = {
-                'name': '',
-                'comment': '',
-                'rating': '',
-                'time': '',
-                'title': title
-            }
-            
-            try:
-                # Extract name - it's in comment-info span, in a link to douban.com/people/
-                name_elem = None
-                
-                # Method 1: Look for name in comment-info section
-                comment_info = item.find('span', class_='comment-info')
-                if comment_info:
-                    name_elem = comment_info.find('a', href=lambda x: x and 'douban.com/people/' in x)
-                
-                # Method 2: Look anywhere for link to people profile
-                if not name_elem:
-                    name_elem = item.find('a', href=lambda x: x and 'douban.com/people/' in x)
-                
-                # Method 3: Look for link with class 'u' (sometimes used)
-                if not name_elem:
-                    name_elem = item.find('a', class_='u')
-                
-                if name_elem:
-                    review_data['name'] = name_elem.get_text().strip()
-                
-                # Extract comment text
-                comment_elem = item.find('p', class_='comment-content')
-                if comment_elem:
-                    comment_text = comment_elem.get_text().strip()
-                    review_data['comment'] = comment_text
-                
-                # Extract rating
-                rating_elem = item.find('span', class_=lambda x: x and 'allstar' in str(x))
-                if rating_elem:
-                    rating_class = rating_elem.get('class', [])
-                    for cls in rating_class:
-                        if 'allstar' in cls and cls != 'allstar':
-                            rating_num = ''.join(filter(str.isdigit, cls))
-                            if rating_num:
-                                stars = int(rating_num) // 10
-                                review_data['rating'] = f"{stars}"
-                
-                # Extract time
-                time_elem = item.find('span', class_='comment-time')
-                if time_elem:
-                    time_text = time_elem.get_text().strip()
-                    review_data['time'] = time_text
-                
-                if review_data['comment']:
-                    reviews.append(review_data)
-                
-            except Exception as e:
-                print(f"Error processing comment {i+1}: {e}")
-                continue
+        reviews = parse_timed(response.text, title)
+        print(f"Found {len(reviews)} comments")
         
         return reviews
         
     except Exception as e:
         print(f"Error scraping page: {e}")
-        return []
+        return None
 
-def main():
-    print("Starting Douban movie comments scraper...")
+def crawl(titles=TITLES, incremental=False):
+    """
+    Scrape every page of short comments for each title into its CSV and the review store
+    :param titles: dict of title -> Douban subject ID
+    :param incremental: Only fetch comments newer than each title's watermark, appending them to its CSV
+    """
+    session = get_session(cookie_file='douban_cookies.json')
+    cache = PageCache('page_cache')
+    checkpoint = CrawlCheckpoint('douban_checkpoint.json')
+    # One index for every title: the same copy-pasted comments turn up under different titles and rating buckets
+    near_dups = NearDupIndex(text_field='comment')
     
-    titles = {'Avatar': '1652587', 
-          'Avatar: The Way of Water': '4811774', 
-          'Jurassic World: Fallen Kingdom': '26416062', 
-          'Transformers: The Last Knight': '25824686', 
-          'Zootopia': '25662329', 
-          'Warcraft': '2131940', 
-          'Avengers: Age of Ultron': '10741834', 
-          'Fast & Furious Presents: Hobbs & Shaw': '27163278', 
-          'Jurassic World': '10440138', 
-          'Spider-Man: Far From Home': '26931786', 
-          'Ready Player One': '4920389'}
-
-    for title in titles:
-        print("\nOption 3: Scraping ALL pages...")
-        base_url = f"https://movie.douban.com/subject/{titles[title]}/comments?percent_type=l&limit=20&status=P&sort=new_score"
-        all_reviews = scrape_all_pages(base_url, title, limit_per_page=20, max_pages=100)
-        
-        if all_reviews:
-            save_to_csv(all_reviews, f'{title}_douban_reviews_all_pages.csv')
-            print(f"\nTotal reviews collected: {len(all_reviews)}")
+    watermarks = Watermarks(WATERMARK_FILE) if incremental else None
+    
+    for title, movie_id in titles.items():
+        base_url = COMMENTS_URL.format(movie_id=movie_id)
+        with ReviewSink(f'{title}_douban_reviews_all_pages.csv', FIELDNAMES, mirror=ReviewStoreWriter(source='douban'),
+                        near_dups=near_dups, append=incremental) as sink:
+            already_written = sink.written
+            if incremental:
+                print("\nScraping comments newer than the watermark...")
+                fresh, complete = scrape_new_pages(base_url, title, watermarks, session=session, sink=sink)
+            else:
+                print("\nOption 3: Scraping ALL pages...")
+                scrape_all_pages(base_url, title, limit_per_page=20, max_pages=100,
+                                 session=session, cache=cache, checkpoint=checkpoint, sink=sink)
+        # The sink has published the CSV and flushed the store, so the new reviews can't be lost any more
+        if incremental and complete:
+            watermarks.advance('douban', title, parse_qs(urlsplit(base_url).query)['percent_type'][0], fresh)
+        # The title is finished: the next full crawl fetches all of its pages again
+        checkpoint.clear(title)
+        print(f"\nTotal reviews collected: {sink.written - already_written}")
+    
+    print(f"\nRequest latency: {session.latency_summary()}")
+    print(f"Final request rates: {get_rate_limiter().rates()}")
+    session.close()
+    cache.evict()
+
+def main(incremental=False):
+    print("Starting Douban movie comments scraper...")
+    metrics = get_metrics(**RUN_METRICS)
+    try:
+        crawl(TITLES, incremental)
+    finally:
+        metrics.close()
         
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    import sys
+    main(incremental='--incremental' in sys.argv[1:])
\ No newline at end of file
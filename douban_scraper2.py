@@ -1,39 +1,42 @@
 import os
-import time
-import pandas as pd
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+from rate_limiter import get_rate_limiter
+from douban_review_scraping import is_anti_bot, DOUBAN_MOVIE_URL
+from titles import douban_ids
 
 # === SETUP ===
-# Replace with one movie from your `titles` dict
-titles = {"Avatar": "1652587"}  # Replace this as needed
 output_folder = "output1"
-os.makedirs(output_folder, exist_ok=True)
-
-# Set up Chrome driver
-chrome_options = Options()
-chrome_options.add_experimental_option("detach", True)  # Keep browser open after script ends
-driver = webdriver.Chrome(options=chrome_options)
-wait = WebDriverWait(driver, 10)
-
-# Prompt user to log in
-driver.get("https://www.douban.com/")
-input("Please log into Douban manually in the browser window. Press Enter here when done...")
+MAX_RETRIES = 3  # Anti-bot pages retried per listing page before giving up on a rating
 
 # === FUNCTION TO SCRAPE ONE MOVIE ===
-def scrape_movie_reviews(title, movie_id):
+def scrape_movie_reviews(driver, title, movie_id):
+    wait = WebDriverWait(driver, 10)
+    limiter = get_rate_limiter()
     all_reviews = []
 
     for rating in [1, 2]:  # 1-star and 2-star reviews
         start = 0
+        retries = 0
         while True:
-            url = f"https://movie.douban.com/subject/{movie_id}/reviews?sort=hotest&rating={rating}&start={start}"
+            url = f"{DOUBAN_MOVIE_URL}/subject/{movie_id}/reviews?sort=hotest&rating={rating}&start={start}"
+            limiter.wait(url)
             driver.get(url)
-            time.sleep(2)
+            wait.until(lambda d: d.execute_script("return document.readyState") == "complete")
+
+            if is_anti_bot(driver.page_source):
+                limiter.record(url, ok=False)
+                if retries < MAX_RETRIES:
+                    retries += 1
+                    print(f"⚠️ Anti-bot page, retrying after backoff ({retries}/{MAX_RETRIES})")
+                    continue
+                print(f"🚫 Still blocked after {MAX_RETRIES} retries, giving up on rating {rating}")
+                break
+            limiter.record(url, ok=True)
+            retries = 0
 
             review_divs = driver.find_elements(By.CSS_SELECTOR, "div.main.review-item")
             if not review_divs:
@@ -48,18 +51,13 @@ def scrape_movie_reviews(title, movie_id):
 
                     # Click "展开"
                     driver.execute_script("arguments[0].click();", expand_btn[0])
-                    time.sleep(0.5)  # Allow time for DOM to update
 
                     try:
-                        # Wait until the review content with <p> elements loads
-                        content_div = wait.until(
-                            EC.presence_of_element_located((By.CSS_SELECTOR, f"div.review-content.clearfix"))
-                        )
-
-                        # Wait for at least one <p> inside the review content
+                        # Wait until this review's expanded content with <p> elements loads
                         WebDriverWait(driver, 5).until(
-                            lambda d: len(content_div.find_elements(By.TAG_NAME, "p")) > 0
+                            lambda d: review_div.find_elements(By.CSS_SELECTOR, "div.review-content.clearfix p")
                         )
+                        content_div = review_div.find_element(By.CSS_SELECTOR, "div.review-content.clearfix")
 
                         # Extract all non-empty paragraphs
                         ps = content_div.find_elements(By.TAG_NAME, "p")
@@ -87,16 +85,30 @@ def scrape_movie_reviews(title, movie_id):
                     continue
 
             start += 20
-            time.sleep(1)
 
     # Save to CSV
+    import pandas as pd
+    os.makedirs(output_folder, exist_ok=True)
     df = pd.DataFrame(all_reviews)
     output_path = os.path.join(output_folder, f"{title}.csv")
     df.to_csv(output_path, index=False)
     print(f"✅ Saved {len(df)} reviews for '{title}' to {output_path}")
 
 
-# === RUN SCRIPT FOR ONE MOVIE ===
-for title, movie_id in titles.items():
-    scrape_movie_reviews(title, movie_id)
-    break  # Only do one movie for now
\ No newline at end of file
+def main(names=("Avatar",)):
+    """Log in, then scrape one movie (or the given registry titles)"""
+    # Set up Chrome driver
+    chrome_options = Options()
+    chrome_options.add_experimental_option("detach", True)  # Keep browser open after script ends
+    driver = webdriver.Chrome(options=chrome_options)
+
+    # Prompt user to log in
+    driver.get("https://www.douban.com/")
+    input("Please log into Douban manually in the browser window. Press Enter here when done...")
+
+    # === RUN SCRIPT ===
+    for title, movie_id in douban_ids(names).items():
+        scrape_movie_reviews(driver, title, movie_id)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
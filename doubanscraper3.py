@@ -1,175 +1,393 @@
 import os
 import time
-import pandas as pd
+from collections import namedtuple
 from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.common.action_chains import ActionChains
+from page_cache import PageCache, CrawlCheckpoint
+from comment_parser import parse_review_page, REVIEW_CONTENT_SELECTORS
+from rate_limiter import get_rate_limiter
+from crawl_metrics import get_metrics, RUN_METRICS
+from douban_review_scraping import is_anti_bot, DOUBAN_MOVIE_URL
+from selenium_pool import BrowserPool, RetryTask
+from review_store import ReviewStoreWriter
+from titles import douban_ids
 
 # === SETUP ===
-# Add as many movies as you want here
-titles = {
-'Aquaman': '3878007',
-'Avatar: The Way of Water': '4811774', 
-'Avengers: Age of Ultron': '10741834', 
-'Avengers: Endgame': '26100958',
-'Avengers: Infinity War': '24773958',
-'Everything Everywhere All at Once': '30314848',
-'Fast & Furious Presents: Hobbs & Shaw': '27163278', 
-'Furious 7': '23761370',
-'Jurassic World': '10440138', 
-'Jurassic World: Fallen Kingdom': '26416062', 
-'Ready Player One': '4920389',
-'Spider-Man: Far From Home': '26931786', 
-'The Fate of the Furious': '26260853',
-'Transformers: Age of Extinction': '7054604',
-'Transformers: The Last Knight': '25824686', 
-'Venom': '3168101',
-'Warcraft': '2131940', 
-'Zootopia': '25662329',
-}
+# Every Douban title in the registry (titles.py)
+titles = douban_ids()
 output_folder = "output1"
 os.makedirs(output_folder, exist_ok=True)
 
-# Set up Chrome driver
-chrome_options = Options()
-chrome_options.add_experimental_option("detach", True)
-# Add these options to improve reliability
-chrome_options.add_argument("--disable-blink-features=AutomationControlled")
-chrome_options.add_experimental_option("useAutomationExtension", False)
-chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
+# Expanded listing pages are cached so a restarted run can skip finished pages
+cache = PageCache("page_cache")
+checkpoint = CrawlCheckpoint("doubanscraper3_checkpoint.json")
 
-driver = webdriver.Chrome(options=chrome_options)
-driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
-wait = WebDriverWait(driver, 15)  # Increased timeout
+# Paces page loads instead of a fixed sleep, backing off when Douban shows its anti-bot page
+limiter = get_rate_limiter()
+MAX_RETRIES = 3
 
-# Prompt user to log in
-driver.get("https://www.douban.com/")
-input("Please log into Douban manually in the browser window. Press Enter here when done...")
+# Number of browsers scraping in parallel after the login (1 = the original single-browser loop)
+POOL_SIZE = os.cpu_count() or 1
+HEADLESS = True
 
-def scrape_movie_reviews(title, movie_id):
-    all_reviews = []
+# Expand and read every review on a page with one in-browser script instead of per-review WebDriver calls
+BATCHED_EXTRACTION = True
 
-    for rating in [1, 2]:
-        start = 0
-        while True:
-            url = f"https://movie.douban.com/subject/{movie_id}/reviews?sort=hotest&rating={rating}&start={start}"
-            print(f"📄 Loading page: {url}")
-            driver.get(url)
-            time.sleep(3)  # Increased wait time
-
-            # Find all review divs
-            review_divs = driver.find_elements(By.CSS_SELECTOR, "div.main.review-item")
-            if not review_divs:
-                print(f"No more reviews found for rating {rating}")
-                break
+LISTING_URL = DOUBAN_MOVIE_URL + "/subject/{movie_id}/reviews?sort=hotest&rating={rating}&start={start}"
 
-            print(f"Found {len(review_divs)} reviews on this page")
+PageTask = namedtuple("PageTask", ["title", "movie_id", "rating", "start"])
+
+def make_driver(headless=False):
+    """Start a Chrome instance with the automation flags hidden"""
+    chrome_options = Options()
+    if headless:
+        chrome_options.add_argument("--headless=new")
+    else:
+        chrome_options.add_experimental_option("detach", True)
+    # Add these options to improve reliability
+    chrome_options.add_argument("--disable-blink-features=AutomationControlled")
+    chrome_options.add_experimental_option("useAutomationExtension", False)
+    chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
+
+    driver = webdriver.Chrome(options=chrome_options)
+    driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+    return driver
+
+def login(driver):
+    """Prompt user to log in"""
+    driver.get("https://www.douban.com/")
+    input("Please log into Douban manually in the browser window. Press Enter here when done...")
+
+# Expands every folded review on the page, waits for their full text to be inserted
+# (watched with a MutationObserver instead of fixed sleeps), then returns all reviews at once
+EXPAND_AND_EXTRACT_JS = r"""
+const done = arguments[arguments.length - 1];
+const selectors = arguments[0];
+const timeoutMs = arguments[1];
+const items = Array.from(document.querySelectorAll("div.main.review-item"));
+
+function findContent(item) {
+    for (const selector of selectors) {
+        const el = item.querySelector(selector.replace("{review_id}", item.id));
+        if (el) return el;
+    }
+    return null;
+}
+
+function contentText(el) {
+    const ps = Array.from(el.querySelectorAll("p")).map(p => p.innerText.trim()).filter(t => t);
+    return ps.length ? ps.join("\n") : el.innerText.trim();
+}
+
+function stars(item) {
+    const el = item.querySelector("[class*='allstar']");
+    const m = el && el.className.match(/allstar(\d+)/);
+    return m ? Math.floor(parseInt(m[1], 10) / 10) : null;
+}
 
-            for i, review_div in enumerate(review_divs):
+const pending = new Set();
+for (const item of items) {
+    const button = item.querySelector(`a.unfold[id="toggle-${item.id}-copy"]`);
+    if (button) {
+        pending.add(item);
+        button.click();
+    }
+}
+
+let finished = false;
+function collect() {
+    if (finished) return;
+    finished = true;
+    observer.disconnect();
+    clearTimeout(timer);
+    done(items.map(item => {
+        const el = findContent(item);
+        return {
+            id: item.id,
+            text: el ? contentText(el) : "",
+            stars: stars(item),
+            url: el ? (el.getAttribute("data-url") || el.getAttribute("href")) : null,
+        };
+    }));
+}
+
+function check() {
+    for (const item of Array.from(pending)) {
+        const el = findContent(item);
+        if (el && contentText(el)) pending.delete(item);
+    }
+    if (pending.size === 0) collect();
+}
+
+const observer = new MutationObserver(check);
+observer.observe(document.body, {childList: true, subtree: true, characterData: true});
+const timer = setTimeout(collect, timeoutMs);
+check();
+"""
+
+def wait_for_page(driver, timeout=15):
+    """Wait until the listing has finished loading instead of sleeping a fixed time"""
+    WebDriverWait(driver, timeout).until(lambda d: d.execute_script("return document.readyState") == "complete")
+
+def extract_reviews_batched(driver, title, rating, timeout=10):
+    """
+    Expand and extract every review on the loaded page in a single execute_async_script call.
+    Returns (reviews, number of review items on the page).
+    """
+    driver.set_script_timeout(timeout + 5)
+    payload = driver.execute_async_script(EXPAND_AND_EXTRACT_JS, REVIEW_CONTENT_SELECTORS, timeout * 1000)
+
+    page_reviews = []
+    for item in payload:
+        if not item["text"]:
+            print(f"⚠️ Empty review text for {item['id']}, skipping.")
+            continue
+        page_reviews.append({
+            "title": title,
+            "review_text": item["text"],
+            "stars": rating,
+            "url": item["url"] or f"https://movie.douban.com/review/{item['id']}/",
+        })
+
+    print(f"✅ Extracted {len(page_reviews)}/{len(payload)} reviews in one round trip")
+    return page_reviews, len(payload)
+
+def extract_reviews_one_by_one(driver, review_divs, title, rating):
+    """Original extraction: expand and read each review with its own WebDriver calls"""
+    page_reviews = []
+
+    for i, review_div in enumerate(review_divs):
+        try:
+            review_id = review_div.get_attribute("id")
+            print(f"Processing review {i+1}/{len(review_divs)}: {review_id}")
+            
+            # Check if there's an expand button
+            expand_btn = review_div.find_elements(By.CSS_SELECTOR, f"a.unfold#toggle-{review_id}-copy")
+            
+            if expand_btn:
+                # Scroll the expand button into view
+                driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", expand_btn[0])
+                
+                # Try to click using JavaScript if regular click fails
                 try:
-                    review_id = review_div.get_attribute("id")
-                    print(f"Processing review {i+1}/{len(review_divs)}: {review_id}")
-                    
-                    # Check if there's an expand button
-                    expand_btn = review_div.find_elements(By.CSS_SELECTOR, f"a.unfold#toggle-{review_id}-copy")
-                    
-                    if expand_btn:
-                        # Scroll the expand button into view
-                        driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", expand_btn[0])
-                        time.sleep(1)
-                        
-                        # Try to click using JavaScript if regular click fails
-                        try:
-                            expand_btn[0].click()
-                        except:
-                            driver.execute_script("arguments[0].click();", expand_btn[0])
-                        
-                        # Wait longer for content to expand
-                        time.sleep(2)
-                        
-                        # Wait for the expanded content to appear
-                        try:
-                            # Try multiple possible selectors for expanded content
-                            content_selectors = [
-                                "div.review-content.clearfix",
-                                "div.review-content", 
-                                f"div#toggle-{review_id}-copy-content",
-                                "div.full-content"
-                            ]
-                            
-                            content_div = None
-                            for selector in content_selectors:
-                                elements = review_div.find_elements(By.CSS_SELECTOR, selector)
-                                if elements:
-                                    content_div = elements[0]
-                                    break
-                            
-                            if not content_div:
-                                print(f"⚠️ Could not find expanded content for review {review_id}")
-                                continue
-
-                        except Exception as e:
-                            print(f"⚠️ Error waiting for expanded content: {e}")
-                            continue
-                    else:
-                        # No expand button, get content directly
-                        content_div = review_div.find_element(By.CSS_SELECTOR, "div.review-content.clearfix")
-
-                    # Extract text from paragraphs
-                    ps = content_div.find_elements(By.TAG_NAME, "p")
-                    full_text = "\n".join([p.text.strip() for p in ps if p.text.strip()])
-                    
-                    # If no paragraphs, try getting all text from the content div
-                    if not full_text.strip():
-                        full_text = content_div.text.strip()
-                    
-                    # Skip if still empty
-                    if not full_text.strip():
-                        print(f"⚠️ Empty review text for {review_id}, skipping.")
-                        continue
-
-                    # Get URL - try different attributes
-                    url_attr = None
-                    for attr in ['data-url', 'href']:
-                        url_attr = content_div.get_attribute(attr)
-                        if url_attr:
-                            break
-                    
-                    # If no URL in content div, construct it
-                    if not url_attr:
-                        url_attr = f"https://movie.douban.com/review/{review_id}/"
-
-                    # Build review dict
-                    review_data = {
-                        "title": title,
-                        "review_text": full_text,
-                        "stars": rating,
-                        "url": url_attr,
-                    }
-                    all_reviews.append(review_data)
-                    print(f"✅ Successfully scraped review {review_id} ({len(full_text)} chars)")
+                    WebDriverWait(driver, 5).until(EC.element_to_be_clickable(expand_btn[0])).click()
+                except:
+                    driver.execute_script("arguments[0].click();", expand_btn[0])
+                
+                # Wait for the expanded content to appear
+                try:
+                    # Try multiple possible selectors for expanded content
+                    content_selectors = [sel.format(review_id=review_id) for sel in REVIEW_CONTENT_SELECTORS]
+
+                    def expanded_content(_):
+                        for selector in content_selectors:
+                            elements = review_div.find_elements(By.CSS_SELECTOR, selector)
+                            if elements:
+                                return elements[0]
+                        return False
+
+                    content_div = WebDriverWait(driver, 10).until(expanded_content)
 
                 except Exception as e:
-                    print(f"⚠️ Error processing review: {str(e)}")
+                    print(f"⚠️ Could not find expanded content for review {review_id}: {e}")
                     continue
+            else:
+                # No expand button, get content directly
+                content_div = review_div.find_element(By.CSS_SELECTOR, "div.review-content.clearfix")
 
-            # Move to next page
-            start += 20
-            time.sleep(2)  # Be nice to the server
+            # Extract text from paragraphs
+            ps = content_div.find_elements(By.TAG_NAME, "p")
+            full_text = "\n".join([p.text.strip() for p in ps if p.text.strip()])
+            
+            # If no paragraphs, try getting all text from the content div
+            if not full_text.strip():
+                full_text = content_div.text.strip()
+            
+            # Skip if still empty
+            if not full_text.strip():
+                print(f"⚠️ Empty review text for {review_id}, skipping.")
+                continue
+
+            # Get URL - try different attributes
+            url_attr = None
+            for attr in ['data-url', 'href']:
+                url_attr = content_div.get_attribute(attr)
+                if url_attr:
+                    break
+            
+            # If no URL in content div, construct it
+            if not url_attr:
+                url_attr = f"https://movie.douban.com/review/{review_id}/"
+
+            # Build review dict
+            review_data = {
+                "title": title,
+                "review_text": full_text,
+                "stars": rating,
+                "url": url_attr,
+            }
+            page_reviews.append(review_data)
+            print(f"✅ Successfully scraped review {review_id} ({len(full_text)} chars)")
 
-    # Save to CSV
+        except Exception as e:
+            print(f"⚠️ Error processing review: {str(e)}")
+            continue
+
+    return page_reviews
+
+def scrape_review_page(driver, title, movie_id, rating, start, batched=BATCHED_EXTRACTION):
+    """
+    Load one reviews listing page, expand its long reviews and extract them.
+    Returns (reviews, number of review items on the page), or None if Douban served its anti-bot page.
+    """
+    url = LISTING_URL.format(movie_id=movie_id, rating=rating, start=start)
+
+    # Page finished in an interrupted run: re-parse the cached expanded HTML while it is still fresh
+    metrics = get_metrics()
+    page_started = time.perf_counter()
+    cached_html = cache.get(url + "#expanded") if checkpoint.is_done(title, rating, start) else None
+    if cached_html is not None:
+        page_reviews = parse_review_page(cached_html, title, rating)
+        metrics.parse(time.perf_counter() - page_started, len(page_reviews))
+        metrics.add_reviews(len(page_reviews), 'douban_long', title, rating, time.perf_counter() - page_started)
+        print(f"♻️ Re-parsed {len(page_reviews)} reviews from cached page: {url}")
+        return page_reviews, checkpoint.get(title, rating, start)["reviews"]
+
+    print(f"📄 Loading page: {url}")
+    limiter.wait(url)
+    load_started = time.perf_counter()
+    driver.get(url)
+    wait_for_page(driver)
+    page_source = driver.page_source
+    metrics.request(url, time.perf_counter() - load_started, None, len(page_source.encode('utf-8')))
+
+    if is_anti_bot(page_source):
+        metrics.anti_bot_hit(url)
+        limiter.record(url, ok=False)
+        return None
+    limiter.record(url, ok=True)
+
+    extract_started = time.perf_counter()
+    if batched:
+        page_reviews, items_on_page = extract_reviews_batched(driver, title, rating)
+    else:
+        # Find all review divs
+        review_divs = driver.find_elements(By.CSS_SELECTOR, "div.main.review-item")
+        items_on_page = len(review_divs)
+        if review_divs:
+            print(f"Found {len(review_divs)} reviews on this page")
+            page_reviews = extract_reviews_one_by_one(driver, review_divs, title, rating)
+
+    metrics.parse(time.perf_counter() - extract_started, len(page_reviews) if items_on_page else 0)
+    if not items_on_page:
+        print(f"No more reviews found for rating {rating}")
+        return [], 0
+    metrics.add_reviews(len(page_reviews), 'douban_long', title, rating, time.perf_counter() - page_started)
+
+    # Remember the expanded page so a restart doesn't need the browser for it
+    cache.put(url + "#expanded", driver.page_source)
+    checkpoint.mark_done(title, rating, start, reviews=items_on_page)
+
+    return page_reviews, items_on_page
+
+def save_reviews(title, all_reviews):
+    """Save to CSV"""
     if all_reviews:
+        import pandas as pd
         df = pd.DataFrame(all_reviews)
         output_path = os.path.join(output_folder, f"{title}.csv")
         df.to_csv(output_path, index=False, encoding='utf-8')
         print(f"✅ Saved {len(df)} reviews for '{title}' to {output_path}")
+        with ReviewStoreWriter(source='douban_long') as store:
+            store.write(all_reviews)
     else:
         print(f"⚠️ No reviews found for '{title}'")
 
-# === RUN SCRIPT ===
-for title, movie_id in titles.items():
-    scrape_movie_reviews(title, movie_id)
\ No newline at end of file
+def scrape_movie_reviews(driver, title, movie_id):
+    all_reviews = []
+
+    for rating in [1, 2]:
+        start = 0
+        retries = 0
+        while True:
+            result = scrape_review_page(driver, title, movie_id, rating, start)
+
+            if result is None:
+                if retries < MAX_RETRIES:
+                    retries += 1
+                    print(f"🚫 Anti-bot page, retrying ({retries}/{MAX_RETRIES})")
+                    continue
+                print(f"🚫 Still blocked after {MAX_RETRIES} retries, giving up on rating {rating}")
+                break
+            retries = 0
+
+            page_reviews, items_on_page = result
+            if not items_on_page:
+                break
+            all_reviews.extend(page_reviews)
+
+            # Move to next page (the limiter paces the next load)
+            start += 20
+
+    save_reviews(title, all_reviews)
+    checkpoint.clear(title)
+
+def scrape_page_task(driver, task):
+    """BrowserPool handler: scrape one listing page and queue the next page of the same rating"""
+    result = scrape_review_page(driver, task.title, task.movie_id, task.rating, task.start)
+    if result is None:
+        raise RetryTask("anti-bot page")
+
+    page_reviews, items_on_page = result
+    follow_ups = [task._replace(start=task.start + 20)] if items_on_page else []
+    return page_reviews, follow_ups
+
+def scrape_with_pool(titles, pool_size=POOL_SIZE, headless=HEADLESS):
+    """Log in once, then scrape every (title, rating) page chain on a pool of browsers sharing that login"""
+    login_driver = make_driver()
+    login(login_driver)
+    cookies = login_driver.get_cookies()
+    login_driver.quit()
+    print(f"🍪 Exported {len(cookies)} cookies, starting {pool_size} workers")
+
+    pool = BrowserPool(lambda: make_driver(headless=headless), size=pool_size,
+                       cookies=cookies, cookie_url="https://www.douban.com/", max_task_retries=MAX_RETRIES)
+    tasks = [PageTask(title, movie_id, rating, 0) for title, movie_id in titles.items() for rating in [1, 2]]
+    results = pool.run(tasks, scrape_page_task)
+    print(f"🔧 Driver restarts: {pool.restarts}")
+
+    # Put pages back in (rating, start) order before saving each title
+    reviews_by_title = {title: [] for title in titles}
+    for task, page_reviews in sorted(results, key=lambda r: (r[0].rating, r[0].start)):
+        reviews_by_title[task.title].extend(page_reviews)
+    for title, all_reviews in reviews_by_title.items():
+        save_reviews(title, all_reviews)
+        checkpoint.clear(title)
+
+def crawl(titles=titles, pool_size=POOL_SIZE, headless=HEADLESS):
+    """Log in, then scrape the 1- and 2-star long reviews of every title"""
+    if pool_size > 1:
+        scrape_with_pool(titles, pool_size, headless)
+        cache.evict()
+        return
+
+    driver = make_driver()
+    login(driver)
+
+    # === RUN SCRIPT ===
+    for title, movie_id in titles.items():
+        scrape_movie_reviews(driver, title, movie_id)
+    cache.evict()
+
+def main(pool_size=POOL_SIZE, headless=HEADLESS):
+    metrics = get_metrics(**RUN_METRICS)
+    try:
+        crawl(titles, pool_size, headless)
+    finally:
+        metrics.close()
+
+if __name__ == "__main__":
+    main()
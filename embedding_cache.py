@@ -0,0 +1,153 @@
+import os
+import json
+import hashlib
+import threading
+
+import numpy as np
+
+KEY_SIZE = 16
+# Raw 16-byte records: an 'S16' dtype would strip the trailing NUL bytes some digests end in
+KEY_DTYPE = f'V{KEY_SIZE}'
+
+
+def text_key(text):
+    """16-byte blake2b digest identifying a comment's text"""
+    return hashlib.blake2b(str(text).encode('utf-8'), digest_size=KEY_SIZE).digest()
+
+
+def _safe_name(model_name, max_seq_length=None):
+    name = model_name.replace('/', '__')
+    return name if max_seq_length is None else f"{name}@{max_seq_length}"
+
+
+def _truncate(path, size):
+    """Cut a crash-torn append-only file back to size bytes"""
+    if os.path.exists(path) and os.path.getsize(path) > size:
+        with open(path, 'r+b') as f:
+            f.truncate(size)
+
+
+class EmbeddingCache:
+    """
+    Sentence embeddings for one model, keyed by text hash and kept on disk.
+
+    ``<root>/<model>/vectors.f32`` holds the float32 vectors back to back and
+    ``keys.bin`` the 16-byte text digest of each row, in the same order. Both
+    files are only ever appended to; vectors are written before their keys,
+    so a crash mid-append leaves rows without keys; load cuts both files back
+    to the rows that have a vector and a key, so later appends stay aligned.
+    Cached vectors are read through a read-only memmap. Vectors truncated at
+    different lengths differ, so each max_seq_length gets its own directory
+    (``<model>@<length>``; the plain ``<model>`` one is the model's default).
+    :param model_name: SentenceTransformer model the vectors come from
+    :param root: Cache directory
+    :param max_seq_length: Token limit the texts were encoded with (None: the model's default)
+    """
+
+    def __init__(self, model_name, root='embedding_cache', max_seq_length=None):
+        self.model_name = model_name
+        self.max_seq_length = max_seq_length
+        self.dir = os.path.join(root, _safe_name(model_name, max_seq_length))
+        self.vectors_path = os.path.join(self.dir, 'vectors.f32')
+        self.keys_path = os.path.join(self.dir, 'keys.bin')
+        self.meta_path = os.path.join(self.dir, 'meta.json')
+        self._lock = threading.Lock()
+        self.dim = None
+        self.rows = {}
+        self.count = 0
+        self._memmap = None
+        os.makedirs(self.dir, exist_ok=True)
+
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, encoding='utf-8') as f:
+                self.dim = json.load(f)['dim']
+            keys = np.fromfile(self.keys_path, dtype=KEY_DTYPE).tolist() if os.path.exists(self.keys_path) else []
+            stored = os.path.getsize(self.vectors_path) // (4 * self.dim) if os.path.exists(self.vectors_path) else 0
+            self.count = min(len(keys), stored)
+            _truncate(self.keys_path, self.count * KEY_SIZE)
+            _truncate(self.vectors_path, self.count * 4 * self.dim)
+            self.rows = {key: row for row, key in enumerate(keys[:self.count])}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def vectors(self):
+        """Every cached vector as a (count, dim) read-only memmap, indexed by cache row"""
+        if self._memmap is None or self._memmap.shape[0] != self.count:
+            if not self.count:
+                return np.empty((0, self.dim or 0), dtype=np.float32)
+            self._memmap = np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(self.count, self.dim))
+        return self._memmap
+
+    def lookup(self, texts):
+        """Cache row of each text, -1 where it hasn't been encoded"""
+        return np.array([self.rows.get(text_key(text), -1) for text in texts], dtype=np.int64)
+
+    def add(self, texts, vectors):
+        """Append vectors for texts not in the cache yet"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                with open(self.meta_path, 'w', encoding='utf-8') as f:
+                    json.dump({'model': self.model_name, 'dim': self.dim, 'max_seq_length': self.max_seq_length}, f)
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"{self.model_name} vectors have {self.dim} dimensions, got {vectors.shape[1]}")
+
+            new_keys, new_rows = {}, []
+            for i, text in enumerate(texts):
+                key = text_key(text)
+                if key not in self.rows and key not in new_keys:
+                    new_keys[key] = None
+                    new_rows.append(i)
+            if not new_keys:
+                return 0
+
+            with open(self.vectors_path, 'ab') as f:
+                vectors[new_rows].tofile(f)
+                f.flush()
+                os.fsync(f.fileno())
+            with open(self.keys_path, 'ab') as f:
+                f.write(b''.join(new_keys))
+            for key in new_keys:
+                self.rows[key] = self.count
+                self.count += 1
+            return len(new_keys)
+
+    def get(self, texts, encode):
+        """
+        Vectors for texts, in order, calling encode(list_of_texts) -> array only for texts never seen before
+        :return: (len(texts), dim) float32 array
+        """
+        texts = [str(text) for text in texts]
+        rows = self.lookup(texts)
+        missing = list(dict.fromkeys(text for text, row in zip(texts, rows) if row < 0))
+        if missing:
+            print(f"Encoding {len(missing)} new texts with {self.model_name} ({int((rows >= 0).sum())} cached)")
+            self.add(missing, encode(missing))
+            rows = self.lookup(texts)
+        else:
+            print(f"All {len(texts)} texts cached for {self.model_name}")
+
+        vectors = self.vectors()
+        if len(rows) == len(vectors) and np.array_equal(rows, np.arange(len(rows))):
+            return vectors
+        return vectors[rows]
+
+
+def cached_encode(texts, model_name, model=None, root='embedding_cache', max_seq_length=None, **encode_kwargs):
+    """
+    Drop-in for SentenceTransformer(model_name).encode(texts) that only encodes
+    texts missing from the cache; the model isn't even loaded when nothing is missing
+    :param max_seq_length: Truncate texts to this many tokens (None keeps the model's default)
+    """
+    def encode(missing):
+        nonlocal model
+        if model is None:
+            from sentence_transformers import SentenceTransformer
+            model = SentenceTransformer(model_name)
+        if max_seq_length is not None:
+            model.max_seq_length = max_seq_length
+        return model.encode(missing, **encode_kwargs)
+
+    return EmbeddingCache(model_name, root, max_seq_length).get(texts, encode)
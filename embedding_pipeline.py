@@ -0,0 +1,177 @@
+import os
+import sys
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from embedding_cache import EmbeddingCache
+
+# Models used by the notebooks: Chinese-only for Douban, multilingual for IMDb / joint clustering
+MODELS = {
+    'zh': 'shibing624/text2vec-base-chinese',
+    'multilingual': 'paraphrase-multilingual-MiniLM-L12-v2',
+}
+
+# Hub ids for the tokenizers of models the sentence-transformers package lets us name without an org
+_HUB_IDS = {'paraphrase-multilingual-MiniLM-L12-v2': 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2'}
+
+_model = None
+
+
+def _available_cores():
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def split_cores(workers):
+    """Contiguous, disjoint groups of cores, one per worker"""
+    cores = _available_cores()
+    workers = max(1, min(workers, len(cores)))
+    return [[int(c) for c in group] for group in np.array_split(cores, workers)]
+
+
+def _init_worker(model_name, core_groups, max_seq_length):
+    """Pin this worker to its own cores, size torch's thread pool to match, then load the model once"""
+    global _model
+    cores = core_groups.get()
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+    os.environ['OMP_NUM_THREADS'] = str(len(cores))
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+    torch.set_num_threads(len(cores))
+    _model = SentenceTransformer(model_name, device='cpu')
+    _model.max_seq_length = max_seq_length
+
+
+def _encode_batch(batch_id, texts):
+    # Each batch is already length-bucketed, so encode it as one padded batch
+    return batch_id, _model.encode(texts, batch_size=len(texts), convert_to_numpy=True, show_progress_bar=False)
+
+
+def token_lengths(texts, model_name, max_seq_length=256):
+    """Token count of each text under the model's tokenizer (character count if it can't be loaded)"""
+    try:
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(_HUB_IDS.get(model_name, model_name))
+    except (ImportError, OSError) as e:
+        print(f"⚠️ Tokenizer for {model_name} unavailable ({e}), bucketing by character count")
+        return np.minimum([len(text) for text in texts], max_seq_length)
+    encoded = tokenizer(list(texts), add_special_tokens=True, truncation=True, max_length=max_seq_length)
+    return np.array([len(ids) for ids in encoded['input_ids']])
+
+
+def length_buckets(lengths, max_tokens=8192, max_batch=128):
+    """
+    Indices grouped into batches of similar length: texts are sorted by length
+    and cut into batches whose padded size (longest length x count) stays under max_tokens
+    """
+    order = np.argsort(lengths, kind='stable')
+    batches, batch, longest = [], [], 0
+    for i in order:
+        length = max(int(lengths[i]), 1)
+        if batch and (max(longest, length) * (len(batch) + 1) > max_tokens or len(batch) >= max_batch):
+            batches.append(batch)
+            batch, longest = [], 0
+        batch.append(int(i))
+        longest = max(longest, length)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+class EmbeddingPipeline:
+    """
+    CPU sentence encoding on a pool of processes, each pinned to its own cores.
+
+    Texts are bucketed by token length so batches carry little padding, the
+    batches are spread over the workers, and vectors come back in the
+    original text order.
+    :param model_name: SentenceTransformer model (see MODELS)
+    :param workers: Worker processes (defaults to one per 2 cores)
+    :param max_tokens: Padded tokens per batch
+    :param max_batch: Texts per batch
+    :param max_seq_length: Longer texts are truncated to this many tokens
+    """
+
+    def __init__(self, model_name, workers=None, max_tokens=8192, max_batch=128, max_seq_length=256):
+        self.model_name = model_name
+        self.workers = workers or max(1, len(_available_cores()) // 2)
+        self.max_tokens = max_tokens
+        self.max_batch = max_batch
+        self.max_seq_length = max_seq_length
+        self._pool = None
+
+    def _executor(self):
+        if self._pool is None:
+            core_groups = split_cores(self.workers)
+            context = multiprocessing.get_context('spawn')
+            queue = context.Queue()
+            for cores in core_groups:
+                queue.put(cores)
+            self._pool = ProcessPoolExecutor(len(core_groups), mp_context=context, initializer=_init_worker,
+                                             initargs=(self.model_name, queue, self.max_seq_length))
+        return self._pool
+
+    def encode_stream(self, texts):
+        """Yield (original indices, vectors) for each batch as soon as it is encoded"""
+        texts = [str(text) for text in texts]
+        lengths = token_lengths(texts, self.model_name, self.max_seq_length)
+        batches = length_buckets(lengths, self.max_tokens, self.max_batch)
+        pool = self._executor()
+        futures = [pool.submit(_encode_batch, batch_id, [texts[i] for i in batch])
+                   for batch_id, batch in enumerate(batches)]
+        for future in as_completed(futures):
+            batch_id, vectors = future.result()
+            yield batches[batch_id], vectors
+
+    def encode(self, texts):
+        """(len(texts), dim) float32 array in the order of texts; prints sentences/sec"""
+        texts = list(texts)
+        started = time.perf_counter()
+        result = None
+        done = 0
+        for indices, vectors in self.encode_stream(texts):
+            if result is None:
+                result = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+            result[indices] = vectors
+            done += len(indices)
+            elapsed = time.perf_counter() - started
+            print(f"\r{done}/{len(texts)} sentences, {done / elapsed:.1f} sentences/sec", end='', flush=True)
+        print()
+        return result if result is not None else np.empty((0, 0), dtype=np.float32)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def encode_cached(texts, model_name, root='embedding_cache', **pipeline_kwargs):
+    """
+    Vectors for texts, running the pipeline only over texts the EmbeddingCache hasn't seen
+    (the cache is keyed by the pipeline's max_seq_length too)
+    """
+    with EmbeddingPipeline(model_name, **pipeline_kwargs) as pipeline:
+        return EmbeddingCache(model_name, root, pipeline.max_seq_length).get(texts, pipeline.encode)
+
+
+def main(path='imdb_combined_output.csv', column='comment', model='multilingual'):
+    import pandas as pd
+    texts = pd.read_csv(path, dtype=str, keep_default_na=False)[column].tolist()
+    vectors = encode_cached(texts, MODELS.get(model, model))
+    print(f"{len(vectors)} vectors of dimension {vectors.shape[1]}")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:4])
@@ -0,0 +1,119 @@
+import os
+import json
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+from crawl_metrics import get_metrics
+
+# requests/urllib3 decode gzip and deflate on their own; brotli only when a brotli module is installed
+try:
+    import brotli  # noqa: F401
+    ACCEPT_ENCODING = 'gzip, deflate, br'
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+        ACCEPT_ENCODING = 'gzip, deflate, br'
+    except ImportError:
+        ACCEPT_ENCODING = 'gzip, deflate'
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+    'Accept-Encoding': ACCEPT_ENCODING,
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+    'Sec-Fetch-Dest': 'document',
+    'Sec-Fetch-Mode': 'navigate',
+    'Sec-Fetch-Site': 'none',
+    'Cache-Control': 'max-age=0',
+}
+
+
+class PooledSession:
+    """
+    One keep-alive requests.Session shared by every page and title, so the
+    TCP+TLS handshake and any anti-bot cookies are reused between requests
+    :param pool_connections: Number of host pools to keep
+    :param pool_maxsize: Connections kept alive per host
+    :param cookie_file: Optional JSON file the cookie jar is loaded from / saved to
+    """
+
+    def __init__(self, pool_connections=4, pool_maxsize=8, max_retries=0, cookie_file=None, headers=None):
+        self.session = requests.Session()
+        self.session.headers.update(headers or HEADERS)
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=max_retries)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.adapter = adapter
+        self.cookie_file = cookie_file
+        # (url, seconds, opened_new_connection) for every request made
+        self.latencies = []
+
+        if cookie_file and os.path.exists(cookie_file):
+            self.load_cookies(cookie_file)
+
+    def _connections_opened(self):
+        pools = self.adapter.poolmanager.pools
+        return sum(pools[key].num_connections for key in pools.keys())
+
+    def get(self, url, timeout=10, **kwargs):
+        """GET through the pool, recording latency and whether a new connection was needed"""
+        opened_before = self._connections_opened()
+        started = time.perf_counter()
+        response = self.session.get(url, timeout=timeout, **kwargs)
+        elapsed = time.perf_counter() - started
+        new_connection = self._connections_opened() > opened_before
+
+        self.latencies.append((url, elapsed, new_connection))
+        get_metrics().request(url, elapsed, response.status_code, len(response.content))
+        print(f"Request took {elapsed * 1000:.0f} ms ({'new connection' if new_connection else 'reused connection'})")
+        return response
+
+    def latency_summary(self):
+        """Mean latency of requests that opened a connection vs ones that reused one"""
+        fresh = [t for _, t, new in self.latencies if new]
+        reused = [t for _, t, new in self.latencies if not new]
+        return {
+            'requests': len(self.latencies),
+            'new_connections': len(fresh),
+            'mean_new_ms': 1000 * sum(fresh) / len(fresh) if fresh else None,
+            'mean_reused_ms': 1000 * sum(reused) / len(reused) if reused else None,
+        }
+
+    def cookies_as_list(self):
+        return [
+            {'name': c.name, 'value': c.value, 'domain': c.domain, 'path': c.path}
+            for c in self.session.cookies
+        ]
+
+    def add_cookies(self, cookies):
+        """Add cookies given as dicts with name/value/domain/path (the shape Selenium's get_cookies returns)"""
+        for c in cookies:
+            self.session.cookies.set(c['name'], c['value'], domain=c.get('domain', ''), path=c.get('path', '/'))
+
+    def save_cookies(self, filename=None):
+        filename = filename or self.cookie_file
+        if not filename:
+            return
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(self.cookies_as_list(), f, ensure_ascii=False, indent=2)
+
+    def load_cookies(self, filename):
+        with open(filename, encoding='utf-8') as f:
+            self.add_cookies(json.load(f))
+
+    def close(self):
+        self.save_cookies()
+        self.session.close()
+
+
+_shared_session = None
+
+def get_session(**kwargs):
+    """Return the process-wide PooledSession, creating it on first use"""
+    global _shared_session
+    if _shared_session is None:
+        _shared_session = PooledSession(**kwargs)
+    return _shared_session
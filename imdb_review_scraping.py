@@ -2,9 +2,92 @@ from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+import os
 import time
 import csv
+import threading
+from collections import namedtuple
 from datetime import datetime
+from review_sink import ReviewSink
+from review_store import ReviewStoreWriter
+from near_dup import NearDupIndex
+from rate_limiter import get_rate_limiter
+from crawl_metrics import get_metrics, RUN_METRICS
+from selenium_pool import BrowserPool
+from titles import imdb_ids
+
+# Overridable so the scraper can be pointed at a local stand-in server (see scraper_bench.py)
+IMDB_URL = os.environ.get('IMDB_URL', 'https://www.imdb.com')
+REVIEWS_URL = IMDB_URL + "/title/{movie_id}/reviews/?ref_=tt_ururv_sm&sort=featured%2Casc&rating={rating}"
+
+# Rating buckets scraped at the same time, one browser each
+PARALLEL_WORKERS = 4
+
+RatingTask = namedtuple("RatingTask", ["title", "movie_id", "rating"])
+
+# Keeps clicking IMDb's "All"/"N more" continuation button until no button is left or nothing new loads
+LOAD_ALL_REVIEWS_JS = r"""
+const done = arguments[arguments.length - 1];
+const waitMs = arguments[0];
+const maxClicks = arguments[1];
+let clicks = 0;
+let finished = false;
+
+function count() {
+    return document.querySelectorAll("article.user-review-item").length;
+}
+
+function finish(stalled) {
+    if (finished) return;
+    finished = true;
+    done({clicks: clicks, count: count(), stalled: stalled});
+}
+
+function nextButton() {
+    const buttons = Array.from(document.querySelectorAll("span.ipc-see-more button, button.ipc-see-more__button"))
+        .filter(b => b.offsetParent !== null);
+    // "All" loads every remaining review in one continuation, so prefer it over "25 more"
+    return buttons.find(b => /\ball\b/i.test(b.innerText)) || buttons[0] || null;
+}
+
+function step() {
+    const button = nextButton();
+    if (!button || clicks >= maxClicks) return finish(false);
+
+    const before = count();
+    clicks++;
+    const observer = new MutationObserver(() => {
+        if (count() > before) {
+            observer.disconnect();
+            setTimeout(step, 0);
+        }
+    });
+    observer.observe(document.body, {childList: true, subtree: true});
+    setTimeout(() => {
+        if (count() <= before) {
+            observer.disconnect();
+            finish(true);
+        }
+    }, waitMs);
+    button.scrollIntoView({block: "center"});
+    button.click();
+}
+
+step();
+"""
+
+REVEAL_SPOILERS_JS = """
+const buttons = document.querySelectorAll(".review-spoiler-button");
+buttons.forEach(b => b.click());
+return buttons.length;
+"""
+
+EXTRACT_REVIEWS_JS = """
+return Array.from(document.querySelectorAll("article.user-review-item")).map(article => {
+    const content = article.querySelector('div.ipc-html-content-inner-div[role="presentation"]');
+    return content ? content.innerText.trim() : null;
+});
+"""
 
 def save_to_csv(reviews, filename=None):
     """Save reviews to CSV file"""
@@ -30,9 +113,29 @@ def save_to_csv(reviews, filename=None):
     except Exception as e:
         print(f"❌ Error saving to CSV: {e}")
 
-def scrape_reviews_for_rating(driver, rating, MOVIE_ID, MANUAL_TITLE):
-    """Scrape reviews for a specific rating"""
-    url = f"https://www.imdb.com/title/{MOVIE_ID}/reviews/?ref_=tt_ururv_sm&sort=featured%2Casc&rating={rating}"
+def make_driver(headless=False):
+    """Initialize Chrome (visible by default for debugging)"""
+    options = webdriver.ChromeOptions()
+    if headless:
+        options.add_argument("--headless=new")
+    return webdriver.Chrome(options=options)
+
+def load_all_reviews(driver, wait_seconds=10, max_clicks=500):
+    """Follow the review list's load-more continuation until every review for this filter is on the page"""
+    driver.set_script_timeout(wait_seconds * (max_clicks + 1))
+    result = driver.execute_async_script(LOAD_ALL_REVIEWS_JS, wait_seconds * 1000, max_clicks)
+    print(f"📜 Loaded {result['count']} reviews after {result['clicks']} load-more clicks"
+          + (" (stopped: nothing new loaded)" if result['stalled'] else ""))
+    return result['count']
+
+def scrape_reviews_for_rating(driver, rating, MOVIE_ID, MANUAL_TITLE, limiter=None, load_all=True):
+    """
+    Scrape reviews for a specific rating
+    :param load_all: Page through every review instead of only the first batch rendered on load
+    """
+    limiter = limiter or get_rate_limiter()
+    started = time.perf_counter()
+    url = REVIEWS_URL.format(movie_id=MOVIE_ID, rating=rating)
     
     print(f"\n{'='*60}")
     print(f"🎬 Scraping reviews for: {MANUAL_TITLE}")
@@ -40,6 +143,9 @@ def scrape_reviews_for_rating(driver, rating, MOVIE_ID, MANUAL_TITLE):
     print(f"🔗 URL: {url}")
     print(f"{'='*60}")
     
+    metrics = get_metrics()
+    limiter.wait(url)
+    load_started = time.perf_counter()
     driver.get(url)
 
     try:
@@ -47,102 +153,109 @@ def scrape_reviews_for_rating(driver, rating, MOVIE_ID, MANUAL_TITLE):
             EC.presence_of_element_located((By.CSS_SELECTOR, "article.user-review-item"))
         )
         print("✅ Reviews loaded.")
+        limiter.record(url, ok=True)
     except:
         print("❌ Timed out loading reviews.")
-        driver.save_screenshot(f"debug_timeout_rating_{rating}.png")
+        metrics.request(url, time.perf_counter() - load_started, 'timeout')
+        driver.save_screenshot(f"debug_timeout_{MOVIE_ID}_rating_{rating}.png")
+        limiter.record(url, ok=False)
         return []
 
-    # Expand all spoiler buttons first
-    spoiler_buttons = driver.find_elements(By.CLASS_NAME, "review-spoiler-button")
-    for btn in spoiler_buttons:
-        try:
-            driver.execute_script("arguments[0].click();", btn)
-            time.sleep(0.5)
-        except Exception as e:
-            print(f"⚠️ Could not click spoiler button: {e}")
-            continue
+    if load_all:
+        load_all_reviews(driver)
+    metrics.request(url, time.perf_counter() - load_started, None, len(driver.page_source.encode('utf-8')))
+
+    # Expand all spoilers with one script instead of clicking each button
+    extract_started = time.perf_counter()
+    revealed = driver.execute_script(REVEAL_SPOILERS_JS)
+    print(f"🙈 Revealed {revealed} spoilers")
 
-    # Get all review articles
-    reviews = driver.find_elements(By.CSS_SELECTOR, "article.user-review-item")
-    print(f"🧾 Found {len(reviews)} reviews.\n")
+    # Read every review's text in one round trip
+    contents = driver.execute_script(EXTRACT_REVIEWS_JS)
+    metrics.parse(time.perf_counter() - extract_started, len(contents))
+    print(f"🧾 Found {len(contents)} reviews.\n")
 
     # List to store all review data for this rating
     review_data = []
 
-    for review in reviews:
-        try:
-            # Optional: Get review title if available (this is the review's own title, not the movie title)
-            try:
-                review_title_elem = review.find_element(By.CSS_SELECTOR, '[data-testid="review-summary"] h3')
-                review_title = review_title_elem.text.strip()
-            except:
-                review_title = "[No review title]"
-
-            # Get the full text content from the visible div
-            content_elem = review.find_element(By.CSS_SELECTOR, 'div.ipc-html-content-inner-div[role="presentation"]')
-            content = content_elem.text.strip()
-
-            # Create review dictionary for CSV
-            review_dict = {
-                'title': MANUAL_TITLE,
-                'comment': content,
-                'rating': str(rating)
-            }
-            
-            # Add to our data list
-            review_data.append(review_dict)
-
-            # # Print to screen (as before)
-            # print(f"Movie Title: {MANUAL_TITLE}")
-            # print(f"Review Title: {review_title}")
-            # print(f"Rating: {rating}")
-            # print(f"Content: {content}\n{'-'*50}")
-            
-        except Exception as e:
-            print(f"⚠️ Skipping a review due to error: {e}")
+    for content in contents:
+        if content is None:
+            print("⚠️ Skipping a review with no content")
             continue
 
+        # Create review dictionary for CSV
+        review_data.append({
+            'title': MANUAL_TITLE,
+            'comment': content,
+            'rating': str(rating)
+        })
+
+    elapsed = time.perf_counter() - started
+    metrics.add_reviews(len(review_data), 'imdb', MANUAL_TITLE, rating, elapsed)
+    print(f"⏱️ {MANUAL_TITLE} {rating}★: {len(review_data)} reviews in {elapsed:.1f}s "
+          f"({len(review_data) / elapsed:.1f} reviews/sec)")
     return review_data
 
-def main():
-    """Main function to orchestrate the scraping process"""
+def scrape_titles_parallel(titles, workers=PARALLEL_WORKERS, headless=False):
+    """
+    Scrape every (title, rating) bucket on a pool of browsers, writing each
+    bucket to its title's CSV as soon as it finishes
+    """
+    sinks = {}
+    sinks_lock = threading.Lock()
+    near_dups = NearDupIndex(text_field='comment')
+    started = time.perf_counter()
+
+    def scrape_rating_task(driver, task):
+        review_data = scrape_reviews_for_rating(driver, task.rating, task.movie_id, task.title)
+        with sinks_lock:
+            if task.title not in sinks:
+                safe_title = task.title.replace(" ", "_").replace(":", "").replace("/", "_")
+                sinks[task.title] = ReviewSink(f"{safe_title}_ALL_RATINGS_reviews_.csv", ['title', 'comment', 'rating'],
+                                              mirror=ReviewStoreWriter(source='imdb'), near_dups=near_dups)
+            new = sinks[task.title].write(review_data)
+        return new, []
+
+    pool = BrowserPool(lambda: make_driver(headless), size=workers)
+    tasks = [RatingTask(title, movie_id, rating) for title, movie_id in titles.items() for rating in range(1, 5)]
+    results = pool.run(tasks, scrape_rating_task)
+
+    for sink in sinks.values():
+        sink.finalize()
+
+    total = sum(new for _, new in results)
+    elapsed = time.perf_counter() - started
+    print(f"📊 {total} reviews from {len(results)} rating buckets in {elapsed:.0f}s "
+          f"({total / elapsed:.1f} reviews/sec, {pool.restarts} driver restarts)")
+    return total
+
+def crawl(titles=None, workers=PARALLEL_WORKERS, headless=False):
+    """
+    Scrape the 1-4 star reviews of every title
+    :param titles: dict of title -> IMDb ID (defaults to every registry title)
+    """
+    titles = titles or imdb_ids()
+    if workers > 1:
+        scrape_titles_parallel(titles, workers, headless)
+        return
+
     # Initialize visible Chrome for debugging
-    options = webdriver.ChromeOptions()
-    # Comment this out to watch the browser
-    # options.add_argument("--headless")  
-    driver = webdriver.Chrome(options=options)
-
-    # MANUAL SETTINGS - Change these values as needed
-    titles = {
-    'Aquaman': 'tt1477834',
-    'Avatar': 'tt0499549',
-    'Avatar: The Way of Water': 'tt1630029',
-    'Avengers: Age of Ultron': 'tt2395427',
-    'Avengers: Endgame': 'tt4154796',
-    'Avengers: Infinity War': 'tt4154756',
-    'Everything Everywhere All at Once': 'tt6710474',
-    'Fast & Furious Presents: Hobbs & Shaw': 'tt6806448',
-    'Furious 7': 'tt2820852',
-    'Jurassic World': 'tt0369610',
-    'Jurassic World: Fallen Kingdom': 'tt4881806',
-    'Ready Player One': 'tt1677720',
-    'Spider-Man: Far From Home': 'tt6320628',
-    'The Fate of the Furious': 'tt4630562',
-    'Transformers: Age of Extinction': 'tt2109248',
-    'Transformers: The Last Knight': 'tt3371366',
-    'Venom': 'tt1270797',
-    'Warcraft': 'tt0803096',
-    'Zootopia': 'tt2948356'
-    }
+    driver = make_driver(headless)
 
     # Main scraping loop - iterate through ratings 1 to 4
-    all_reviews = []
     total_reviews_count = 0
+    # One index for every title, as in scrape_titles_parallel, so the output doesn't depend on the worker count
+    near_dups = NearDupIndex(text_field='comment')
 
     for MANUAL_TITLE in titles.keys():
         ID = titles[MANUAL_TITLE]
         print(f"🚀 Starting scrape for {MANUAL_TITLE}, id: {ID}")
         print(f"📊 Will scrape ratings 1 through 4...")
+
+        # Each rating's reviews are appended to this title's file as soon as they are scraped
+        safe_title = MANUAL_TITLE.replace(" ", "_").replace(":", "").replace("/", "_")
+        sink = ReviewSink(f"{safe_title}_ALL_RATINGS_reviews_.csv", ['title', 'comment', 'rating'],
+                          mirror=ReviewStoreWriter(source='imdb'), near_dups=near_dups)
         try:
             for rating in range(1, 5):  # This will loop through 1, 2, 3, 4
                 MANUAL_RATING = str(rating)
@@ -150,49 +263,35 @@ def main():
                 # Scrape reviews for this rating
                 review_data = scrape_reviews_for_rating(driver, rating, ID, MANUAL_TITLE)
                 
-                # Add reviews to the master list
+                # Write reviews to this title's file
                 if review_data:
-                    all_reviews.extend(review_data)
-                    total_reviews_count += len(review_data)
+                    total_reviews_count += sink.write(review_data)
                     print(f"📋 Processed {len(review_data)} reviews for {rating}-star rating")
                 else:
                     print(f"❌ No reviews found for {rating}-star rating")
-                
-                # Add a small delay between requests to be respectful
-                if rating < 4:  # Don't wait after the last iteration
-                    print(f"⏳ Waiting 3 seconds before next rating...")
-                    time.sleep(3)
+            sink.finalize()
         finally:
-            print("finished a thing")
+            sink.close()
         
 
     # Summary
     print(f"\n{'🎉 SCRAPING COMPLETE 🎉':^60}")
     print(f"📊 Total reviews scraped: {total_reviews_count}")
     print(f"📁 Ratings scraped: 1, 2, 3, 4 stars")
-    print(f"💾 All reviews will be saved to one combined CSV file")
-
-    # Save all reviews to one combined file
-    if all_reviews:
-        safe_title = MANUAL_TITLE.replace(" ", "_").replace(":", "").replace("/", "_")
-        combined_filename = f"{safe_title}_ALL_RATINGS_reviews_.csv"
-        
-        try:
-            with open(combined_filename, 'w', newline='', encoding='utf-8-sig') as csvfile:
-                fieldnames = ['title', 'comment', 'rating']
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                writer.writeheader()
-                for review in all_reviews:
-                    writer.writerow(review)
-            print(f"✅ All reviews saved to {combined_filename}")
-        except Exception as e:
-            print(f"❌ Error saving combined file: {e}")
-    else:
-        print("❌ No reviews to save.")
+    print(f"💾 Reviews were saved to one CSV file per title")
+    print(f"🚦 Final request rates: {get_rate_limiter().rates()}")
 
      
     # Close the browser
     driver.quit()
 
+def main(workers=PARALLEL_WORKERS):
+    """Main function to orchestrate the scraping process"""
+    metrics = get_metrics(**RUN_METRICS)
+    try:
+        crawl(imdb_ids(), workers)
+    finally:
+        metrics.close()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,221 @@
+import io
+import os
+import sys
+import csv
+import json
+import shutil
+import hashlib
+
+import pandas as pd
+
+
+def file_sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _read_header(path):
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        return next(csv.reader(f), [])
+
+
+class IncrementalMerge:
+    """
+    Merge a folder of CSVs into one combined CSV, re-reading only what changed.
+
+    A manifest next to the output records each input's size, mtime and
+    content hash. Each new or changed input is re-read in chunks of
+    chunksize rows into its own segment file, so neither step holds more
+    than one chunk in memory. A layout file records where each segment
+    ends in the combined CSV: an update keeps the output up to the first
+    changed segment, truncates it there and appends only the segments from
+    that point on, so adding or changing the last inputs costs their size,
+    not the whole output's. The output is rewritten in full (to a temp file
+    and renamed) only when the columns change, or it was modified outside
+    the merge. A splice updates the output in place, so readers shouldn't
+    open it while a merge runs.
+    :param folder: Folder with the input CSVs
+    :param output: Combined CSV path
+    :param chunksize: Rows read at a time from a changed input
+    """
+
+    def __init__(self, folder, output='combined_output.csv', chunksize=5000):
+        self.folder = folder
+        self.output = output
+        self.chunksize = chunksize
+        self.manifest_path = f"{output}.manifest.json"
+        self.layout_path = f"{output}.layout.json"
+        self.segments_dir = f"{output}.segments"
+        self.manifest = {}
+        self.layout = None
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, encoding='utf-8') as f:
+                self.manifest = json.load(f)
+        if os.path.exists(self.layout_path):
+            with open(self.layout_path, encoding='utf-8') as f:
+                self.layout = json.load(f)
+
+    def _inputs(self):
+        return sorted(name for name in os.listdir(self.folder) if name.endswith('.csv'))
+
+    def _segment_path(self, sha256):
+        return os.path.join(self.segments_dir, f"{sha256}.csv")
+
+    def _is_current(self, name, stat):
+        """Size and mtime unchanged means unchanged; otherwise only a different hash counts as a change"""
+        entry = self.manifest.get(name)
+        if entry is None or not os.path.exists(self._segment_path(entry['sha256'])):
+            return False
+        if entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+            return True
+        if file_sha256(os.path.join(self.folder, name)) == entry['sha256']:
+            entry['size'], entry['mtime'] = stat.st_size, stat.st_mtime
+            return True
+        return False
+
+    def _build_segment(self, name, stat):
+        path = os.path.join(self.folder, name)
+        sha256 = file_sha256(path)
+        segment_path = self._segment_path(sha256)
+        tmp_path = f"{segment_path}.tmp"
+        rows = 0
+        columns = []
+        with open(tmp_path, 'w', newline='', encoding='utf-8') as out:
+            for chunk in pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=self.chunksize):
+                chunk.to_csv(out, header=rows == 0, index=False)
+                columns = list(chunk.columns)
+                rows += len(chunk)
+        os.replace(tmp_path, segment_path)
+
+        old = self.manifest.get(name)
+        if old is not None and old['sha256'] != sha256:
+            self._drop_segment(old['sha256'], keep=name)
+        self.manifest[name] = {'size': stat.st_size, 'mtime': stat.st_mtime, 'sha256': sha256,
+                               'rows': rows, 'columns': columns or _read_header(path)}
+        print(f"Re-read {name}: {rows} rows")
+
+    def _drop_segment(self, sha256, keep=None):
+        """Remove a segment unless another input with the same content still uses it"""
+        if any(e['sha256'] == sha256 for n, e in self.manifest.items() if n != keep):
+            return
+        path = self._segment_path(sha256)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def _columns(self, names):
+        columns = []
+        for name in names:
+            columns += [c for c in self.manifest[name]['columns'] if c not in columns]
+        return columns
+
+    def _write_segments(self, out, names, columns):
+        """Append segments to a binary output; returns [name, sha256, end offset] for each"""
+        ends = []
+        for name in names:
+            entry = self.manifest[name]
+            segment_path = self._segment_path(entry['sha256'])
+            if entry['columns'] == columns:
+                # Same columns: copy the bytes after the header line
+                with open(segment_path, 'rb') as f:
+                    f.readline()
+                    shutil.copyfileobj(f, out)
+            else:
+                for chunk in pd.read_csv(segment_path, dtype=str, keep_default_na=False, chunksize=self.chunksize):
+                    out.write(chunk.reindex(columns=columns).to_csv(header=False, index=False).encode('utf-8'))
+            ends.append([name, entry['sha256'], out.tell()])
+        return ends
+
+    def _reusable_segments(self, names, columns):
+        """How many leading segments of the existing output are still current, or None if it can't be reused"""
+        layout = self.layout
+        if layout is None or layout['columns'] != columns or not os.path.exists(self.output):
+            return None
+        stat = os.stat(self.output)
+        if stat.st_size != layout['size'] or stat.st_mtime != layout['mtime']:
+            return None
+        current = [[name, self.manifest[name]['sha256']] for name in names]
+        kept = 0
+        for (name, sha256, _), now in zip(layout['segments'], current):
+            if [name, sha256] != now:
+                break
+            kept += 1
+        return kept
+
+    def _write_output(self, names):
+        """
+        Bring the combined CSV up to date, in input order: splice in the segments from
+        the first changed one on, or stream every segment into a new file
+        :return: Segments written
+        """
+        columns = self._columns(names)
+        kept = self._reusable_segments(names, columns)
+        if kept is not None and kept == len(names) == len(self.layout['segments']):
+            return 0
+
+        if kept is not None:
+            segments = self.layout['segments'][:kept]
+            with open(self.output, 'r+b') as out:
+                out.seek(segments[-1][2] if segments else self.layout['header_end'])
+                out.truncate()
+                segments += self._write_segments(out, names[kept:], columns)
+                header_end = self.layout['header_end']
+            path = self.output
+        else:
+            path = f"{self.output}.tmp"
+            with open(path, 'wb') as out:
+                header = io.StringIO(newline='')
+                csv.writer(header).writerow(columns)
+                out.write(header.getvalue().encode('utf-8'))
+                header_end = out.tell()
+                segments = self._write_segments(out, names, columns)
+            os.replace(path, self.output)
+
+        stat = os.stat(self.output)
+        self.layout = {'columns': columns, 'header_end': header_end, 'segments': segments,
+                       'size': stat.st_size, 'mtime': stat.st_mtime}
+        tmp_path = f"{self.layout_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.layout, f, ensure_ascii=False)
+        os.replace(tmp_path, self.layout_path)
+        return len(names) - (kept or 0)
+
+    def _save_manifest(self):
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.manifest_path)
+
+    def run(self):
+        """Bring the combined CSV up to date; returns the names of the inputs that were re-read"""
+        os.makedirs(self.segments_dir, exist_ok=True)
+        names = self._inputs()
+        changed = []
+        for name in names:
+            stat = os.stat(os.path.join(self.folder, name))
+            if not self._is_current(name, stat):
+                self._build_segment(name, stat)
+                changed.append(name)
+
+        removed = [name for name in self.manifest if name not in names]
+        for name in removed:
+            sha256 = self.manifest.pop(name)['sha256']
+            self._drop_segment(sha256)
+
+        written = self._write_output(names)
+        self._save_manifest()
+
+        total = sum(self.manifest[name]['rows'] for name in names)
+        print(f"Merged {len(names)} files ({len(changed)} re-read, {len(removed)} removed, "
+              f"{written} segments written) into {self.output}: {total} rows")
+        return changed
+
+
+def merge_folder(folder='output1', output='combined_output.csv', chunksize=5000):
+    return IncrementalMerge(folder, output, chunksize).run()
+
+
+if __name__ == "__main__":
+    merge_folder(*sys.argv[1:3])
@@ -0,0 +1,171 @@
+import os
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.cluster import KMeans
+from sklearn.metrics import silhouette_samples
+
+_X = None
+
+
+def matrix_hash(X, block_rows=4096):
+    """sha256 of a dense or sparse feature matrix, read in blocks of rows"""
+    digest = hashlib.sha256(f"{type(X).__name__}{X.shape}{X.dtype}".encode('utf-8'))
+    if sp.issparse(X):
+        X = X.tocsr()
+        for part in (X.data, X.indices, X.indptr):
+            digest.update(np.ascontiguousarray(part).tobytes())
+    else:
+        for offset in range(0, X.shape[0], block_rows):
+            digest.update(np.ascontiguousarray(X[offset:offset + block_rows]).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def stratified_sample(labels, sample_size, rng):
+    """Row indices sampled from each cluster in proportion to its size (at least 2 per cluster)"""
+    if len(labels) <= sample_size:
+        return np.arange(len(labels))
+    picked = []
+    for cluster in np.unique(labels):
+        members = np.flatnonzero(labels == cluster)
+        take = min(len(members), max(2, round(sample_size * len(members) / len(labels))))
+        picked.append(rng.choice(members, take, replace=False))
+    return np.sort(np.concatenate(picked))
+
+
+def sampled_silhouette(X, labels, sample_size=2000, random_state=42):
+    """Silhouette on a stratified sample: (mean, 95% CI low, 95% CI high, rows used)"""
+    rng = np.random.RandomState(random_state)
+    rows = stratified_sample(labels, sample_size, rng)
+    values = silhouette_samples(X[rows], labels[rows])
+    half_width = 1.96 * values.std(ddof=1) / np.sqrt(len(values))
+    return float(values.mean()), float(values.mean() - half_width), float(values.mean() + half_width), len(rows)
+
+
+def _next_center(X, centers, rng, sample_size=2000):
+    """One more initial center, drawn k-means++ style (by squared distance) from a sample of rows"""
+    rows = rng.choice(X.shape[0], min(sample_size, X.shape[0]), replace=False)
+    sample = X[rows]
+    sample = sample.toarray() if sp.issparse(sample) else np.asarray(sample)
+    distances = ((sample ** 2).sum(axis=1)[:, None] - 2 * sample @ centers.T
+                 + (centers ** 2).sum(axis=1)[None, :]).min(axis=1)
+    distances = np.maximum(distances, 0)
+    if distances.sum() == 0:
+        return sample[rng.randint(len(sample))]
+    return sample[rng.choice(len(sample), p=distances / distances.sum())]
+
+
+class _ResultCache:
+    """One JSON file (plus the fitted centers) per (matrix hash, k)"""
+
+    def __init__(self, root, key):
+        self.dir = os.path.join(root, key)
+        os.makedirs(self.dir, exist_ok=True)
+
+    def _path(self, k, ext):
+        return os.path.join(self.dir, f"k={k}.{ext}")
+
+    def get(self, k, params):
+        if not os.path.exists(self._path(k, 'json')):
+            return None
+        with open(self._path(k, 'json'), encoding='utf-8') as f:
+            result = json.load(f)
+        return result if result['params'] == params else None
+
+    def centers(self, k):
+        path = self._path(k, 'npy')
+        return np.load(path) if os.path.exists(path) else None
+
+    def put(self, result, centers):
+        k = result['k']
+        np.save(self._path(k, 'tmp.npy'), centers)
+        os.replace(self._path(k, 'tmp.npy'), self._path(k, 'npy'))
+        with open(self._path(k, 'json.tmp'), 'w', encoding='utf-8') as f:
+            json.dump(result, f)
+        os.replace(self._path(k, 'json.tmp'), self._path(k, 'json'))
+
+
+def _init_worker(X):
+    global _X
+    _X = X
+
+
+def _sweep_chunk(ks, cache_root, key, params):
+    """Fit each k in ascending order, warm-starting from the centers found for k - 1"""
+    cache = _ResultCache(cache_root, key)
+    rng = np.random.RandomState(params['random_state'])
+    results = []
+    for k in ks:
+        cached = cache.get(k, params)
+        if cached is not None:
+            results.append(cached)
+            continue
+
+        previous = cache.centers(k - 1)
+        if previous is not None and len(previous) == k - 1:
+            init = np.vstack([previous, _next_center(_X, previous, rng)])
+            model = KMeans(n_clusters=k, init=init, n_init=1, random_state=params['random_state'])
+        else:
+            model = KMeans(n_clusters=k, random_state=params['random_state'])
+        labels = model.fit_predict(_X)
+
+        silhouette, low, high, used = sampled_silhouette(_X, labels, params['sample_size'], params['random_state'])
+        result = {'k': k, 'inertia': float(model.inertia_), 'silhouette': silhouette,
+                  'silhouette_low': low, 'silhouette_high': high, 'sample_size': used,
+                  'n_iter': int(model.n_iter_), 'warm_start': previous is not None, 'params': params}
+        cache.put(result, model.cluster_centers_)
+        results.append(result)
+        print(f"k={k}: inertia {result['inertia']:.1f}, silhouette {silhouette:.3f} [{low:.3f}, {high:.3f}]")
+    return results
+
+
+def k_sweep(X, ks=range(2, 100), workers=None, sample_size=2000, random_state=42, cache_dir='k_selection_cache'):
+    """
+    Inertia and sampled silhouette for every k, fitted on a process pool.
+
+    ks is cut into contiguous runs, one per task, so each fit can warm-start
+    from the previous k's centers. Results are cached on disk per
+    (matrix hash, k): re-plotting or extending the range only fits new k.
+    :param X: Dense or sparse feature matrix (embeddings or TF-IDF)
+    :param sample_size: Rows in the stratified silhouette sample
+    :return: DataFrame with k, inertia, silhouette and its 95% confidence interval
+    """
+    ks = sorted(ks)
+    key = matrix_hash(X)
+    params = {'sample_size': sample_size, 'random_state': random_state}
+    workers = workers or os.cpu_count() or 1
+    chunk_count = min(len(ks), workers * 2)
+    chunks = [[int(k) for k in chunk] for chunk in np.array_split(ks, chunk_count) if len(chunk)]
+
+    if workers == 1:
+        _init_worker(X)
+        results = [r for chunk in chunks for r in _sweep_chunk(chunk, cache_dir, key, params)]
+    else:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(X,)) as pool:
+            futures = [pool.submit(_sweep_chunk, chunk, cache_dir, key, params) for chunk in chunks]
+            results = [r for future in futures for r in future.result()]
+
+    columns = ['k', 'inertia', 'silhouette', 'silhouette_low', 'silhouette_high', 'sample_size', 'n_iter']
+    return pd.DataFrame(results)[columns].sort_values('k').reset_index(drop=True)
+
+
+def plot_sweep(results):
+    """Elbow and silhouette plots, with the silhouette's confidence band"""
+    import matplotlib.pyplot as plt
+
+    plt.plot(results['k'], results['inertia'], 'bo-')
+    plt.title("Elbow Method: Inertia vs. K")
+    plt.xlabel("Number of Clusters")
+    plt.ylabel("Inertia")
+    plt.show()
+
+    plt.plot(results['k'], results['silhouette'], 'go-')
+    plt.fill_between(results['k'], results['silhouette_low'], results['silhouette_high'], color='g', alpha=0.2)
+    plt.title("Silhouette Score vs. K (sampled, 95% CI)")
+    plt.xlabel("Number of Clusters")
+    plt.ylabel("Silhouette Score")
+    plt.show()
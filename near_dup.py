@@ -0,0 +1,185 @@
+import os
+import re
+import sys
+import json
+import zlib
+
+import numpy as np
+import pandas as pd
+
+# Largest prime below 2**32: keeps a * x + b inside uint64 for 32-bit shingle hashes
+_PRIME = np.uint64(4294967291)
+_NON_WORD = re.compile(r'[\W_]+')
+
+
+def shingle_hashes(text, k=4):
+    """crc32 of every k-character shingle of the text, ignoring case, whitespace and punctuation"""
+    text = _NON_WORD.sub('', str(text).lower())
+    if not text:
+        return np.empty(0, dtype=np.uint64)
+    if len(text) <= k:
+        return np.array([zlib.crc32(text.encode('utf-8'))], dtype=np.uint64)
+    shingles = {text[i:i + k] for i in range(len(text) - k + 1)}
+    return np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles), dtype=np.uint64, count=len(shingles))
+
+
+class MinHasher:
+    """
+    MinHash signatures from num_perm universal hash functions (a * x + b) mod p
+    :param num_perm: Signature length
+    :param k: Shingle length in characters (4 suits both Chinese and English comments)
+    :param seed: Seed for the hash functions; signatures are only comparable under the same seed
+    """
+
+    def __init__(self, num_perm=128, k=4, seed=1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.k = k
+        self.seed = seed
+        self.a = rng.randint(1, 2 ** 32 - 5, size=num_perm, dtype=np.int64).astype(np.uint64)[:, None]
+        self.b = rng.randint(0, 2 ** 32 - 5, size=num_perm, dtype=np.int64).astype(np.uint64)[:, None]
+
+    def signature(self, text):
+        """uint32 signature of length num_perm, or None for texts with no letters"""
+        hashes = shingle_hashes(text, self.k)
+        if hashes.size == 0:
+            return None
+        return ((self.a * hashes + self.b) % _PRIME).min(axis=1).astype(np.uint32)
+
+
+class NearDupIndex:
+    """
+    MinHash/LSH index of review texts.
+
+    Signatures are split into `bands` bands; two reviews become candidates when
+    any band matches exactly, so a lookup costs `bands` dictionary probes no
+    matter how many reviews are indexed. Candidates are confirmed by the
+    estimated Jaccard similarity of their full signatures.
+    :param threshold: Estimated Jaccard similarity at or above which a review is a duplicate
+    :param bands: LSH bands; num_perm must be divisible by it
+    :param text_field: Review field holding the text (review_text is used when it is missing)
+    """
+
+    def __init__(self, num_perm=128, bands=16, threshold=0.8, k=4, seed=1, text_field='comment'):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be divisible by bands ({bands})")
+        self.hasher = MinHasher(num_perm, k, seed)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.text_field = text_field
+        self.keys = []
+        self._signatures = []
+        self._buckets = [{} for _ in range(bands)]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _band_keys(self, signature):
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def _match(self, signature, band_keys):
+        candidates = set()
+        for bucket, band_key in zip(self._buckets, band_keys):
+            candidates.update(bucket.get(band_key, ()))
+        best, best_similarity = None, self.threshold
+        for i in candidates:
+            similarity = float(np.mean(self._signatures[i] == signature))
+            if similarity >= best_similarity:
+                best, best_similarity = i, similarity
+        return best
+
+    def _add(self, key, signature, band_keys):
+        i = len(self.keys)
+        self.keys.append(key)
+        self._signatures.append(signature)
+        for bucket, band_key in zip(self._buckets, band_keys):
+            bucket.setdefault(band_key, []).append(i)
+
+    def query(self, text):
+        """Key of an indexed near-duplicate of text, or None"""
+        signature = self.hasher.signature(text)
+        if signature is None:
+            return None
+        best = self._match(signature, self._band_keys(signature))
+        return None if best is None else self.keys[best]
+
+    def insert(self, text, key=None):
+        """
+        Index text unless it near-duplicates something already indexed
+        :return: Key of the existing near-duplicate, or None if text was new and has been added
+        """
+        signature = self.hasher.signature(text)
+        if signature is None:
+            return None
+        band_keys = self._band_keys(signature)
+        best = self._match(signature, band_keys)
+        if best is not None:
+            return self.keys[best]
+        self._add(len(self.keys) if key is None else key, signature, band_keys)
+        return None
+
+    def review_text(self, review):
+        text = review.get(self.text_field)
+        if text is None:
+            text = review.get('review_text', '')
+        return text
+
+    def check_review(self, review, key=None):
+        """insert() for a scraped review dict"""
+        return self.insert(self.review_text(review), key)
+
+    def signatures(self):
+        if not self._signatures:
+            return np.empty((0, self.hasher.num_perm), dtype=np.uint32)
+        return np.vstack(self._signatures)
+
+    def save(self, prefix):
+        """Write <prefix>.minhash.npy (one signature row per key) and <prefix>.minhash.json"""
+        np.save(f"{prefix}.minhash.npy", self.signatures())
+        settings = {'num_perm': self.hasher.num_perm, 'bands': self.bands, 'threshold': self.threshold,
+                    'k': self.hasher.k, 'seed': self.hasher.seed, 'text_field': self.text_field}
+        with open(f"{prefix}.minhash.json", 'w', encoding='utf-8') as f:
+            json.dump({'settings': settings, 'keys': self.keys}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, prefix):
+        with open(f"{prefix}.minhash.json", encoding='utf-8') as f:
+            saved = json.load(f)
+        index = cls(**saved['settings'])
+        for key, signature in zip(saved['keys'], np.load(f"{prefix}.minhash.npy")):
+            index._add(key, signature, index._band_keys(signature))
+        return index
+
+
+def dedupe_csv(path, output=None, text_field='comment', index=None, chunksize=5000):
+    """
+    Bulk pass over an existing CSV: write the rows that aren't near-duplicates
+    of an earlier row to output, and save the index (one signature per kept row) next to it
+    :param output: Defaults to <name>_dedup.csv
+    :param index: NearDupIndex to check against and extend (e.g. one shared across files)
+    :return: (rows kept, rows dropped)
+    """
+    output = output or f"{os.path.splitext(path)[0]}_dedup.csv"
+    if index is None:
+        index = NearDupIndex(text_field=text_field)
+    kept = dropped = 0
+    row = 0
+    with open(output, 'w', newline='', encoding='utf-8-sig') as out:
+        for chunk in pd.read_csv(path, dtype=str, keep_default_na=False, encoding='utf-8-sig', chunksize=chunksize):
+            keep = []
+            for text in chunk[text_field]:
+                keep.append(index.insert(text, key=f"{os.path.basename(path)}:{row}") is None)
+                row += 1
+            chunk[keep].to_csv(out, header=kept + dropped == 0, index=False)
+            kept += sum(keep)
+            dropped += len(keep) - sum(keep)
+
+    index.save(os.path.splitext(output)[0])
+    print(f"{path}: kept {kept} reviews, dropped {dropped} near-duplicates -> {output}")
+    return kept, dropped
+
+
+if __name__ == "__main__":
+    # python near_dup.py combined_output.csv review_text
+    dedupe_csv(sys.argv[1], text_field=sys.argv[2] if len(sys.argv) > 2 else 'comment')
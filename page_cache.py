@@ -0,0 +1,183 @@
+import os
+import json
+import gzip
+import time
+import hashlib
+import threading
+
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _read_index(path):
+    """Entries of one index file; a line torn by a crash mid-append is skipped"""
+    entries = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+    return entries
+
+
+class PageCache:
+    """
+    On-disk HTML cache. Page bodies are gzip-compressed and stored once per
+    content hash under objects/; index/ keeps one JSON-lines file per URL
+    recording every (fetched_at, content hash) we saw for it.
+    :param root: Cache directory
+    :param ttl: Seconds a fetch counts as fresh; older entries are dropped by evict()
+    """
+
+    def __init__(self, root='page_cache', ttl=7 * 24 * 3600):
+        self.root = root
+        self.ttl = ttl
+        os.makedirs(os.path.join(root, 'objects'), exist_ok=True)
+        os.makedirs(os.path.join(root, 'index'), exist_ok=True)
+
+    def _object_path(self, digest):
+        return os.path.join(self.root, 'objects', digest[:2], f"{digest}.html.gz")
+
+    def _index_path(self, url):
+        return os.path.join(self.root, 'index', f"{_sha256(url.encode('utf-8'))}.jsonl")
+
+    def _entries(self, url):
+        path = self._index_path(url)
+        if not os.path.exists(path):
+            return []
+        return _read_index(path)
+
+    def put(self, url, html, fetched_at=None):
+        """Store a fetched page and return its content hash"""
+        data = html.encode('utf-8')
+        digest = _sha256(data)
+        object_path = self._object_path(digest)
+
+        if not os.path.exists(object_path):
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            tmp_path = f"{object_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with gzip.open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, object_path)
+
+        entry = {'url': url, 'fetched_at': fetched_at or time.time(), 'sha256': digest}
+        with open(self._index_path(url), 'a+b') as f:
+            # Start on a fresh line if a crash left the last one torn
+            if f.seek(0, os.SEEK_END):
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    f.write(b'\n')
+            f.write((json.dumps(entry, ensure_ascii=False) + '\n').encode('utf-8'))
+        return digest
+
+    def lookup(self, url, max_age='ttl'):
+        """
+        Newest index entry for a URL, or None
+        :param max_age: Seconds; 'ttl' uses the cache TTL, None accepts any age
+        """
+        if max_age == 'ttl':
+            max_age = self.ttl
+        entries = self._entries(url)
+        if not entries:
+            return None
+        newest = max(entries, key=lambda e: e['fetched_at'])
+        if max_age is not None and time.time() - newest['fetched_at'] > max_age:
+            return None
+        if not os.path.exists(self._object_path(newest['sha256'])):
+            return None
+        return newest
+
+    def has(self, url, max_age='ttl'):
+        return self.lookup(url, max_age) is not None
+
+    def get(self, url, max_age='ttl'):
+        """Return the cached HTML for a URL, or None if missing or stale"""
+        entry = self.lookup(url, max_age)
+        if entry is None:
+            return None
+        with gzip.open(self._object_path(entry['sha256']), 'rb') as f:
+            return f.read().decode('utf-8')
+
+    def evict(self, now=None):
+        """Drop index entries older than the TTL, then any page body no entry points to"""
+        now = now or time.time()
+        index_dir = os.path.join(self.root, 'index')
+        referenced = set()
+        dropped = 0
+
+        for name in os.listdir(index_dir):
+            path = os.path.join(index_dir, name)
+            entries = _read_index(path)
+            fresh = [e for e in entries if now - e['fetched_at'] <= self.ttl]
+            dropped += len(entries) - len(fresh)
+            if not fresh:
+                os.remove(path)
+                continue
+            if len(fresh) != len(entries):
+                with open(path, 'w', encoding='utf-8') as f:
+                    for e in fresh:
+                        f.write(json.dumps(e, ensure_ascii=False) + '\n')
+            referenced.update(e['sha256'] for e in fresh)
+
+        removed = 0
+        objects_dir = os.path.join(self.root, 'objects')
+        for prefix in os.listdir(objects_dir):
+            for name in os.listdir(os.path.join(objects_dir, prefix)):
+                if name.split('.')[0] not in referenced:
+                    os.remove(os.path.join(objects_dir, prefix, name))
+                    removed += 1
+
+        print(f"Evicted {dropped} stale fetches and {removed} unreferenced pages")
+        return dropped, removed
+
+
+class CrawlCheckpoint:
+    """
+    JSON file recording which (title, rating, start) pages a crawl has finished,
+    so a restarted crawl can skip them. A crawl clears a title once it has
+    finished it, so the next full crawl fetches every page again. Rewritten
+    atomically on every update, and safe to share between worker threads.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.done = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.done = json.load(f)
+
+    @staticmethod
+    def key(title, rating, start):
+        return f"{title}\t{rating}\t{start}"
+
+    def is_done(self, title, rating, start):
+        return self.key(title, rating, start) in self.done
+
+    def get(self, title, rating, start):
+        """Info stored when the page was marked done, or None"""
+        return self.done.get(self.key(title, rating, start))
+
+    def _save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.done, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+
+    def mark_done(self, title, rating, start, **info):
+        with self._lock:
+            self.done[self.key(title, rating, start)] = info
+            self._save()
+
+    def clear(self, title=None):
+        """Forget the finished pages of one title (or of every title); returns how many were dropped"""
+        with self._lock:
+            prefix = f"{title}\t"
+            kept = {} if title is None else {key: info for key, info in self.done.items() if not key.startswith(prefix)}
+            dropped = len(self.done) - len(kept)
+            if dropped:
+                self.done = kept
+                self._save()
+            return dropped
@@ -0,0 +1,119 @@
+import time
+import random
+import asyncio
+import threading
+from urllib.parse import urlsplit
+
+from crawl_metrics import get_metrics
+
+
+def _host(url):
+    return urlsplit(url).netloc if '://' in url else url
+
+
+class _HostState:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.backoff_until = 0.0
+        self.failures = 0
+
+
+class AdaptiveRateLimiter:
+    """
+    Per-host token bucket whose refill rate is tuned with AIMD: every clean
+    response adds `increase` requests/second, every non-200 or anti-bot page
+    multiplies the rate by `decrease` and pauses the host for an exponentially
+    growing backoff. Safe to share between threads and asyncio tasks.
+    :param initial_rate: Starting requests/second per host
+    :param min_rate: Floor for the rate after repeated failures
+    :param max_rate: Ceiling the rate can climb to
+    :param increase: Requests/second added after each clean response
+    :param decrease: Factor the rate is multiplied by after a failure
+    :param burst: Requests allowed back to back after an idle period
+    :param base_backoff: Seconds to pause after the first failure (doubled per consecutive failure)
+    :param max_backoff: Upper bound on a single pause
+    """
+
+    def __init__(self, initial_rate=0.2, min_rate=0.02, max_rate=1.0, increase=0.02, decrease=0.5,
+                 burst=1, base_backoff=30, max_backoff=600):
+        self.initial_rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.burst = burst
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _state(self, host):
+        if host not in self._hosts:
+            self._hosts[host] = _HostState(self.initial_rate, self.burst)
+        return self._hosts[host]
+
+    def _reserve(self, url):
+        """Take a token for the host and return how long the caller must wait, its rate and whether it is backing off"""
+        with self._lock:
+            state = self._state(_host(url))
+            now = time.monotonic()
+            state.tokens = min(self.burst, state.tokens + (now - state.updated) * state.rate)
+            state.updated = now
+            state.tokens -= 1
+            delay = -state.tokens / state.rate if state.tokens < 0 else 0.0
+            backoff = state.backoff_until - now
+            return max(delay, backoff), state.rate, backoff > delay
+
+    def wait(self, url):
+        """Block until a request to this URL's host is allowed; returns the seconds slept"""
+        delay, rate, backing_off = self._reserve(url)
+        if delay > 0:
+            print(f"Waiting {delay:.1f} seconds before next request ({rate:.2f} req/s)...")
+            time.sleep(delay)
+            get_metrics().sleep(delay, url, 'backoff' if backing_off else 'rate_limit')
+        return delay
+
+    async def wait_async(self, url):
+        """asyncio version of wait()"""
+        delay, rate, backing_off = self._reserve(url)
+        if delay > 0:
+            await asyncio.sleep(delay)
+            get_metrics().sleep(delay, url, 'backoff' if backing_off else 'rate_limit')
+        return delay
+
+    def record(self, url, ok):
+        """Feed back the outcome of a request: ok=False for non-200s and anti-bot pages"""
+        with self._lock:
+            state = self._state(_host(url))
+            if ok:
+                state.failures = 0
+                state.rate = min(self.max_rate, state.rate + self.increase)
+                return
+
+            state.failures += 1
+            state.rate = max(self.min_rate, state.rate * self.decrease)
+            backoff = min(self.max_backoff, self.base_backoff * 2 ** (state.failures - 1))
+            backoff *= random.uniform(0.8, 1.2)
+            state.backoff_until = time.monotonic() + backoff
+            print(f"Backing off {_host(url)} for {backoff:.0f} seconds, rate now {state.rate:.3f} req/s")
+
+    def current_rate(self, url):
+        """Requests/second currently allowed for this URL's host"""
+        with self._lock:
+            return self._state(_host(url)).rate
+
+    def rates(self):
+        with self._lock:
+            return {host: state.rate for host, state in self._hosts.items()}
+
+
+_shared_limiter = None
+
+def get_rate_limiter(**kwargs):
+    """Return the process-wide AdaptiveRateLimiter, creating it on first use"""
+    global _shared_limiter
+    if _shared_limiter is None:
+        _shared_limiter = AdaptiveRateLimiter(**kwargs)
+    return _shared_limiter
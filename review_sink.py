@@ -0,0 +1,152 @@
+import os
+import csv
+import shutil
+import hashlib
+
+REMIRROR_BATCH = 1000  # Rows of a resumed .part file handed to the mirror at once
+
+
+def _drop_torn_row(path):
+    """
+    Cut a CSV back to its last complete row, so a row half-written by a crash
+    isn't glued to the next append. Quoted fields may contain newlines, so a
+    row only ends at a newline outside quotes. Returns the bytes dropped.
+    """
+    complete = size = quotes = 0
+    with open(path, 'rb') as f:
+        for line in f:
+            size += len(line)
+            quotes += line.count(b'"')
+            if line.endswith(b'\n') and quotes % 2 == 0:
+                complete = size
+    if complete < size:
+        with open(path, 'r+b') as f:
+            f.truncate(complete)
+    return size - complete
+
+
+class ReviewSink:
+    """
+    Append-only CSV writer that puts each page of reviews on disk as soon as it is parsed.
+
+    Rows go to ``<filename>.part``; finalize() fsyncs it and renames it over
+    ``filename`` in one step, so readers never see a half-written file. If a
+    crawl dies, the .part file is picked up again by the next ReviewSink for
+    the same filename (minus any torn last row), so at most the page being
+    written is lost. The mirror
+    only buffers what it is given, so a resumed .part file is sent to it
+    again (the store deduplicates when it compacts).
+    Deduplication keeps an 8-byte digest of every review written in memory, so
+    memory grows with the file (roughly 100 bytes per review with set overhead).
+    :param filename: Final CSV path
+    :param fieldnames: CSV columns, in order
+    :param key_fields: Columns that identify a review (defaults to all of them)
+    :param fsync_every: fsync after this many pages
+    :param mirror: Optional second sink (e.g. a ReviewStoreWriter) that receives every new review
+    :param near_dups: Optional NearDupIndex; reviews that near-duplicate one already written are skipped too
+    :param append: Start from the rows already in filename instead of replacing it (for incremental crawls)
+    """
+
+    def __init__(self, filename, fieldnames, key_fields=None, fsync_every=10, encoding='utf-8-sig', mirror=None,
+                 near_dups=None, append=False):
+        self.filename = filename
+        self.part_path = f"{filename}.part"
+        self.fieldnames = list(fieldnames)
+        self.key_fields = list(key_fields or fieldnames)
+        self.fsync_every = fsync_every
+        self.mirror = mirror
+        self.near_dups = near_dups
+        self.seen = set()
+        self.written = 0
+        self.skipped = 0
+        self._pages_since_sync = 0
+
+        # Rows of a crashed run may never have reached the mirror; a finished file's rows already did
+        remirror = mirror is not None and os.path.exists(self.part_path)
+        if append and not os.path.exists(self.part_path) and os.path.exists(filename):
+            shutil.copyfile(filename, self.part_path)
+        resuming = os.path.exists(self.part_path)
+        if resuming:
+            torn = _drop_torn_row(self.part_path)
+            if torn:
+                print(f"Dropped a torn {torn}-byte row from the end of {self.part_path}")
+            batch = []
+            with open(self.part_path, newline='', encoding=encoding) as f:
+                for row in csv.DictReader(f):
+                    self.seen.add(self._digest(row))
+                    if near_dups is not None:
+                        near_dups.check_review(row)
+                    self.written += 1
+                    if remirror:
+                        batch.append(row)
+                        if len(batch) >= REMIRROR_BATCH:
+                            mirror.write(batch)
+                            batch = []
+            if batch:
+                mirror.write(batch)
+            print(f"Resuming {self.part_path} with {self.written} reviews already written"
+                  + (" (sent to the mirror again)" if remirror else ""))
+
+        self._file = open(self.part_path, 'a', newline='', encoding=encoding)
+        self._writer = csv.DictWriter(self._file, fieldnames=self.fieldnames, extrasaction='ignore')
+        if not resuming:
+            self._writer.writeheader()
+
+    def _digest(self, review):
+        key = '\x1f'.join(str(review.get(field, '')) for field in self.key_fields)
+        return hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest()
+
+    def write(self, reviews):
+        """Append one page of reviews, skipping ones already written; returns how many were new"""
+        new_reviews = []
+        for review in reviews:
+            digest = self._digest(review)
+            if digest in self.seen:
+                self.skipped += 1
+                continue
+            if self.near_dups is not None and self.near_dups.check_review(review) is not None:
+                self.skipped += 1
+                continue
+            self.seen.add(digest)
+            self._writer.writerow(review)
+            new_reviews.append(review)
+
+        new = len(new_reviews)
+        self.written += new
+        if self.mirror is not None and new_reviews:
+            self.mirror.write(new_reviews)
+        self._file.flush()
+        self._pages_since_sync += 1
+        if self._pages_since_sync >= self.fsync_every:
+            self.sync()
+        return new
+
+    def sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pages_since_sync = 0
+
+    def close(self):
+        """Flush and close without publishing; the .part file stays for the next run to resume"""
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
+            if self.mirror is not None:
+                self.mirror.close()
+
+    def finalize(self):
+        """Publish the .part file under its final name"""
+        self.close()
+        os.replace(self.part_path, self.filename)
+        if self.mirror is not None:
+            self.mirror.finalize()
+        print(f"\nSaved {self.written} reviews to {self.filename} ({self.skipped} duplicates skipped)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.finalize()
+        else:
+            self.close()
@@ -0,0 +1,233 @@
+import os
+import sys
+import glob
+import uuid
+import shutil
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+STORE_ROOT = 'review_store'
+
+# Every scraper's reviews end up in these columns; source/title/rating are directory partitions
+DATA_SCHEMA = pa.schema([
+    ('name', pa.string()),
+    ('time', pa.string()),
+    ('comment', pa.string()),
+    ('url', pa.string()),
+])
+PARTITION_SCHEMA = pa.schema([
+    ('source', pa.string()),
+    ('title', pa.string()),
+    ('rating', pa.int8()),
+])
+SCHEMA = pa.schema(list(DATA_SCHEMA) + list(PARTITION_SCHEMA))
+PARTITIONING = ds.partitioning(PARTITION_SCHEMA, flavor='hive')
+
+# Column names used by the long review scrapers and their store equivalents
+FIELD_ALIASES = {'review_text': 'comment', 'stars': 'rating'}
+
+
+def _to_rating(value):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_text(value):
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+    return str(value)
+
+
+def normalize_review(review, source):
+    """Map one scraped review dict (any scraper's field names) onto the store schema"""
+    row = {FIELD_ALIASES.get(key, key): value for key, value in review.items()}
+    normalized = {name: _to_text(row.get(name)) for name in DATA_SCHEMA.names}
+    normalized['source'] = source
+    normalized['title'] = _to_text(row.get('title'))
+    normalized['rating'] = _to_rating(row.get('rating'))
+    return normalized
+
+
+def _dataset(root):
+    return ds.dataset(root, format='parquet', partitioning=PARTITIONING, schema=SCHEMA)
+
+
+def _write_table(root, table):
+    """
+    Write a table into its partitions. Files are written to a staging directory
+    first and moved into place complete, so readers never open a half-written file.
+    """
+    staging = os.path.join(root, '.staging', uuid.uuid4().hex)
+    ds.write_dataset(table, staging, format='parquet', partitioning=PARTITIONING,
+                     basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet")
+    for dirpath, _, files in os.walk(staging):
+        dest = os.path.join(root, os.path.relpath(dirpath, staging))
+        for name in files:
+            os.makedirs(dest, exist_ok=True)
+            os.replace(os.path.join(dirpath, name), os.path.join(dest, name))
+    shutil.rmtree(staging, ignore_errors=True)
+
+
+def _matches(field, value):
+    if isinstance(value, (list, tuple, set)):
+        return ds.field(field).isin(list(value))
+    return ds.field(field) == value
+
+
+def compact(root, source, title):
+    """Rewrite one title's partitions as one deduplicated file per rating; returns the row count"""
+    if not os.path.isdir(root):
+        return 0
+    dataset = _dataset(root)
+    where = (ds.field('source') == source) & (ds.field('title') == title)
+    old_files = [fragment.path for fragment in dataset.get_fragments(filter=where)]
+    if not old_files:
+        return 0
+
+    df = dataset.to_table(filter=where).to_pandas().drop_duplicates()
+    table = pa.Table.from_pandas(df, preserve_index=False).select(SCHEMA.names).cast(SCHEMA)
+    _write_table(root, table)
+    for path in old_files:
+        os.remove(path)
+    return table.num_rows
+
+
+class ReviewStoreWriter:
+    """
+    Sink-style writer into the partitioned Parquet store
+    (``<root>/source=<source>/title=<title>/rating=<n>/*.parquet``).
+
+    Rows are buffered and written as one file per partition every
+    rows_per_file rows; finalize() then compacts each title it touched into a
+    single deduplicated file per rating, so re-running a scrape doesn't
+    duplicate rows. Can be passed to ReviewSink as its mirror.
+    :param root: Store directory
+    :param source: Partition value for every row written ('douban', 'douban_long', 'imdb')
+    :param rows_per_file: Rows buffered before a flush
+    """
+
+    def __init__(self, root=STORE_ROOT, source='douban', rows_per_file=5000):
+        self.root = root
+        self.source = source
+        self.rows_per_file = rows_per_file
+        self.titles = set()
+        self.written = 0
+        self._buffer = []
+
+    def write(self, reviews):
+        """Buffer a batch of review dicts; returns how many were added"""
+        rows = [normalize_review(review, self.source) for review in reviews]
+        self._buffer.extend(rows)
+        self.titles.update(row['title'] for row in rows)
+        self.written += len(rows)
+        if len(self._buffer) >= self.rows_per_file:
+            self.flush()
+        return len(rows)
+
+    def flush(self):
+        if self._buffer:
+            _write_table(self.root, pa.Table.from_pylist(self._buffer, schema=SCHEMA))
+            self._buffer = []
+
+    def close(self):
+        """Write out buffered rows without compacting"""
+        self.flush()
+
+    def finalize(self):
+        """Flush and compact every title written through this writer"""
+        self.close()
+        for title in self.titles:
+            compact(self.root, self.source, title)
+        print(f"Stored {self.written} {self.source} reviews for {len(self.titles)} titles in {self.root}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.finalize()
+        else:
+            self.close()
+
+
+def load_reviews(root=STORE_ROOT, columns=None, source=None, title=None, rating=None,
+                 title_contains=None, where=None, as_table=False):
+    """
+    Load one slice of the store. Only partitions matching source/title/rating
+    are opened and only the requested columns are read, e.g.
+    load_reviews(columns=['title', 'comment'], source='douban', rating=[1, 2], title_contains='Avatar')
+    :param columns: Columns to read (defaults to all of SCHEMA)
+    :param source: Source or list of sources
+    :param title: Title or list of titles
+    :param rating: Rating or list of ratings
+    :param title_contains: Keep titles containing this substring (resolved to exact titles first)
+    :param where: Extra pyarrow.dataset expression, e.g. ds.field('comment') != ''
+    :param as_table: Return a pyarrow Table instead of a DataFrame
+    """
+    if title_contains is not None:
+        matching = [t for t in list_titles(root, source) if title_contains in t]
+        if title is not None:
+            wanted = set(title) if isinstance(title, (list, tuple, set)) else {title}
+            matching = [t for t in matching if t in wanted]
+        title = matching
+
+    dataset = _dataset(root)
+    conditions = [_matches(field, value)
+                  for field, value in (('source', source), ('title', title), ('rating', rating))
+                  if value is not None]
+    if where is not None:
+        conditions.append(where)
+
+    expr = None
+    for condition in conditions:
+        expr = condition if expr is None else expr & condition
+
+    table = dataset.to_table(columns=columns, filter=expr)
+    return table if as_table else table.to_pandas()
+
+
+def list_titles(root=STORE_ROOT, source=None):
+    """Titles present in the store, read from the partition directories only"""
+    dataset = _dataset(root)
+    where = _matches('source', source) if source is not None else None
+    titles = set()
+    for fragment in dataset.get_fragments(filter=where):
+        titles.add(ds.get_partition_keys(fragment.partition_expression).get('title'))
+    return sorted(t for t in titles if t is not None)
+
+
+def import_csv(path, source, root=STORE_ROOT, title=None, chunksize=5000):
+    """
+    Copy an existing scraper CSV into the store, reading it in chunks
+    :param title: Title for every row, for CSVs without a title column
+    """
+    with ReviewStoreWriter(root, source) as writer:
+        for chunk in pd.read_csv(path, dtype=str, keep_default_na=False, encoding='utf-8-sig', chunksize=chunksize):
+            if title is not None:
+                chunk['title'] = title
+            writer.write(chunk.to_dict('records'))
+    return writer.written
+
+
+def import_existing_outputs(root=STORE_ROOT):
+    """Import every CSV the scrapers have produced so far"""
+    sources = [
+        ('douban', glob.glob(os.path.join('douban短评_output', '*.csv'))),
+        ('douban_long', glob.glob(os.path.join('output1', '*.csv'))),
+        ('imdb', ['imdb_combined_output.csv']),
+    ]
+    total = 0
+    for source, paths in sources:
+        for path in sorted(paths):
+            if os.path.exists(path):
+                total += import_csv(path, source, root)
+    print(f"Imported {total} reviews into {root}")
+    return total
+
+
+if __name__ == "__main__":
+    import_existing_outputs(sys.argv[1] if len(sys.argv) > 1 else STORE_ROOT)
@@ -0,0 +1,596 @@
+import os
+import re
+import sys
+import csv
+import glob
+import gzip
+import html
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+import contextlib
+import multiprocessing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+import numpy as np
+
+from bench_comment_parser import DOUBAN_CSV_FOLDER, build_page
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_DIR = os.path.join(REPO_DIR, 'bench_fixtures')
+LONG_REVIEW_FOLDER = os.path.join(REPO_DIR, 'output1')
+IMDB_CSV = os.path.join(REPO_DIR, 'imdb_combined_output.csv')
+
+FIXTURE_KINDS = ['douban_comments', 'douban_reviews', 'douban_review', 'imdb_reviews']
+PER_PAGE = {'douban_comments': 20, 'douban_reviews': 20, 'imdb_reviews': 25}
+
+ANTI_BOT_PAGE = '''<!DOCTYPE html>
+<html lang="zh-CN"><head><meta charset="utf-8"><title>禁止访问</title></head>
+<body><p>检测到有异常请求从你的 IP 发出，请输入验证码</p><form><input name="captcha-solution"></form></body></html>
+'''
+
+REVIEW_ITEM_TEMPLATE = '''<div data-cid="{rid}">
+<div class="main review-item" id="{rid}">
+  <header class="main-hd"><a href="https://www.douban.com/people/{uid}/" class="name">{uid}</a>
+    <span class="allstar{stars}0 main-title-rating" title="较差"></span></header>
+  <div class="main-bd">
+    <h2><a href="{url}">{headline}</a></h2>
+    <div class="review-content clearfix" data-url="{url}">{paragraphs}</div>
+  </div>
+</div>
+</div>
+'''
+
+REVIEW_LISTING_TEMPLATE = '''<!DOCTYPE html>
+<html lang="zh-CN"><head><meta charset="utf-8"><title>{title}的影评</title></head>
+<body><div id="wrapper"><div id="content"><h1>{title}的影评</h1>
+<div class="article"><div class="review-list">
+{items}
+</div></div></div></div></body></html>
+'''
+
+REVIEW_PAGE_TEMPLATE = '''<!DOCTYPE html>
+<html lang="zh-CN"><head><meta charset="utf-8"><title>{headline}</title></head>
+<body><div id="wrapper"><div id="content"><h1><span property="v:summary">{headline}</span></h1>
+<div class="article"><div class="main" id="{rid}"><div class="main-bd">
+<div class="review-content clearfix" data-url="{url}" data-original="1">{paragraphs}</div>
+</div></div></div></div></div></body></html>
+'''
+
+IMDB_ARTICLE_TEMPLATE = '''<article class="sc-d99cd751-1 kzUfxa user-review-item">
+<div class="ipc-list-card__content"><div class="sc-d99cd751-3 jjCpNf">
+<div class="ipc-html-content ipc-html-content--base"><div class="ipc-html-content-inner-div" role="presentation">{text}</div></div>
+</div></div></article>
+'''
+
+IMDB_PAGE_TEMPLATE = '''<!DOCTYPE html>
+<html lang="en-US"><head><meta charset="utf-8"><title>{title} (User reviews) - IMDb</title></head>
+<body><main><section class="ipc-page-section"><div class="ipc-page-grid__item">
+{articles}
+</div></section></main></body></html>
+'''
+
+# High enough that the limiter never holds a request back; injected failures still back off briefly
+BENCH_LIMITS = dict(initial_rate=1000, max_rate=1000, burst=1000, base_backoff=0.05, max_backoff=0.5)
+
+
+# === FIXTURES ===
+
+def _paragraphs(text):
+    return ''.join(f"<p>{html.escape(line)}</p>" for line in str(text).split('\n') if line.strip())
+
+
+def listing_page(reviews, title):
+    """Render long reviews (id, text, stars, url) as an already-expanded Douban reviews listing page"""
+    items = ''.join(REVIEW_ITEM_TEMPLATE.format(rid=r['id'], uid=f"user{r['id']}", stars=r['stars'], url=r['url'],
+                                                headline=html.escape(r['text'][:20]), paragraphs=_paragraphs(r['text']))
+                    for r in reviews)
+    return REVIEW_LISTING_TEMPLATE.format(title=html.escape(title), items=items)
+
+
+def review_page(review):
+    """Render one long review as its own movie.douban.com/review/<id>/ page"""
+    return REVIEW_PAGE_TEMPLATE.format(rid=review['id'], url=review['url'], headline=html.escape(review['text'][:20]),
+                                       paragraphs=_paragraphs(review['text']))
+
+
+def imdb_page(comments, title):
+    """Render comments as an IMDb reviews page whose reviews are all loaded"""
+    articles = ''.join(IMDB_ARTICLE_TEMPLATE.format(text=html.escape(str(c)).replace('\n', '<br/>')) for c in comments)
+    return IMDB_PAGE_TEMPLATE.format(title=html.escape(title), articles=articles)
+
+
+def record_fixtures(kind, pages, root=FIXTURE_DIR):
+    """
+    Write fixture pages of one kind to <root>/<kind>.jsonl.gz
+    :param pages: (key, url, html) tuples; key is the page index (listings), rating (IMDb) or review id
+    """
+    os.makedirs(root, exist_ok=True)
+    path = os.path.join(root, f"{kind}.jsonl.gz")
+    count = 0
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        for key, url, page in pages:
+            f.write(json.dumps({'key': str(key), 'url': url, 'html': page}, ensure_ascii=False) + '\n')
+            count += 1
+    print(f"💾 {count} {kind} fixtures -> {path}")
+    return path
+
+
+def record_from_cache(kind, urls, keys=None, cache=None, root=FIXTURE_DIR):
+    """Use real pages from the PageCache as fixtures, e.g. the first few listing pages of a crawl"""
+    from page_cache import PageCache
+    cache = cache or PageCache('page_cache')
+    keys = keys or range(len(urls))
+    pages = [(key, url, cache.get(url, max_age=None)) for key, url in zip(keys, urls)]
+    missing = [url for _, url, page in pages if page is None]
+    if missing:
+        raise ValueError(f"{len(missing)} URLs are not in the cache, e.g. {missing[0]}")
+    return record_fixtures(kind, pages, root)
+
+
+def build_fixtures(root=FIXTURE_DIR, comment_pages=5, listing_pages=2, imdb_per_page=25):
+    """Synthesize fixtures for every kind from the CSVs the scrapers already produced"""
+    from bench_comment_parser import pages_from_csvs
+    comments = pages_from_csvs(os.path.join(REPO_DIR, DOUBAN_CSV_FOLDER))[:comment_pages]
+    record_fixtures('douban_comments', [(i, '', page) for i, (page, _) in enumerate(comments)], root)
+
+    path = sorted(glob.glob(os.path.join(LONG_REVIEW_FOLDER, '*.csv')))[0]
+    with open(path, encoding='utf-8-sig') as f:
+        rows = list(csv.DictReader(f))[:listing_pages * PER_PAGE['douban_reviews']]
+    reviews = []
+    for i, row in enumerate(rows):
+        match = re.search(r'/review/(\d+)', row['url'] or '')
+        rid = match.group(1) if match else str(9000000 + i)
+        reviews.append({'id': rid, 'text': row['review_text'], 'stars': row['stars'] or '1',
+                        'url': f"https://movie.douban.com/review/{rid}/"})
+    title = rows[0]['title']
+    per_page = PER_PAGE['douban_reviews']
+    record_fixtures('douban_reviews', [(i, '', listing_page(reviews[start:start + per_page], title))
+                                       for i, start in enumerate(range(0, len(reviews), per_page))], root)
+    record_fixtures('douban_review', [(r['id'], r['url'], review_page(r)) for r in reviews], root)
+
+    with open(IMDB_CSV, encoding='utf-8-sig') as f:
+        imdb_rows = list(csv.DictReader(f))
+    by_rating = {}
+    for row in imdb_rows:
+        bucket = by_rating.setdefault(row['rating'], [])
+        if len(bucket) < imdb_per_page:
+            bucket.append(row['comment'])
+    record_fixtures('imdb_reviews', [(rating, '', imdb_page(comments, imdb_rows[0]['title']))
+                                     for rating, comments in sorted(by_rating.items())], root)
+
+
+def load_fixtures(root=FIXTURE_DIR):
+    """{kind: {key: html}} for every fixture file under root"""
+    fixtures = {}
+    for kind in FIXTURE_KINDS:
+        path = os.path.join(root, f"{kind}.jsonl.gz")
+        if not os.path.exists(path):
+            continue
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            fixtures[kind] = {entry['key']: entry['html'] for entry in map(json.loads, f) if entry}
+    return fixtures
+
+
+# === STAND-IN SERVER ===
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; without this delayed ACKs add ~40 ms per response
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server.stand_in
+        status, body = server.respond(self.path)
+        data = body.encode('utf-8') if isinstance(body, str) else body
+        gzipped = 'gzip' in self.headers.get('Accept-Encoding', '') and len(data) > 512
+        if gzipped:
+            data = gzip.compress(data, compresslevel=5)
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        if gzipped:
+            self.send_header('Content-Encoding', 'gzip')
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class StandInServer:
+    """
+    Local HTTP server replaying fixture pages under Douban's and IMDb's URL
+    layout, with an injected per-request delay, 503 errors and captcha pages.
+    Listing pages cycle through the fixtures until max_pages, then come back
+    empty so crawls end the way they do on the real sites.
+    :param latency: Mean seconds added to every response
+    :param jitter: Delay varies uniformly by +/- this fraction of latency
+    :param error_rate: Share of requests answered with 503
+    :param anti_bot_rate: Share of requests answered with Douban's captcha page
+    :param max_pages: Listing pages served per title and rating
+    """
+
+    ROUTES = [
+        (re.compile(r'^/subject/\d+/comments'), 'douban_comments'),
+        (re.compile(r'^/subject/\d+/reviews'), 'douban_reviews'),
+        (re.compile(r'^/review/(\d+)/?'), 'douban_review'),
+        (re.compile(r'^/title/tt\d+/reviews'), 'imdb_reviews'),
+    ]
+
+    def __init__(self, fixtures, latency=0.02, jitter=0.5, error_rate=0.0, anti_bot_rate=0.0, max_pages=5,
+                 port=0, seed=1):
+        self.fixtures = fixtures
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.anti_bot_rate = anti_bot_rate
+        self.max_pages = max_pages
+        self.stats = {'requests': 0, 'errors': 0, 'anti_bot': 0, 'not_found': 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._pages = {kind: [pages[key] for key in sorted(pages, key=lambda k: int(k) if k.isdigit() else k)]
+                       for kind, pages in fixtures.items()}
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.stand_in = self
+        self.url = f"http://127.0.0.1:{self._httpd.server_address[1]}"
+        self._thread = None
+
+    def _listing(self, kind, index):
+        pages = self._pages.get(kind)
+        if not pages:
+            return None
+        if index >= self.max_pages:
+            return build_page([], 'bench') if kind == 'douban_comments' else listing_page([], 'bench')
+        return pages[index % len(pages)]
+
+    def page(self, path):
+        """(status, HTML) of the fixture for a request path, without injected faults"""
+        parts = urlsplit(path)
+        query = parse_qs(parts.query)
+        for pattern, kind in self.ROUTES:
+            match = pattern.match(parts.path)
+            if not match:
+                continue
+            if kind == 'douban_review':
+                body = self.fixtures.get(kind, {}).get(match.group(1))
+            elif kind == 'imdb_reviews':
+                pages = self._pages.get(kind) or [None]
+                rating = int(query.get('rating', ['1'])[0] or 1)
+                body = pages[(rating - 1) % len(pages)]
+            else:
+                start = int(query.get('start', ['0'])[0] or 0)
+                body = self._listing(kind, start // PER_PAGE[kind])
+            return (200, body) if body is not None else (404, 'not found')
+        return 404, 'not found'
+
+    def respond(self, path):
+        with self._lock:
+            self.stats['requests'] += 1
+            roll = self._random.random()
+            delay = self.latency * (1 + self.jitter * self._random.uniform(-1, 1))
+        time.sleep(max(delay, 0))
+
+        if roll < self.error_rate:
+            status, body = 503, 'Service Unavailable'
+        elif roll < self.error_rate + self.anti_bot_rate:
+            status, body = 200, ANTI_BOT_PAGE
+        else:
+            status, body = self.page(path)
+        with self._lock:
+            if status == 503:
+                self.stats['errors'] += 1
+            elif body is ANTI_BOT_PAGE:
+                self.stats['anti_bot'] += 1
+            elif status == 404:
+                self.stats['not_found'] += 1
+        return status, body
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        print(f"🧪 Stand-in server on {self.url} (latency {self.latency * 1000:.0f} ms, "
+              f"errors {self.error_rate:.0%}, anti-bot {self.anti_bot_rate:.0%})")
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+# === SCRAPER MODES ===
+# Each runs in its own process (fresh imports, so peak RSS is per mode) and returns items
+# scraped, crawl seconds (imports excluded), per-page fetch latencies and parse/extract time
+
+def _bench_titles(options):
+    return {f"bench {i}": str(1000 + i) for i in range(options['titles'])}
+
+
+def _timed_parse(parse, pages):
+    started = time.perf_counter()
+    items = sum(len(parse(page) or []) for page in pages)
+    return time.perf_counter() - started, items
+
+
+def _run_douban_short(options):
+    from rate_limiter import get_rate_limiter
+    from http_session import PooledSession
+    from comment_parser import parse_comment_page
+    from douban_review_scraping import COMMENTS_URL, scrape_all_pages
+
+    limiter = get_rate_limiter(**BENCH_LIMITS)
+    session = PooledSession()
+    items = 0
+    started = time.perf_counter()
+    for title, movie_id in _bench_titles(options).items():
+        items += len(scrape_all_pages(COMMENTS_URL.format(movie_id=movie_id), title, max_pages=options['pages'],
+                                      session=session, limiter=limiter))
+    seconds = time.perf_counter() - started
+    session.close()
+    parse_seconds, parsed = _timed_parse(lambda page: parse_comment_page(page, 'bench'),
+                                         options['fixtures']['douban_comments'].values())
+    return {'items': items, 'seconds': seconds, 'latencies': [t for _, t, _ in session.latencies],
+            'parse_seconds': parse_seconds, 'parsed_items': parsed}
+
+
+def _run_douban_short_async(options):
+    from rate_limiter import get_rate_limiter
+    from comment_parser import parse_comment_page
+    import douban_async_scraping as crawler
+
+    limiter = get_rate_limiter(**BENCH_LIMITS)
+    latencies = []
+    fetch_page = crawler.fetch_page
+
+    async def timed_fetch_page(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await fetch_page(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - started)
+
+    crawler.fetch_page = timed_fetch_page
+    started = time.perf_counter()
+    results = crawler.scrape_titles_concurrently(_bench_titles(options), max_pages=options['pages'], limiter=limiter)
+    seconds = time.perf_counter() - started
+    parse_seconds, parsed = _timed_parse(lambda page: parse_comment_page(page, 'bench'),
+                                         options['fixtures']['douban_comments'].values())
+    return {'items': sum(map(len, results.values())), 'seconds': seconds, 'latencies': latencies,
+            'parse_seconds': parse_seconds, 'parsed_items': parsed}
+
+
+def _run_douban_hybrid(options):
+    from rate_limiter import get_rate_limiter
+    from http_session import PooledSession
+    from comment_parser import parse_review_body
+
+    get_rate_limiter(**BENCH_LIMITS)
+    from douban_hybrid import scrape_title_hybrid
+
+    session = PooledSession()
+    items = 0
+    started = time.perf_counter()
+    for title, movie_id in _bench_titles(options).items():
+        # No browser: the stand-in never needs the fallback when it injects no faults
+        items += len(scrape_title_hybrid(session, None, title, movie_id))
+    seconds = time.perf_counter() - started
+    session.close()
+    def parse_body(item):
+        review = parse_review_body(item[1], 'bench', 1, item[0])
+        return [review] if review else []
+
+    parse_seconds, parsed = _timed_parse(parse_body, options['fixtures']['douban_review'].items())
+    return {'items': items, 'seconds': seconds, 'latencies': [t for _, t, _ in session.latencies],
+            'parse_seconds': parse_seconds, 'parsed_items': parsed}
+
+
+def _run_douban_long_selenium(options):
+    from rate_limiter import get_rate_limiter
+    get_rate_limiter(**BENCH_LIMITS)
+    import doubanscraper3
+
+    extract = doubanscraper3.extract_reviews_batched
+    parse = {'seconds': 0.0, 'items': 0}
+
+    def timed_extract(*args, **kwargs):
+        started = time.perf_counter()
+        page_reviews, items_on_page = extract(*args, **kwargs)
+        parse['seconds'] += time.perf_counter() - started
+        parse['items'] += items_on_page
+        return page_reviews, items_on_page
+
+    doubanscraper3.extract_reviews_batched = timed_extract
+    driver = doubanscraper3.make_driver(headless=True)
+    latencies = []
+    items = 0
+    crawl_started = time.perf_counter()
+    try:
+        for title, movie_id in _bench_titles(options).items():
+            for rating in (1, 2):
+                start = 0
+                while True:
+                    started = time.perf_counter()
+                    result = doubanscraper3.scrape_review_page(driver, title, movie_id, rating, start)
+                    latencies.append(time.perf_counter() - started)
+                    if result is None or not result[1]:
+                        break
+                    items += len(result[0])
+                    start += 20
+        seconds = time.perf_counter() - crawl_started
+    finally:
+        driver.quit()
+    return {'items': items, 'seconds': seconds, 'latencies': latencies, 'parse_seconds': parse['seconds'], 'parsed_items': parse['items']}
+
+
+def _run_imdb_selenium(options):
+    from rate_limiter import get_rate_limiter
+    import imdb_review_scraping as imdb
+
+    limiter = get_rate_limiter(**BENCH_LIMITS)
+    driver = imdb.make_driver(headless=True)
+    latencies = []
+    items = 0
+    crawl_started = time.perf_counter()
+    try:
+        for title, movie_id in _bench_titles(options).items():
+            for rating in range(1, 5):
+                started = time.perf_counter()
+                items += len(imdb.scrape_reviews_for_rating(driver, rating, f"tt{movie_id}", title, limiter=limiter))
+                latencies.append(time.perf_counter() - started)
+        seconds = time.perf_counter() - crawl_started
+        # In-browser extraction of the last page, on its own
+        started = time.perf_counter()
+        parsed = len(driver.execute_script(imdb.EXTRACT_REVIEWS_JS))
+        parse_seconds = time.perf_counter() - started
+    finally:
+        driver.quit()
+    return {'items': items, 'seconds': seconds, 'latencies': latencies, 'parse_seconds': parse_seconds,
+            'parsed_items': parsed}
+
+
+MODES = {
+    'douban_short': _run_douban_short,
+    'douban_short_async': _run_douban_short_async,
+    'douban_hybrid': _run_douban_hybrid,
+    'douban_long_selenium': _run_douban_long_selenium,
+    'imdb_selenium': _run_imdb_selenium,
+}
+SELENIUM_MODES = {'douban_long_selenium', 'imdb_selenium'}
+
+
+def _peak_rss_mb(who):
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(who).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def _run_mode(mode, options, queue):
+    """Child process: run one mode in a scratch directory so caches and checkpoints start empty"""
+    import resource
+    sys.path.insert(0, REPO_DIR)
+    os.environ['DOUBAN_MOVIE_URL'] = options['base_url']
+    os.environ['IMDB_URL'] = options['base_url']
+    workdir = tempfile.mkdtemp(prefix=f"bench_{mode}_")
+    os.chdir(workdir)
+    options = dict(options, fixtures=load_fixtures(options['fixture_root']))
+
+    try:
+        with open(os.devnull, 'w') as devnull, \
+                contextlib.redirect_stdout(sys.stdout if options['verbose'] else devnull):
+            result = MODES[mode](options)
+        result['peak_rss_mb'] = _peak_rss_mb(resource.RUSAGE_SELF)
+        result['children_rss_mb'] = _peak_rss_mb(resource.RUSAGE_CHILDREN)
+        queue.put(result)
+    except Exception as e:
+        queue.put({'error': f"{type(e).__name__}: {e}"})
+    finally:
+        os.chdir(REPO_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run_mode(mode, options):
+    """Run one scraper mode in a fresh process and summarize it"""
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=_run_mode, args=(mode, options, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    if 'error' in result:
+        return {'mode': mode, 'error': result['error']}
+
+    latencies = np.array(result['latencies']) * 1000
+    return {
+        'mode': mode,
+        'pages': len(latencies),
+        'items': result['items'],
+        'seconds': result['seconds'],
+        'pages_per_sec': len(latencies) / result['seconds'] if result['seconds'] else None,
+        'parse_us_per_item': 1e6 * result['parse_seconds'] / result['parsed_items'] if result['parsed_items'] else None,
+        'p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else None,
+        'p99_ms': float(np.percentile(latencies, 99)) if len(latencies) else None,
+        'peak_rss_mb': result['peak_rss_mb'],
+        'children_rss_mb': result['children_rss_mb'],
+    }
+
+
+def print_report(rows):
+    def fmt(value, spec):
+        return format(value, spec) if value is not None else '-'
+
+    print(f"\n{'mode':22s} {'pages':>6s} {'items':>6s} {'pages/s':>8s} {'parse us/item':>14s} "
+          f"{'p50 ms':>8s} {'p99 ms':>8s} {'peak RSS MB':>12s}")
+    for row in rows:
+        if 'error' in row:
+            print(f"{row['mode']:22s} failed: {row['error']}")
+            continue
+        print(f"{row['mode']:22s} {row['pages']:6d} {row['items']:6d} {fmt(row['pages_per_sec'], '8.1f')} "
+              f"{fmt(row['parse_us_per_item'], '14.1f')} {fmt(row['p50_ms'], '8.1f')} {fmt(row['p99_ms'], '8.1f')} "
+              f"{fmt(row['peak_rss_mb'], '12.1f')}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the scrapers offline against a local stand-in server")
+    parser.add_argument('modes', nargs='*', help=f"Modes to run (default: all without Selenium): {', '.join(MODES)}")
+    parser.add_argument('--latency', type=float, default=20, help="Mean injected latency in ms")
+    parser.add_argument('--jitter', type=float, default=0.5, help="Latency varies by +/- this fraction")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Share of 503 responses")
+    parser.add_argument('--anti-bot-rate', type=float, default=0.0, help="Share of captcha pages")
+    parser.add_argument('--pages', type=int, default=5, help="Listing pages per title and rating")
+    parser.add_argument('--titles', type=int, default=2, help="Titles crawled per mode")
+    parser.add_argument('--selenium', action='store_true', help="Also run the Selenium modes (needs Chrome)")
+    parser.add_argument('--fixtures', default=FIXTURE_DIR, help="Fixture directory")
+    parser.add_argument('--build-fixtures', action='store_true', help="Regenerate fixtures from the scraped CSVs")
+    parser.add_argument('--json', help="Also write the results to this file")
+    parser.add_argument('--verbose', action='store_true', help="Show the scrapers' own output")
+    args = parser.parse_args(argv)
+
+    fixture_root = os.path.abspath(args.fixtures)
+    if args.build_fixtures or not os.path.exists(os.path.join(fixture_root, 'douban_comments.jsonl.gz')):
+        build_fixtures(fixture_root)
+
+    modes = args.modes or [m for m in MODES if args.selenium or m not in SELENIUM_MODES]
+    unknown = [m for m in modes if m not in MODES]
+    if unknown:
+        parser.error(f"unknown modes: {', '.join(unknown)}")
+    if (args.error_rate or args.anti_bot_rate) and 'douban_hybrid' in modes:
+        # Its fallback for blocked pages is the browser, which this mode runs without
+        print("⚠️ Skipping douban_hybrid: it needs a browser to recover from injected failures")
+        modes.remove('douban_hybrid')
+
+    server = StandInServer(load_fixtures(fixture_root), latency=args.latency / 1000, jitter=args.jitter,
+                           error_rate=args.error_rate, anti_bot_rate=args.anti_bot_rate, max_pages=args.pages)
+    rows = []
+    with server:
+        options = {'base_url': server.url, 'fixture_root': fixture_root, 'pages': args.pages,
+                   'titles': args.titles, 'verbose': args.verbose}
+        for mode in modes:
+            print(f"⏱️ Running {mode}...")
+            rows.append(run_mode(mode, options))
+
+    print_report(rows)
+    print(f"\nServer: {server.stats}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'settings': vars(args), 'server': server.stats, 'results': rows}, f, indent=2)
+    return rows
+
+
+if __name__ == "__main__":
+    main()
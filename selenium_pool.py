@@ -0,0 +1,136 @@
+import os
+import queue
+import threading
+import traceback
+
+from selenium.common.exceptions import WebDriverException
+
+
+class RetryTask(Exception):
+    """Raised by a task handler to put the task back on the queue without restarting the browser"""
+
+
+def portable_cookie(cookie):
+    """Keep only the cookie fields add_cookie accepts, in the types it accepts"""
+    clean = {k: cookie[k] for k in ('name', 'value', 'path', 'domain', 'secure', 'httpOnly') if k in cookie}
+    if 'expiry' in cookie:
+        clean['expiry'] = int(cookie['expiry'])
+    if cookie.get('sameSite') in ('Strict', 'Lax', 'None'):
+        clean['sameSite'] = cookie['sameSite']
+    return clean
+
+
+class BrowserPool:
+    """
+    N WebDriver workers pulling tasks from one shared queue.
+
+    Each worker thread owns its own browser. When cookies are given (e.g. the
+    logged-in cookies exported from the first browser with get_cookies()),
+    every new browser opens cookie_url and receives them before doing any work.
+    A task that raises a WebDriverException gets its driver replaced and is
+    put back on the queue, up to max_task_retries times.
+    :param make_driver: Zero-argument callable returning a new WebDriver
+    :param size: Number of workers (defaults to the number of CPU cores)
+    :param cookies: Cookies to load into every worker
+    :param cookie_url: Page opened before adding cookies (cookies can only be set for the current domain)
+    """
+
+    def __init__(self, make_driver, size=None, cookies=None, cookie_url=None, max_task_retries=2):
+        self.make_driver = make_driver
+        self.size = size or os.cpu_count() or 2
+        self.cookies = cookies or []
+        self.cookie_url = cookie_url
+        self.max_task_retries = max_task_retries
+        self.restarts = 0
+        self._tasks = queue.Queue()
+        self._attempts = {}
+        self._results = []
+        self._lock = threading.Lock()
+
+    def _new_driver(self):
+        driver = self.make_driver()
+        if self.cookies:
+            driver.get(self.cookie_url)
+            for cookie in self.cookies:
+                try:
+                    driver.add_cookie(portable_cookie(cookie))
+                except WebDriverException as e:
+                    print(f"⚠️ Could not set cookie {cookie.get('name')}: {e}")
+        return driver
+
+    def _quit(self, driver):
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def _retry(self, task, reason):
+        with self._lock:
+            attempts = self._attempts.get(task, 0) + 1
+            self._attempts[task] = attempts
+        if attempts <= self.max_task_retries:
+            print(f"🔁 Retrying {task} ({attempts}/{self.max_task_retries}): {reason}")
+            self._tasks.put(task)
+        else:
+            print(f"❌ Giving up on {task} after {attempts} attempts: {reason}")
+
+    def _worker(self, handle, worker_id):
+        driver = None
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                self._tasks.task_done()
+                break
+            try:
+                if driver is None:
+                    driver = self._new_driver()
+                result, follow_ups = handle(driver, task)
+                with self._lock:
+                    self._results.append((task, result))
+                for follow_up in follow_ups:
+                    self._tasks.put(follow_up)
+            except RetryTask as e:
+                self._retry(task, e)
+            except WebDriverException as e:
+                # The browser crashed or hung: start a fresh one for the next task
+                print(f"💥 Worker {worker_id} driver failed, restarting it: {e.msg}")
+                self._quit(driver)
+                driver = None
+                with self._lock:
+                    self.restarts += 1
+                self._retry(task, 'driver crashed')
+            except Exception as e:
+                traceback.print_exc()
+                self._retry(task, e)
+            finally:
+                self._tasks.task_done()
+
+        if driver is not None:
+            self._quit(driver)
+
+    def run(self, tasks, handle):
+        """
+        Process tasks until the queue drains
+        :param tasks: Initial tasks (must be hashable)
+        :param handle: Callable (driver, task) -> (result, follow-up tasks)
+        :return: list of (task, result) in completion order
+        """
+        for task in tasks:
+            self._tasks.put(task)
+
+        workers = [
+            threading.Thread(target=self._worker, args=(handle, i), daemon=True)
+            for i in range(self.size)
+        ]
+        for worker in workers:
+            worker.start()
+
+        # Every task (including follow-ups) is done once the queue is joined; then stop the workers
+        self._tasks.join()
+        for _ in workers:
+            self._tasks.put(None)
+        for worker in workers:
+            worker.join()
+
+        results, self._results = self._results, []
+        return results
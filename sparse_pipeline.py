@@ -0,0 +1,157 @@
+import re
+import sys
+import time
+import tracemalloc
+from collections import Counter
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.decomposition import TruncatedSVD
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+from sklearn.preprocessing import normalize
+
+
+def clean_english(text):
+    """Lowercase letters-only words without English stopwords, as in moreexplore's clean_english"""
+    text = re.sub(r"[^a-z\s]", "", str(text).lower())
+    return ' '.join(w for w in text.split() if w not in ENGLISH_STOP_WORDS)
+
+
+def iter_chunks(texts, chunk_size=5000):
+    for offset in range(0, len(texts), chunk_size):
+        yield texts[offset:offset + chunk_size]
+
+
+def _ngrams(text, ngram_range):
+    words = text.split()
+    low, high = ngram_range
+    for n in range(low, high + 1):
+        for i in range(len(words) - n + 1):
+            yield ' '.join(words[i:i + n])
+
+
+class ChunkedTfidf:
+    """
+    TF-IDF over whitespace-tokenized texts, fitted out of core.
+
+    fit() streams the corpus once, keeping only term and document
+    frequencies; the vocabulary is then the max_features most frequent
+    terms. transform() builds the CSR matrix one chunk at a time, so peak
+    memory is the sparse result plus one chunk, whatever max_features is.
+    Gives the same matrix as TfidfVectorizer over pre-split words (up to
+    how ties at the max_features cut are broken).
+    :param chunks: Callable returning a fresh iterator of text lists (e.g. lambda: iter_chunks(texts))
+    """
+
+    def __init__(self, max_features=1000, ngram_range=(1, 1), min_df=1):
+        self.max_features = max_features
+        self.ngram_range = ngram_range
+        self.min_df = min_df
+        self.vocabulary_ = None
+        self.idf_ = None
+        self.n_docs = 0
+
+    def fit(self, chunks):
+        df = Counter()
+        tf = Counter()
+        self.n_docs = 0
+        for chunk in chunks():
+            for text in chunk:
+                grams = list(_ngrams(text, self.ngram_range))
+                tf.update(grams)
+                df.update(set(grams))
+            self.n_docs += len(chunk)
+
+        # Like TfidfVectorizer, keep the terms most frequent across the corpus
+        terms = sorted((t for t, count in df.items() if count >= self.min_df), key=lambda t: (-tf[t], t))
+        terms = sorted(terms[:self.max_features])
+        self.vocabulary_ = {term: i for i, term in enumerate(terms)}
+        doc_freq = np.array([df[term] for term in terms], dtype=np.float64)
+        self.idf_ = np.log((1 + self.n_docs) / (1 + doc_freq)) + 1
+        return self
+
+    def _transform_chunk(self, chunk):
+        indptr, indices, data = [0], [], []
+        for text in chunk:
+            counts = Counter(self.vocabulary_[g] for g in _ngrams(text, self.ngram_range) if g in self.vocabulary_)
+            indices.extend(counts.keys())
+            data.extend(counts.values())
+            indptr.append(len(indices))
+        X = sp.csr_matrix((np.array(data, dtype=np.float64), np.array(indices, dtype=np.int32), indptr),
+                          shape=(len(chunk), len(self.vocabulary_)))
+        X = X.multiply(self.idf_).tocsr()
+        return normalize(X, norm='l2', copy=False)
+
+    def transform(self, chunks):
+        X = sp.vstack([self._transform_chunk(chunk) for chunk in chunks()], format='csr')
+        X.sort_indices()
+        return X
+
+    def fit_transform(self, chunks):
+        return self.fit(chunks).transform(chunks)
+
+
+def sparse_cluster(X, n_clusters=6, n_components=100, random_state=42):
+    """
+    Cluster a CSR matrix without densifying it: MiniBatchKMeans runs on the
+    sparse rows directly and randomized TruncatedSVD (instead of PCA on
+    X.toarray()) gives the 2-D coordinates for plotting
+    :return: (labels, 2-D coordinates, fitted TruncatedSVD with n_components)
+    """
+    labels = MiniBatchKMeans(n_clusters=n_clusters, random_state=random_state, n_init=3).fit_predict(X)
+    n_components = max(2, min(n_components, X.shape[1] - 1))
+    svd = TruncatedSVD(n_components=n_components, algorithm='randomized', n_iter=5, random_state=random_state)
+    reduced = svd.fit_transform(X)
+    return labels, reduced[:, :2], svd
+
+
+def run_pipeline(texts, max_features=20000, ngram_range=(1, 2), n_clusters=6, n_components=100, chunk_size=5000):
+    """Vectorize -> cluster -> reduce, sparse from end to end"""
+    vectorizer = ChunkedTfidf(max_features, ngram_range)
+    X = vectorizer.fit_transform(lambda: iter_chunks(texts, chunk_size))
+    labels, coords, svd = sparse_cluster(X, n_clusters, n_components)
+    return {'X': X, 'vectorizer': vectorizer, 'labels': labels, 'coords': coords, 'svd': svd}
+
+
+def benchmark(texts, feature_sizes=(1000, 5000, 20000, 50000), ngram_ranges=((1, 1), (1, 2)), n_clusters=6):
+    """Peak traced memory and time of run_pipeline, next to what X.toarray() alone would take"""
+    rows = []
+    for ngram_range in ngram_ranges:
+        for max_features in feature_sizes:
+            tracemalloc.start()
+            started = time.perf_counter()
+            result = run_pipeline(texts, max_features, ngram_range, n_clusters)
+            elapsed = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            X = result['X']
+            rows.append({
+                'ngram_range': ngram_range,
+                'max_features': max_features,
+                'features': X.shape[1],
+                'nnz': X.nnz,
+                'sparse_mb': (X.data.nbytes + X.indices.nbytes + X.indptr.nbytes) / 2 ** 20,
+                'dense_mb': X.shape[0] * X.shape[1] * 8 / 2 ** 20,
+                'peak_mb': peak / 2 ** 20,
+                'seconds': elapsed,
+            })
+            print(f"ngrams {ngram_range}, {X.shape[1]} features: peak {rows[-1]['peak_mb']:.1f} MB "
+                  f"(dense X alone would be {rows[-1]['dense_mb']:.1f} MB), {elapsed:.1f}s")
+    return rows
+
+
+def load_corpus(douban_path='combined_output.csv', imdb_path='imdb_combined_output.csv'):
+    """Combined Douban + IMDb texts, cleaned the way moreexplore does"""
+    import pandas as pd
+    from tokenize_service import tokenize_texts, words
+
+    douban = pd.read_csv(douban_path)['review_text'].fillna('').tolist()
+    imdb = pd.read_csv(imdb_path)['comment'].fillna('').tolist()
+    chinese = [' '.join(words(tokens)) for tokens in tokenize_texts(douban, chinese_only=True)]
+    return chinese + [clean_english(text) for text in imdb]
+
+
+if __name__ == "__main__":
+    benchmark(load_corpus(*sys.argv[1:3]))
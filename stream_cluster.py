@@ -0,0 +1,160 @@
+import os
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from sklearn.cluster import MiniBatchKMeans
+
+
+def iter_batches(vectors, batch_size=1024, start=0):
+    """Row slices of an array or memmap, so only one batch is in memory at a time"""
+    for offset in range(start, len(vectors), batch_size):
+        yield offset, np.asarray(vectors[offset:offset + batch_size], dtype=np.float32)
+
+
+def _squared_distances(X, centers):
+    return (X ** 2).sum(axis=1)[:, None] - 2 * X @ centers.T + (centers ** 2).sum(axis=1)[None, :]
+
+
+class StreamingClusterer:
+    """
+    Mini-batch KMeans over a streamed embedding matrix, with persisted centroids
+    and stable labels for reviews added later.
+
+    Training and refreshing read the vectors one batch at a time (an
+    EmbeddingCache memmap works as the source). Labels are kept in
+    ``<path>.labels.npy`` aligned with the source rows; label_new() only
+    assigns rows added since the last call, without moving the centroids.
+    While doing so it tracks how far new reviews sit from their centroids
+    compared with the training data, and refreshes the centroids once that
+    drift passes drift_threshold.
+    :param path: Prefix for <path>.npz (centroids and stats) and <path>.labels.npy
+    :param n_clusters: Number of clusters
+    :param batch_size: Rows per mini-batch
+    :param drift_threshold: Relative increase in mean squared distance that triggers a refresh
+    """
+
+    def __init__(self, path='clusters', n_clusters=6, batch_size=1024, drift_threshold=0.15, random_state=42):
+        self.path = path
+        self.n_clusters = n_clusters
+        self.batch_size = batch_size
+        self.drift_threshold = drift_threshold
+        self.random_state = random_state
+        self.centers = None
+        self.counts = None
+        self.baseline = None
+        self.new_distance_sum = 0.0
+        self.new_count = 0
+        self.labels = np.empty(0, dtype=np.int32)
+
+        if os.path.exists(f"{path}.npz"):
+            saved = np.load(f"{path}.npz")
+            self.centers = saved['centers']
+            self.counts = saved['counts']
+            self.n_clusters = len(self.centers)
+            self.baseline = float(saved['baseline'])
+            self.new_distance_sum = float(saved['new_distance_sum'])
+            self.new_count = int(saved['new_count'])
+        if os.path.exists(f"{path}.labels.npy"):
+            self.labels = np.load(f"{path}.labels.npy")
+
+    def _train(self, vectors, epochs, init):
+        model = MiniBatchKMeans(n_clusters=self.n_clusters, init=init, n_init=1,
+                                batch_size=self.batch_size, random_state=self.random_state)
+        for epoch in range(epochs):
+            for _, batch in iter_batches(vectors, self.batch_size):
+                # sklearn needs at least n_clusters rows to initialise from a batch
+                if len(batch) >= self.n_clusters or hasattr(model, 'cluster_centers_'):
+                    model.partial_fit(batch)
+        return model.cluster_centers_.astype(np.float32)
+
+    def _label_all(self, vectors):
+        """Assign every row and reset the drift baseline to the mean distance of the training data"""
+        labels = np.empty(len(vectors), dtype=np.int32)
+        self.counts = np.zeros(self.n_clusters, dtype=np.int64)
+        distance_sum = 0.0
+        for offset, batch in iter_batches(vectors, self.batch_size):
+            batch_labels, distances = self._nearest(batch)
+            labels[offset:offset + len(batch)] = batch_labels
+            self.counts += np.bincount(batch_labels, minlength=self.n_clusters)
+            distance_sum += float(distances.sum())
+        self.labels = labels
+        self.baseline = distance_sum / max(len(vectors), 1)
+        self.new_distance_sum = 0.0
+        self.new_count = 0
+
+    def _nearest(self, X):
+        distances = _squared_distances(X, self.centers)
+        labels = distances.argmin(axis=1).astype(np.int32)
+        return labels, np.maximum(distances[np.arange(len(X)), labels], 0)
+
+    def fit(self, vectors, epochs=3):
+        """Train from scratch on every row of vectors, then label them all"""
+        self.centers = self._train(vectors, epochs, init='k-means++')
+        self._label_all(vectors)
+        self.save()
+        print(f"Fitted {self.n_clusters} clusters on {len(vectors)} reviews, sizes {self.counts.tolist()}")
+        return self.labels
+
+    def assign(self, X):
+        """Nearest centroid for each row of X, without recording anything"""
+        labels = np.empty(len(X), dtype=np.int32)
+        for offset, batch in iter_batches(X, self.batch_size):
+            labels[offset:offset + len(batch)] = self._nearest(batch)[0]
+        return labels
+
+    @property
+    def drift(self):
+        """How much further new reviews sit from their centroids than the training data did (0.1 = 10%)"""
+        if not self.new_count or not self.baseline:
+            return 0.0
+        return self.new_distance_sum / self.new_count / self.baseline - 1
+
+    def label_new(self, vectors, auto_refresh=True):
+        """
+        Labels for every row of vectors, assigning only rows added since the last call
+        (fits from scratch the first time, refreshes if the drift passes the threshold)
+        """
+        if self.centers is None:
+            return self.fit(vectors)
+
+        start = len(self.labels)
+        new_labels = [self.labels]
+        for _, batch in iter_batches(vectors, self.batch_size, start=start):
+            labels, distances = self._nearest(batch)
+            new_labels.append(labels)
+            self.counts += np.bincount(labels, minlength=self.n_clusters)
+            self.new_distance_sum += float(distances.sum())
+            self.new_count += len(batch)
+        self.labels = np.concatenate(new_labels)
+        print(f"Assigned {len(vectors) - start} new reviews, drift {self.drift:.1%}")
+
+        if auto_refresh and self.drift > self.drift_threshold:
+            self.refresh(vectors)
+        else:
+            self.save()
+        return self.labels
+
+    def refresh(self, vectors, epochs=1):
+        """
+        Retrain warm-started from the current centroids and relabel every row.
+        New centroids are matched to old ones so cluster ids keep their meaning.
+        """
+        old_centers = self.centers
+        new_centers = self._train(vectors, epochs, init=old_centers)
+        old_ids, new_ids = linear_sum_assignment(_squared_distances(old_centers, new_centers))
+        self.centers = new_centers[new_ids[np.argsort(old_ids)]]
+        previous = self.labels
+        self._label_all(vectors)
+        changed = int((previous != self.labels[:len(previous)]).sum())
+        self.save()
+        print(f"Refreshed centroids: {changed} of {len(previous)} reviews changed cluster")
+        return self.labels
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp.npz"
+        np.savez(tmp_path, centers=self.centers, counts=self.counts, baseline=self.baseline,
+                 new_distance_sum=self.new_distance_sum, new_count=self.new_count)
+        os.replace(tmp_path, f"{self.path}.npz")
+        tmp_path = f"{self.path}.labels.tmp.npy"
+        np.save(tmp_path, self.labels)
+        os.replace(tmp_path, f"{self.path}.labels.npy")
@@ -0,0 +1,37 @@
+import numpy as np
+
+from cluster_keywords import candidate_terms, cluster_keywords, doc_term_matrix
+
+
+def eng(text):
+    """tokenize_service output for an English comment: jieba tags every Latin word 'eng'"""
+    return [[word, 'eng'] for word in text.split()]
+
+
+ENGLISH = [eng("The CGI looked cheap and the plot was boring"),
+           eng("Boring plot and cheap CGI"),
+           eng("Great acting and a great soundtrack"),
+           eng("The soundtrack was great and the acting superb")]
+
+
+def test_english_tokens_are_candidates():
+    terms = candidate_terms(eng("The CGI looked cheap"), bigrams=False)
+    assert terms == ['cgi', 'looked', 'cheap']
+
+
+def test_english_corpus_gets_keywords():
+    keywords = cluster_keywords(ENGLISH, labels=[0, 0, 1, 1], top_n=3)
+    assert {'cheap', 'cgi', 'boring', 'plot'} & {term for term, _ in keywords[0]}
+    assert {'great', 'soundtrack', 'acting'} & {term for term, _ in keywords[1]}
+
+
+def test_mixed_chinese_and_english():
+    tokens = [['特效', 'n'], ['很', 'd'], ['差', 'a'], ['CGI', 'eng']]
+    assert candidate_terms(tokens, bigrams=False) == ['特效', 'cgi']
+
+
+def test_empty_vocabulary_gives_empty_keywords():
+    stopwords_only = [eng("the and a"), eng("was the")]
+    X, terms = doc_term_matrix(stopwords_only)
+    assert X.shape == (2, 0) and len(terms) == 0
+    assert cluster_keywords(stopwords_only, labels=np.array([0, 1]), embeddings=np.ones((2, 3))) == {0: [], 1: []}
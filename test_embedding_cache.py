@@ -0,0 +1,46 @@
+import numpy as np
+
+from embedding_cache import EmbeddingCache, text_key
+
+DIM = 4
+
+
+def fake_encode(texts):
+    return np.array([[len(text), i, 1, 0] for i, text in enumerate(texts)], dtype=np.float32)
+
+
+def texts_with_nul_keys(count=3):
+    """Texts whose digest ends in a NUL byte, which an 'S16' read would strip"""
+    texts, i = [], 0
+    while len(texts) < count:
+        if text_key(f"review {i}").endswith(b'\x00'):
+            texts.append(f"review {i}")
+        i += 1
+    return texts
+
+
+def test_round_trip_keeps_keys_ending_in_nul(tmp_path):
+    texts = texts_with_nul_keys() + ["plain", "另一条短评"]
+    first = EmbeddingCache('model', root=str(tmp_path)).get(texts, fake_encode)
+
+    def fail(missing):
+        raise AssertionError(f"re-encoded {missing}")
+
+    reloaded = EmbeddingCache('model', root=str(tmp_path))
+    assert len(reloaded) == len(texts)
+    np.testing.assert_array_equal(reloaded.get(texts, fail), first)
+    assert reloaded.add(texts, fake_encode(texts)) == 0
+
+
+def test_orphan_vectors_are_cut_on_load(tmp_path):
+    cache = EmbeddingCache('model', root=str(tmp_path))
+    cache.get(["a", "b"], fake_encode)
+    # A crash between the vector and key appends leaves a vector without a key
+    with open(cache.vectors_path, 'ab') as f:
+        np.full((1, DIM), 99, dtype=np.float32).tofile(f)
+
+    reloaded = EmbeddingCache('model', root=str(tmp_path))
+    vectors = reloaded.get(["c"], lambda missing: np.full((1, DIM), 7, dtype=np.float32))
+    np.testing.assert_array_equal(vectors, np.full((1, DIM), 7, dtype=np.float32))
+    np.testing.assert_array_equal(EmbeddingCache('model', root=str(tmp_path)).get(["a", "b", "c"], fake_encode)[2],
+                                  np.full(DIM, 7, dtype=np.float32))
@@ -0,0 +1,50 @@
+from collections import namedtuple
+
+Title = namedtuple("Title", ["name", "douban", "imdb"])
+
+# Every movie we scrape, with its Douban subject ID and IMDb title ID
+REGISTRY = [
+    Title('Aquaman', '3878007', 'tt1477834'),
+    Title('Avatar', '1652587', 'tt0499549'),
+    Title('Avatar: The Way of Water', '4811774', 'tt1630029'),
+    Title('Avengers: Age of Ultron', '10741834', 'tt2395427'),
+    Title('Avengers: Endgame', '26100958', 'tt4154796'),
+    Title('Avengers: Infinity War', '24773958', 'tt4154756'),
+    Title('Everything Everywhere All at Once', '30314848', 'tt6710474'),
+    Title('Fast & Furious Presents: Hobbs & Shaw', '27163278', 'tt6806448'),
+    Title('Furious 7', '23761370', 'tt2820852'),
+    Title('Jurassic World', '10440138', 'tt0369610'),
+    Title('Jurassic World: Fallen Kingdom', '26416062', 'tt4881806'),
+    Title('Ready Player One', '4920389', 'tt1677720'),
+    Title('Spider-Man: Far From Home', '26931786', 'tt6320628'),
+    Title('The Fate of the Furious', '26260853', 'tt4630562'),
+    Title('Transformers: Age of Extinction', '7054604', 'tt2109248'),
+    Title('Transformers: The Last Knight', '25824686', 'tt3371366'),
+    Title('Venom', '3168101', 'tt1270797'),
+    Title('Warcraft', '2131940', 'tt0803096'),
+    Title('Zootopia', '25662329', 'tt2948356'),
+]
+
+
+def select(names=None):
+    """
+    Registry entries for the given names (case-insensitive), or all of them
+    :raises KeyError: for a name that isn't in the registry
+    """
+    if not names:
+        return list(REGISTRY)
+    by_name = {title.name.lower(): title for title in REGISTRY}
+    unknown = [name for name in names if name.lower() not in by_name]
+    if unknown:
+        raise KeyError(f"Unknown titles: {', '.join(unknown)}")
+    return [by_name[name.lower()] for name in names]
+
+
+def douban_ids(names=None):
+    """Title -> Douban subject ID"""
+    return {title.name: title.douban for title in select(names) if title.douban}
+
+
+def imdb_ids(names=None):
+    """Title -> IMDb title ID"""
+    return {title.name: title.imdb for title in select(names) if title.imdb}
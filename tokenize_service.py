@@ -0,0 +1,141 @@
+import os
+import re
+import sys
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+from embedding_cache import text_key
+
+STOPWORDS_PATH = 'chinese_stopwords.txt'
+NON_CHINESE = re.compile(r"[^一-龥]")
+
+_stopwords = None
+_chinese_only = False
+
+
+def load_stopwords(path=STOPWORDS_PATH):
+    with open(path, encoding='utf-8') as f:
+        return frozenset(f.read().split())
+
+
+def _init_worker(stopwords_path, chinese_only):
+    """Load jieba's dictionary and the stopwords once per process"""
+    global _stopwords, _chinese_only
+    import jieba
+    jieba.setLogLevel(60)
+    jieba.initialize()
+    _stopwords = load_stopwords(stopwords_path)
+    _chinese_only = chinese_only
+
+
+def tokenize(text):
+    """[word, POS flag] pairs for one comment, without stopwords, whitespace or punctuation"""
+    import jieba.posseg as pseg
+    text = str(text).lower()
+    if _chinese_only:
+        text = NON_CHINESE.sub('', text)
+    return [[w.word, w.flag] for w in pseg.cut(text)
+            if w.word.strip() and w.flag != 'x' and w.word not in _stopwords]
+
+
+def _tokenize_many(texts):
+    return [tokenize(text) for text in texts]
+
+
+def words(tokens, pos_prefixes=None, min_length=1):
+    """
+    Words from tokenize() output, optionally only those whose POS flag starts with one of pos_prefixes
+    (the keyword cells used ('n', 'a', 'v') and min_length=2)
+    """
+    return [word for word, flag in tokens
+            if len(word) >= min_length and (pos_prefixes is None or flag.startswith(tuple(pos_prefixes)))]
+
+
+class TokenCache:
+    """
+    Tokenized comments keyed by text hash, in an append-only JSON-lines file.
+    The file name includes a hash of the stopword list and options, so
+    changing either starts a fresh cache instead of serving stale tokens.
+    A line torn by a crash mid-append is skipped, and cut off if it is the last one.
+    """
+
+    def __init__(self, root='token_cache', stopwords_path=STOPWORDS_PATH, chinese_only=False):
+        with open(stopwords_path, 'rb') as f:
+            config = hashlib.sha256(f.read() + repr(chinese_only).encode('utf-8')).hexdigest()[:12]
+        os.makedirs(root, exist_ok=True)
+        self.path = os.path.join(root, f"tokens-{config}.jsonl")
+        self.tokens = {}
+        if os.path.exists(self.path):
+            size = complete = 0
+            with open(self.path, 'rb') as f:
+                for line in f:
+                    size += len(line)
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if line.endswith(b'\n'):
+                        self.tokens[entry['key']] = entry['tokens']
+                        complete = size
+            if complete < size:
+                with open(self.path, 'r+b') as f:
+                    f.truncate(complete)
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def get(self, text):
+        return self.tokens.get(text_key(text).hex())
+
+    def put_many(self, texts, token_lists):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for text, tokens in zip(texts, token_lists):
+                key = text_key(text).hex()
+                self.tokens[key] = tokens
+                f.write(json.dumps({'key': key, 'tokens': tokens}, ensure_ascii=False) + '\n')
+
+
+def tokenize_texts(texts, workers=None, chunk_size=256, root='token_cache',
+                   stopwords_path=STOPWORDS_PATH, chinese_only=False):
+    """
+    Tokens for every text, in order. Only texts the cache hasn't seen are
+    segmented, spread over a process pool in chunks of chunk_size comments.
+    :param chinese_only: Drop everything but Chinese characters first (like clean_chinese in moreexplore)
+    """
+    texts = [str(text) for text in texts]
+    cache = TokenCache(root, stopwords_path, chinese_only)
+    uncached = [text for text in texts if cache.get(text) is None]
+    missing = list(dict.fromkeys(uncached))
+
+    if missing:
+        print(f"Tokenizing {len(missing)} new comments ({len(texts) - len(uncached)} cached)")
+        chunks = [missing[i:i + chunk_size] for i in range(0, len(missing), chunk_size)]
+        workers = workers or os.cpu_count() or 1
+        if workers == 1:
+            _init_worker(stopwords_path, chinese_only)
+            for chunk, token_lists in zip(chunks, map(_tokenize_many, chunks)):
+                cache.put_many(chunk, token_lists)
+        else:
+            pool = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(stopwords_path, chinese_only))
+            try:
+                for chunk, token_lists in zip(chunks, pool.map(_tokenize_many, chunks)):
+                    cache.put_many(chunk, token_lists)
+            finally:
+                pool.shutdown(cancel_futures=True)
+
+    return [cache.get(text) for text in texts]
+
+
+def add_token_column(df, column='comment', name='tokens', **kwargs):
+    """Add a column of per-comment [word, flag] lists to df"""
+    df[name] = tokenize_texts(df[column].fillna('').tolist(), **kwargs)
+    return df
+
+
+if __name__ == "__main__":
+    import pandas as pd
+    path = sys.argv[1] if len(sys.argv) > 1 else 'combined_output.csv'
+    column = sys.argv[2] if len(sys.argv) > 2 else 'review_text'
+    df = add_token_column(pd.read_csv(path), column)
+    print(df['tokens'].head())
@@ -0,0 +1,277 @@
+import os
+import json
+import time
+
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+
+from embedding_cache import KEY_SIZE, KEY_DTYPE, text_key
+
+ROW_DTYPE = np.dtype([('list', '<i4'), ('source', '<i2'), ('title', '<i4'), ('rating', '<i1')])
+RETRAIN_FACTOR = 4  # build_from_store retrains the cells once the index is this many times what they were trained on
+RETRAIN_SAMPLE = 100_000  # Vectors sampled to retrain the cells
+
+
+def _normalize(vectors):
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class VectorIndex:
+    """
+    IVF (inverted file) index for cosine "reviews like this" queries.
+
+    Vectors are clustered into n_lists coarse cells; a query only scores the
+    reviews in its n_probe nearest cells. On disk (``<path>/``):
+    centroids.npy, vectors.f32 (normalized float32 rows), rows.bin (cell and
+    source/title/rating codes per row), keys.bin (16-byte text digest per
+    row, as in EmbeddingCache), codes.json (source and title names) and
+    meta.json (how many vectors the cells were trained on). Row files are
+    append-only and memory-mapped; inserts are appended to disk and folded
+    into the in-memory arrays at the next query, so an insert costs only
+    its own rows. retrain() re-learns the cells once the index has outgrown
+    the data they were trained on.
+    :param path: Index directory
+    :param n_probe: Cells searched per query
+    """
+
+    def __init__(self, path='vector_index', n_probe=8):
+        self.path = path
+        self.n_probe = n_probe
+        self.centroids = None
+        self.codes = {'source': [], 'title': []}
+        self._vectors = None
+        self._rows = np.empty(0, dtype=ROW_DTYPE)
+        self._keys = np.empty(0, dtype=KEY_DTYPE)
+        self._pending = []
+        self._lists = None
+        self.trained_on = 0
+        os.makedirs(path, exist_ok=True)
+
+        if os.path.exists(self._file('centroids.npy')):
+            self.centroids = np.load(self._file('centroids.npy'))
+            with open(self._file('codes.json'), encoding='utf-8') as f:
+                self.codes = json.load(f)
+            self._load_rows()
+            self.trained_on = len(self)
+            if os.path.exists(self._file('meta.json')):
+                with open(self._file('meta.json'), encoding='utf-8') as f:
+                    self.trained_on = json.load(f)['trained_on']
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _load_rows(self):
+        dim = self.centroids.shape[1]
+        rows = np.fromfile(self._file('rows.bin'), dtype=ROW_DTYPE) if os.path.exists(self._file('rows.bin')) else self._rows
+        keys = np.fromfile(self._file('keys.bin'), dtype=KEY_DTYPE) if os.path.exists(self._file('keys.bin')) else self._keys
+        stored = os.path.getsize(self._file('vectors.f32')) // (4 * dim) if os.path.exists(self._file('vectors.f32')) else 0
+        # Vectors are appended first, so a crash mid-insert leaves extra vectors (or rows); cut them off
+        # so the next append lines up again
+        count = min(len(rows), len(keys), stored)
+        for name, size in (('vectors.f32', 4 * dim), ('rows.bin', ROW_DTYPE.itemsize), ('keys.bin', KEY_SIZE)):
+            if os.path.exists(self._file(name)) and os.path.getsize(self._file(name)) > count * size:
+                with open(self._file(name), 'r+b') as f:
+                    f.truncate(count * size)
+        self._rows, self._keys = rows[:count], keys[:count]
+        self._vectors = np.memmap(self._file('vectors.f32'), dtype=np.float32, mode='r', shape=(count, dim)) if count else None
+        self._lists = None
+
+    def _consolidate(self):
+        """Fold rows added since the last query into the in-memory arrays and remap vectors.f32"""
+        if not self._pending:
+            return
+        self._rows = np.concatenate([self._rows] + [rows for rows, _ in self._pending])
+        self._keys = np.concatenate([self._keys] + [keys for _, keys in self._pending])
+        self._pending = []
+        self._vectors = np.memmap(self._file('vectors.f32'), dtype=np.float32, mode='r',
+                                  shape=(len(self._rows), self.centroids.shape[1]))
+        self._lists = None
+
+    def __len__(self):
+        return len(self._rows) + sum(len(rows) for rows, _ in self._pending)
+
+    def _code(self, field, value):
+        names = self.codes[field]
+        if value not in names:
+            names.append(value)
+        return names.index(value)
+
+    def _inverted_lists(self):
+        """Row ids of every cell, rebuilt lazily after inserts"""
+        self._consolidate()
+        if self._lists is None:
+            order = np.argsort(self._rows['list'], kind='stable')
+            bounds = np.searchsorted(self._rows['list'][order], np.arange(len(self.centroids) + 1))
+            self._lists = [order[bounds[i]:bounds[i + 1]] for i in range(len(self.centroids))]
+        return self._lists
+
+    def train(self, vectors, n_lists=None, random_state=42, trained_on=None):
+        """
+        Learn the coarse cells from a sample of vectors (defaults to about 4 * sqrt(n) cells)
+        :param trained_on: Index size the sample stands for (defaults to the sample size)
+        """
+        vectors = _normalize(vectors)
+        n_lists = n_lists or max(1, min(len(vectors), int(4 * np.sqrt(len(vectors)))))
+        model = MiniBatchKMeans(n_clusters=n_lists, n_init=1, batch_size=4096, random_state=random_state)
+        self.centroids = _normalize(model.fit(vectors).cluster_centers_)
+        np.save(self._file('centroids.npy'), self.centroids)
+        self.trained_on = trained_on or len(vectors)
+        with open(self._file('meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({'trained_on': self.trained_on}, f)
+        self._save_codes()
+        print(f"Trained {n_lists} cells on {len(vectors)} vectors")
+
+    def needs_retrain(self, factor=RETRAIN_FACTOR):
+        """Whether the index has grown to factor times the size its cells were trained on"""
+        return self.centroids is not None and len(self) > factor * max(self.trained_on, 1)
+
+    def retrain(self, n_lists=None, sample_size=RETRAIN_SAMPLE, random_state=42, chunk_size=65536):
+        """Re-learn the cells from a sample of every indexed vector and reassign each row to its new cell"""
+        self._consolidate()
+        n = len(self)
+        sample = np.sort(np.random.default_rng(random_state).choice(n, min(n, sample_size), replace=False))
+        n_lists = min(len(sample), n_lists or max(1, int(4 * np.sqrt(n))))
+        self.train(self._vectors[sample], n_lists, random_state, trained_on=n)
+
+        rows = self._rows.copy()
+        for start in range(0, n, chunk_size):
+            block = np.asarray(self._vectors[start:start + chunk_size])
+            rows['list'][start:start + chunk_size] = (block @ self.centroids.T).argmax(axis=1)
+        tmp_path = self._file('rows.bin.tmp')
+        with open(tmp_path, 'wb') as f:
+            rows.tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._file('rows.bin'))
+        self._rows = rows
+        self._lists = None
+
+    def _append(self, name, array):
+        with open(self._file(name), 'ab') as f:
+            array.tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _save_codes(self):
+        tmp_path = self._file('codes.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.codes, f, ensure_ascii=False)
+        os.replace(tmp_path, self._file('codes.json'))
+
+    def add(self, vectors, keys, source, titles, ratings):
+        """
+        Append vectors with their metadata
+        :param keys: 16-byte text digests (or texts, which are hashed) identifying each review
+        :param source: One source name, or one per vector
+        :param titles: One title, or one per vector
+        :param ratings: One rating, or one per vector (None/NaN stored as -1)
+        """
+        vectors = _normalize(vectors)
+        if self.centroids is None:
+            self.train(vectors)
+        n = len(vectors)
+
+        def per_row(value):
+            return [value] * n if isinstance(value, (str, int, float, np.generic, type(None))) else list(value)
+
+        rows = np.empty(n, dtype=ROW_DTYPE)
+        rows['list'] = (vectors @ self.centroids.T).argmax(axis=1)
+        rows['source'] = [self._code('source', s) for s in per_row(source)]
+        rows['title'] = [self._code('title', t) for t in per_row(titles)]
+        rows['rating'] = [int(r) if r is not None and r == r else -1 for r in per_row(ratings)]
+        keys = np.array([k if isinstance(k, bytes) else text_key(k) for k in keys], dtype=KEY_DTYPE)
+
+        # Vectors first: a crash mid-insert then leaves only extra vectors, which load cuts off
+        self._append('vectors.f32', vectors)
+        self._append('rows.bin', rows)
+        self._append('keys.bin', keys)
+        self._save_codes()
+        self._pending.append((rows, keys))
+        return n
+
+    def _filter_mask(self, ids, source, title, rating):
+        rows = self._rows[ids]
+        mask = np.ones(len(ids), dtype=bool)
+        for field, value in (('source', source), ('title', title)):
+            if value is None:
+                continue
+            wanted = value if isinstance(value, (list, tuple, set)) else [value]
+            codes = [self.codes[field].index(v) for v in wanted if v in self.codes[field]]
+            mask &= np.isin(rows[field], codes)
+        if rating is not None:
+            mask &= np.isin(rows['rating'], list(rating) if isinstance(rating, (list, tuple, set)) else [rating])
+        return mask
+
+    def search(self, query, k=10, source=None, title=None, rating=None, n_probe=None):
+        """
+        Top-k most similar reviews to a query vector, optionally only from some
+        sources/titles/ratings (each a value or a list). Searches more cells when
+        the filters leave fewer than k candidates.
+        :return: list of dicts with key (hex), score, source, title, rating, row
+        """
+        if not len(self):
+            return []
+        self._consolidate()
+        query = _normalize(query)[0]
+        lists = self._inverted_lists()
+        cell_order = np.argsort(-(self.centroids @ query))
+        n_probe = n_probe or self.n_probe
+
+        while True:
+            ids = np.concatenate([lists[c] for c in cell_order[:n_probe]])
+            if source is not None or title is not None or rating is not None:
+                ids = ids[self._filter_mask(ids, source, title, rating)]
+            if len(ids) >= k or n_probe >= len(lists):
+                break
+            n_probe *= 2
+
+        if not len(ids):
+            return []
+        ids = np.sort(ids)
+        scores = self._vectors[ids] @ query
+        top = np.argpartition(-scores, min(k, len(ids)) - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        results = []
+        for i in top:
+            row = self._rows[ids[i]]
+            results.append({'key': self._keys[ids[i]].tobytes().hex(), 'score': float(scores[i]),
+                            'source': self.codes['source'][row['source']], 'title': self.codes['title'][row['title']],
+                            'rating': int(row['rating']), 'row': int(ids[i])})
+        return results
+
+
+def build_from_store(model_name, path='vector_index', store_root='review_store', encode=None, max_seq_length=256):
+    """
+    Index every review in the ReviewStore that isn't indexed yet, taking
+    vectors from the EmbeddingCache (encode is only called for texts it lacks)
+    :param max_seq_length: Token limit of the cached vectors to use (and of encode); 256 is EmbeddingPipeline's
+    """
+    from embedding_cache import EmbeddingCache
+    from review_store import load_reviews
+
+    index = VectorIndex(path)
+    index._consolidate()
+    reviews = load_reviews(store_root, columns=['source', 'title', 'rating', 'comment'])
+    reviews['key'] = [text_key(text) for text in reviews['comment'].fillna('')]
+    # The same text under two titles (or sources) is two index rows
+    indexed = set(zip(index._keys.tolist(), (index.codes['source'][code] for code in index._rows['source']),
+                      (index.codes['title'][code] for code in index._rows['title'])))
+    fields = ['key', 'source', 'title']
+    new = np.array([row not in indexed for row in zip(*(reviews[field] for field in fields))], dtype=bool)
+    reviews = reviews.loc[new].drop_duplicates(fields)
+    if reviews.empty:
+        print(f"All reviews already indexed ({len(index)})")
+        return index
+
+    vectors = EmbeddingCache(model_name, max_seq_length=max_seq_length).get(reviews['comment'].fillna('').tolist(), encode)
+    started = time.perf_counter()
+    index.add(vectors, reviews['key'].tolist(), reviews['source'].tolist(), reviews['title'].tolist(),
+              reviews['rating'].tolist())
+    print(f"Indexed {len(reviews)} reviews in {time.perf_counter() - started:.1f}s ({len(index)} total)")
+    if index.needs_retrain():
+        started = time.perf_counter()
+        index.retrain()
+        print(f"Retrained the cells for {len(index)} reviews in {time.perf_counter() - started:.1f}s")
+    return index
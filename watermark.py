@@ -0,0 +1,80 @@
+import os
+import json
+import threading
+
+from embedding_cache import text_key
+
+def review_id(review):
+    """Stable ID of a scraped review that has no ID of its own: digest of its author and text"""
+    return text_key(f"{review.get('name', '')}\n{review.get('comment', '')}").hex()
+
+
+class Watermarks:
+    """
+    Newest review seen per (source, title, rating), in one JSON file.
+
+    A mark is the newest review time plus the IDs of the reviews with exactly
+    that time, so reviews sharing the boundary second are not mistaken for old
+    ones. An incremental crawl walks a title newest-first and stops at the
+    first review at or below its mark. The mark only moves with advance(),
+    which a crawl calls once it has reached the mark or the last page and the
+    new reviews are committed to disk, so an interrupted crawl starts again
+    from the old mark instead of skipping reviews. There is no seeding from
+    earlier full crawls: those are popularity-ordered, so their newest review
+    says nothing about which older ones were stored. A title's first
+    incremental run walks its whole time-ordered list instead.
+    Rewritten atomically on every update and safe to share between threads.
+    """
+
+    def __init__(self, path='watermarks.json'):
+        self.path = path
+        self._lock = threading.Lock()
+        self.marks = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.marks = json.load(f)
+
+    @staticmethod
+    def key(source, title, rating):
+        return f"{source}\t{title}\t{rating}"
+
+    def get(self, source, title, rating):
+        """{'time': newest time, 'ids': [review ids at that time]} or None if never crawled"""
+        return self.marks.get(self.key(source, title, rating))
+
+    @staticmethod
+    def is_seen(mark, review, time_field='time'):
+        """Whether a review is at or below the mark (reviews without a time never are)"""
+        time = review.get(time_field) or ''
+        if mark is None or not time:
+            return False
+        return time < mark['time'] or (time == mark['time'] and review_id(review) in mark['ids'])
+
+    def split(self, source, title, rating, reviews, time_field='time'):
+        """(reviews newer than the mark, whether the page reached the mark)"""
+        mark = self.get(source, title, rating)
+        new = [review for review in reviews if not self.is_seen(mark, review, time_field)]
+        return new, len(new) < len(reviews)
+
+    def advance(self, source, title, rating, reviews, time_field='time'):
+        """Move the mark up to the newest of reviews (never backwards)"""
+        timed = [review for review in reviews if review.get(time_field)]
+        if not timed:
+            return self.get(source, title, rating)
+        newest = max(review[time_field] for review in timed)
+        ids = {review_id(review) for review in timed if review[time_field] == newest}
+
+        with self._lock:
+            key = self.key(source, title, rating)
+            mark = self.marks.get(key)
+            if mark is not None and mark['time'] > newest:
+                return mark
+            if mark is not None and mark['time'] == newest:
+                ids |= set(mark['ids'])
+            self.marks[key] = {'time': newest, 'ids': sorted(ids)}
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.marks, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.path)
+            return self.marks[key]
+